@@ -23,7 +23,7 @@ from core.constants import AMOUNT_OF_SESSSIONS_PER_USER
 from core.base.schema import IPostResponseBase, IGetResponseBase
 from app.model import User
 from app.user.util import get_current_user
-from app.user.schema import ICreate, IIdentityProvider, IAuthMeta
+from app.user.schema import IIdentityProvider, IAuthMeta, IProvision
 from app.token.schema import Token, RefreshToken
 from app.sessions.model import Sessions
 from app import crud
@@ -68,20 +68,31 @@ def get_sso_provider(provider: SSOProvider) -> SSOBase:
             raise NotFoundException(detail="Provider not found")
 
 
+def get_auth_meta(user, claims: dict) -> IAuthMeta:
+    return IAuthMeta.parse_obj({
+        "id": user.id,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "full_name": user.full_name,
+        "email": user.email,
+        "picture": user.picture,
+        "roles": list(claims["roles"].values()),
+    })
+
+
 def create_token_and_session(
     user,
+    claims: dict,
     request: Request,
     response: Response) -> Tuple[Token, Sessions, IAuthMeta]:
+    """
+    `claims` - access token claims of the user, see `crud.user.get_claims`
+    """
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     refresh_token_expires = timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES)
 
-    access_token, expires_at = create_jwt_token({
-        "user_id": str(user.id),
-        "email": user.email,
-        "roles": {str(i.id): i.title for i in user.roles},
-        "teams": [str(i.id) for i in user.teams],
-        "visibility_group": user.visibility_group.prefix if user.visibility_group else None
-    }, expires_delta=access_token_expires, token_type="access")
+    access_token, expires_at = create_jwt_token(
+        claims, expires_delta=access_token_expires, token_type="access")
 
     refresh_token, _ = create_jwt_token({
         "user_id": str(user.id)
@@ -108,19 +119,20 @@ def create_token_and_session(
         cookie=cookie
     )
 
-    meta = IAuthMeta.parse_obj(user)
+    meta = get_auth_meta(user, claims)
 
     return data, session, meta
 
 
 async def refresh_user_sessions(user: User, request: Request, db_session: AsyncSession, session: Sessions):
-    if user.sessions:
-        for i in user.sessions:
+    user_sessions = await crud.sessions.get_by_user_id(db_session, user_id=user.id)
+    if user_sessions:
+        for i in user_sessions:
             if i.cookie == request.cookies.get("auth"):
                 await crud.sessions.remove(db_session, id=i.id)
-        if len(user.sessions) >= AMOUNT_OF_SESSSIONS_PER_USER:
+        if len(user_sessions) >= AMOUNT_OF_SESSSIONS_PER_USER:
             oldest_session = sorted(
-                user.sessions, key=lambda x: x.created_at)[0]
+                user_sessions, key=lambda x: x.created_at)[0]
             await crud.sessions.remove(db_session, id=oldest_session.id)
     await crud.sessions.create(db_session, obj_in=session)
 
@@ -143,7 +155,8 @@ async def basic(
     Basic login for test users only. Disabled for rest of the users.
     """
     user = await crud.user.authenticate(db_session, email=form_data.username, password=form_data.password)
-    data, session, meta = create_token_and_session(user, request, response)
+    claims = await crud.user.get_claims(db_session, user=user)
+    data, session, meta = create_token_and_session(user, claims, request, response)
     await refresh_user_sessions(user, request, db_session, session)
     return IPostResponseBase[Token](meta=meta, data=data, message="Login correctly")
 
@@ -169,7 +182,7 @@ async def basic(
 async def logout(
     request: Request,
     db_session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user()),
+    current_user: User = Depends(get_current_user(profile="sessions")),
     access_token: str = Depends(reusable_oauth2)
 ):
     if current_user.sessions:
@@ -252,20 +265,13 @@ async def auth_callback(
     except Exception as e:
         raise BadRequestException(detail=str(e))
     try:
-        user = await crud.user.get_by_email(db_session, email=sso_user.email)
+        user, claims = await crud.user.provision(db_session, obj_in=IProvision.parse_obj(sso_user.dict()))
     except Exception as e:
         raise ConflictException(detail=f"database error: {e}")
-    if not user:
-        new_user = ICreate.parse_obj(sso_user.dict())
-        logger.debug(f"user not found, creating new user: {new_user}")
-        user = await crud.user.create(db_session, obj_in=new_user)
-        logger.debug(f"new user created: {user}")
-        user = await crud.user.get(db_session, id=user.id)
-        # raise ConflictException(detail="User not found")
-    elif not user.is_active:
+    if not user.is_active:
         raise ConflictException(detail="user is disabled")
 
-    data, session, meta = create_token_and_session(user, request, response)
+    data, session, meta = create_token_and_session(user, claims, request, response)
     await refresh_user_sessions(user, request, db_session, session)
 
     return IGetResponseBase[Token](meta=meta, data=data, message="Login correctly")
@@ -297,7 +303,7 @@ async def refresh_token(
     """
     payload = await verify_jwt_token(token=body.refresh_token, token_type="refresh", db_session=db_session, crud=crud)
     try:
-        user = await crud.user.get(db_session, id=payload['user_id'])
+        user = await crud.user.get(db_session, id=payload['user_id'], profile="sessions")
     except Exception as e:
         raise ConflictException(detail=f"database error: {e}")
     if not user:
@@ -308,20 +314,16 @@ async def refresh_token(
         raise UnauthorizedException(detail="The session does not exist")
     access_token_expires = timedelta(
         minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token, expires_at = create_jwt_token({
-        "user_id": str(user.id),
-        "email": user.email,
-        "roles": {str(i.id): i.title for i in user.roles},
-        "teams": [str(i.id) for i in user.teams],
-        "visibility_group": user.visibility_group.prefix if user.visibility_group else None
-    }, expires_delta=access_token_expires, token_type="access")
+    claims = await crud.user.get_claims(db_session, user=user)
+    access_token, expires_at = create_jwt_token(
+        claims, expires_delta=access_token_expires, token_type="access")
     data = Token(
         access_token=access_token,
         token_type="bearer",
         expires_at=expires_at,
         refresh_token=body.refresh_token
     )
-    meta = IAuthMeta.parse_obj(user)
+    meta = get_auth_meta(user, claims)
     cookie = request.cookies.get("auth")
     for s in user.sessions:
         if s.refresh_token == body.refresh_token:
@@ -355,20 +357,15 @@ async def idp(
     # Retrieve user data from SSO provider
     user_data = await get_user_info_from_sso_provider(sso_provider, data.idp_access_token)
     logger.debug(f"user data: {user_data}")
-    user_data = ICreate.parse_obj(user_data)
+    user_data = IProvision.parse_obj(user_data)
     try:
-        user = await crud.user.get_by_email(db_session, email=user_data.email)
+        user, claims = await crud.user.provision(db_session, obj_in=user_data)
     except Exception as e:
-        raise ConflictException(detail=f"database error: {e.orig}")
-    if not user:
-        new_user = ICreate.parse_obj(user_data.dict())
-        logger.debug(f"user not found, creating new user: {new_user}")
-        user = await crud.user.create(db_session, obj_in=new_user)
-        user = await crud.user.get_by_email(db_session, email=user.email)
-    elif not user.is_active:
+        raise ConflictException(detail=f"database error: {e}")
+    if not user.is_active:
         raise ConflictException(detail="user is disabled")
 
-    data, session, meta = create_token_and_session(user, request, response)
+    data, session, meta = create_token_and_session(user, claims, request, response)
     await refresh_user_sessions(user, request, db_session, session)
 
     return IGetResponseBase[Token](meta=meta, data=data, message="Login correctly")
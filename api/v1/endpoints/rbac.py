@@ -1,29 +1,64 @@
+# # Native # #
+import json
+import time
+import asyncio
+import hashlib
+from typing import AsyncGenerator, Literal, Optional
+
 # # Installed # #
 from sqlmodel.ext.asyncio.session import AsyncSession
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, Header, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
+from starlette.concurrency import run_in_threadpool
 
 # # Package # #
 from core.settings import settings
-from core.database.session import get_session
+from core.database.session import get_session, async_session_factory
 from app.rbac.schema import IRBACRead
-from app.rbac.schema import IRBACValidateResponse, IRBACValidate
+from app.rbac.schema import IRBACValidateResponse, IRBACValidate, IRBACValidateBatch, IRBACValidateBatchResponse
+from app.rbac.schema import IRBACEffectivePermissions, IRBACAccess, IRBACImpact, IRBACImpactResponse
+from app.rbac.report import AccessReport, get_report_users
+from app.user.util import get_current_user
+from app.model import User
+from app import crud
+from core.security import verify_jwt_token
 from core.base.schema import IGetResponseBase
+from core.exceptions import ConflictException
+from core.utils import etag_response
 
 router = APIRouter()
 
+# seconds between snapshot checks of a /rbac/changes stream and between its keep-alive comments
+CHANGES_STREAM_CHECK_INTERVAL = 1
+CHANGES_KEEPALIVE_INTERVAL = 15
+
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.HOSTNAME}/api/auth/access-token"
 )
 
 
-@router.get("/rbac", response_model=IGetResponseBase[IRBACRead])
+@router.get("/rbac", response_model=IGetResponseBase[IRBACRead],
+            responses={304: {"description": "Not modified"}})
 async def get_rbac_rules(
     request: Request,
+    since: Optional[str] = None,
+    if_none_match: Optional[str] = Header(default=None),
     db_session: AsyncSession = Depends(get_session),
 ):
-    data = await request.app.rbac.get(db_session)
-    return IGetResponseBase[IRBACRead](data=data)
+    """
+    the snapshot, serialized once per version; the ETag is the snapshot version.
+    `since=<version>` - only the entries changed after that version, `data` is then
+    {"version", "since", "changes": [{"section", "op", "id", "value"}]} with the ETag "<since>..<version>";
+    the whole snapshot is returned if the version is not kept in the history
+    """
+    rbac = request.app.rbac
+    await rbac.get(db_session)
+    delta = rbac.get_delta(since) if since else None
+    if delta is not None:
+        content = json.dumps({"message": "Data got correctly", "meta": {}, "data": delta}, default=str).encode()
+        return etag_response(content, f'"{since}..{rbac.version}"', if_none_match)
+    return etag_response(rbac.get_serialized(), f'"{rbac.version}"', if_none_match)
 
 
 @router.post("/rbac/validate", response_model=IGetResponseBase[IRBACValidateResponse])
@@ -35,3 +70,154 @@ async def validate(
 ):
     data = await request.app.rbac.validate(db_session=db_session, req=req, access_token=access_token)
     return IGetResponseBase[IRBACValidateResponse](data=data)
+
+
+@router.post("/rbac/validate/batch", response_model=IGetResponseBase[IRBACValidateBatchResponse])
+async def validate_batch(
+    request: Request,
+    req: IRBACValidateBatch,
+    access_token: str = Depends(reusable_oauth2),
+    db_session: AsyncSession = Depends(get_session),
+):
+    data = await request.app.rbac.validate_batch(db_session=db_session, reqs=req.requests, access_token=access_token)
+    return IGetResponseBase[IRBACValidateBatchResponse](data={"results": data})
+
+
+@router.get("/rbac/permissions", response_model=IGetResponseBase[IRBACEffectivePermissions],
+            responses={304: {"description": "Not modified"}})
+async def get_effective_permissions(
+    request: Request,
+    response: Response,
+    if_none_match: Optional[str] = Header(default=None),
+    access_token: str = Depends(reusable_oauth2),
+    db_session: AsyncSession = Depends(get_session),
+):
+    """
+    resources the caller roles and teams can access, for deciding locally instead of calling /rbac/validate.
+    the ETag changes with the RBAC snapshot and with the caller roles and teams
+    """
+    payload = await verify_jwt_token(token=access_token, token_type="access", db_session=db_session, crud=crud)
+    await request.app.rbac.get(db_session)
+    principals = request.app.rbac.get_principals(payload)
+    principals_digest = hashlib.sha256(",".join(sorted(principals)).encode()).hexdigest()
+    etag = f'"{request.app.rbac.version[:32]}.{principals_digest[:16]}"'
+    if if_none_match and etag in [i.strip() for i in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+    data = request.app.rbac.get_effective_permissions(principals)
+    response.headers["ETag"] = etag
+    return IGetResponseBase[IRBACEffectivePermissions](data=data)
+
+
+def format_event(event: str, version: str, data: dict) -> str:
+    return f"id: {version}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def stream_changes(request: Request, since: Optional[str], timeout: float) -> AsyncGenerator[str, None]:
+    """
+    events until the client disconnects or `timeout` seconds pass, changes pending at the end are sent
+    """
+    rbac = request.app.rbac
+    sent_at = time.monotonic()
+    deadline = sent_at + timeout
+    while not await request.is_disconnected():
+        # a session per check, the stream does not hold a connection between checks
+        async for db_session in get_session():
+            await rbac.get(db_session)
+        if since != rbac.version:
+            updates = rbac.get_changes_since(since) if since else None
+            if updates is None:
+                # unknown or too old version: the whole snapshot, then changes from it
+                yield format_event("snapshot", rbac.version, {"version": rbac.version, "data": rbac.rbac})
+            for previous, version, changes in updates or []:
+                yield format_event("change", version, {"previous": previous, "version": version, "changes": changes})
+            since = rbac.version
+            sent_at = time.monotonic()
+        elif time.monotonic() - sent_at > CHANGES_KEEPALIVE_INTERVAL:
+            yield ": keep-alive\n\n"
+            sent_at = time.monotonic()
+        if time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(min(CHANGES_STREAM_CHECK_INTERVAL, deadline - time.monotonic()))
+
+
+@router.get("/rbac/changes", response_class=StreamingResponse,
+            responses={200: {"content": {"text/event-stream": {}}}})
+async def get_rbac_changes(
+    request: Request,
+    since: Optional[str] = None,
+    last_event_id: Optional[str] = Header(default=None),
+    access_token: str = Depends(reusable_oauth2),
+):
+    """
+    server-sent events of RBAC snapshot changes, the event id is the snapshot version.
+    `change` events list the entries added, updated and deleted per snapshot section;
+    a `snapshot` event with the whole snapshot is sent first, unless the stream is resumed
+    (`Last-Event-ID` header or `since`) from a version still kept in the history.
+    the stream ends after `RBAC_CHANGES_STREAM_TIMEOUT` seconds, clients resume it with a valid token
+    """
+    # not a dependency: its session would be held until the stream ends
+    async with async_session_factory() as db_session:
+        await verify_jwt_token(token=access_token, token_type="access", db_session=db_session, crud=crud)
+    return StreamingResponse(
+        stream_changes(request, last_event_id or since, settings.RBAC_CHANGES_STREAM_TIMEOUT),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/rbac/access", response_model=IGetResponseBase[IRBACAccess])
+async def get_access(
+    request: Request,
+    method: str,
+    endpoint: str,
+    current_user: User = Depends(get_current_user(required_permissions=True)),
+    db_session: AsyncSession = Depends(get_session),
+):
+    """
+    roles, teams and active users allowed to call `method` `endpoint`, from the access index
+    """
+    req = IRBACValidate(method=method, endpoint=endpoint)
+    await request.app.access_index.get(db_session)
+    return IGetResponseBase[IRBACAccess](data=request.app.access_index.who_can_access(req))
+
+
+@router.post("/rbac/impact", response_model=IGetResponseBase[IRBACImpactResponse])
+async def get_impact(
+    request: Request,
+    change: IRBACImpact,
+    current_user: User = Depends(get_current_user(required_permissions=True)),
+    db_session: AsyncSession = Depends(get_session),
+):
+    """
+    what-if: users gaining or losing access per resource if a role or team gets or loses
+    the permission to `resource_id`, or if `user_id` gets or loses the role or team; nothing is changed
+    """
+    await request.app.access_index.get(db_session)
+    return IGetResponseBase[IRBACImpactResponse](data=request.app.access_index.get_impact(change))
+
+
+@router.get("/rbac/report", response_class=StreamingResponse,
+            responses={200: {"content": {"text/csv": {}, "application/x-ndjson": {}}}})
+async def get_access_report(
+    request: Request,
+    format: Literal["csv", "columns"] = "csv",
+    inactive: bool = False,
+    current_user: User = Depends(get_current_user(required_permissions=True)),
+    db_session: AsyncSession = Depends(get_session),
+):
+    """
+    access review: every user with every resource it can access, from the current snapshot.
+    `csv` - a row per (user, resource) with access, `columns` - json lines, the users first,
+    then a bitmap of the users with access per resource, see `AccessReport.iter_columns`
+    """
+    await request.app.rbac.get(db_session)
+    report = AccessReport(request.app.rbac, await get_report_users(db_session, inactive=inactive))
+    try:
+        await run_in_threadpool(report.build)
+    except ValueError as e:
+        raise ConflictException(detail=str(e))
+    if format == "csv":
+        return StreamingResponse(
+            report.iter_csv(), media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="access-{report.version[:12]}.csv"'})
+    return StreamingResponse(report.iter_columns(), media_type="application/x-ndjson")
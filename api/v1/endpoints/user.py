@@ -7,14 +7,14 @@ from typing import Union, Dict, Any, List
 import sqlalchemy
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import select
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 
 # # Package # #
 from core.settings import Params, Page
 from core.utils import ColumnAnnotation, ApiListUtils
 from core.logger import logger
 from core.exceptions import AlreadyExistsException, NotFoundException, BadRequestException
-from app.user.schema import ICreate, IRead, IUpdate, IFilter
+from app.user.schema import ICreate, IRead, IReadList, IUpdate, IFilter
 from app.user.util import get_current_user
 from core.database.session import get_session
 from app import crud
@@ -38,17 +38,10 @@ mapping_filters = {
     }
 }
 
-utils = ApiListUtils(mapping=mapping_filters, ifilter=IFilter, iread=IRead)
+utils = ApiListUtils(mapping=mapping_filters, ifilter=IFilter, iread=IReadList)
 
-@router.get("/user/list", response_model=IGetResponseBase[Page[IRead]], response_model_exclude_none=True)
-async def list(
-    params: Params = Depends(),
-    db_session: AsyncSession = Depends(get_session),
-    # current_user: User = Depends(get_current_user()),
-    filters: dict = Depends(utils.filters),
-    scope: set = Depends(utils.scope)
-):
-    meta = {
+def get_list_meta() -> dict:
+    return {
         "table_name": "user",
         "table_mapping": [
             ColumnAnnotation(column_name="id", key_name="id"),
@@ -64,8 +57,37 @@ async def list(
             ColumnAnnotation(column_name="фото", key_name="picture", column_type="image", default_visibility=True),
         ]
     }
+
+
+@router.get("/user/list", response_model=IGetResponseBase[Page[IReadList]], response_model_exclude_none=True)
+async def list(
+    params: Params = Depends(),
+    db_session: AsyncSession = Depends(get_session),
+    # current_user: User = Depends(get_current_user()),
+    filters: dict = Depends(utils.filters),
+    scope: set = Depends(utils.scope)
+):
     data = await crud.user.get_multi_paginated(db_session, params=params, filters=filters, scope=scope)
-    return IGetResponseBase[Page[IRead]](data=data, meta=meta)
+    return IGetResponseBase[Page[IReadList]](data=data, meta=get_list_meta())
+
+
+@router.get("/user/list/visible", response_model=IGetResponseBase[Page[IReadList]], response_model_exclude_none=True)
+async def list_visible(
+    request: Request,
+    params: Params = Depends(),
+    db_session: AsyncSession = Depends(get_session),
+    # users are scoped by the activity visibility of the caller when the resource has visibility_group_enable
+    current_user: User = Depends(get_current_user(required_permissions=True, visibility_group_entity="activity")),
+    filters: dict = Depends(utils.filters),
+    scope: set = Depends(utils.scope)
+):
+    """
+    `/user/list` for authenticated callers, scoped by the users visible for them
+    """
+    data = await crud.user.get_multi_paginated(
+        db_session, params=params, filters=filters, scope=scope,
+        visible_user_ids=getattr(request.state, "visible_user_ids", None))
+    return IGetResponseBase[Page[IReadList]](data=data, meta=get_list_meta())
 
 
 @router.get("/user/{user_id}", response_model=IGetResponseBase[IRead])
@@ -83,12 +105,13 @@ async def create(
     db_session: AsyncSession = Depends(get_session),
     current_user: User = Depends(get_current_user(required_permissions=True)),
 ):
-    user = await crud.user.get_by_email(db_session, email=new_user.email)
+    user = await crud.user.get_by_email(db_session, email=new_user.email, profile=None)
     if user:
         raise AlreadyExistsException
     # TODO assign default roles to user
     user = await crud.user.create(db_session, obj_in=new_user)
     # TODO send email to user with password
+    user = await crud.user.get(db_session, id=user.id)
     return IPostResponseBase[IRead](data=user)
 
 
@@ -102,10 +125,10 @@ async def update(
     user = await crud.user.get(db_session=db_session, id=user_id)
     if not user:
         raise NotFoundException
-    user_updated = await crud.user.update(
-        db_session=db_session, obj_current=user, obj_new=new_user
-    )
-    return IPutResponseBase[IRead](data=user_updated)
+    await crud.user.update(db_session=db_session, obj_current=user, obj_new=new_user)
+    # relationships are not refreshed with the columns
+    user = await crud.user.get(db_session, id=user_id)
+    return IPutResponseBase[IRead](data=user)
 
 
 @router.patch("/user/{user_id}/role/{role_id}", response_model=IPutResponseBase[IRead])
@@ -115,7 +138,7 @@ async def update_user_role(
     db_session: AsyncSession = Depends(get_session),
     current_user: User = Depends(get_current_user(required_permissions=True)),
 ):
-    role = await crud.role.get(db_session, id=role_id)
+    role = await crud.role.get(db_session, id=role_id, profile=None)
     await crud.user.update_role(db_session, id=user_id, role=role)
     # TODO remove abundant database call
     user = await crud.user.get(db_session, id=user_id)
@@ -129,7 +152,7 @@ async def update_user_team(
     db_session: AsyncSession = Depends(get_session),
     current_user: User = Depends(get_current_user(required_permissions=True)),
 ):
-    team = await crud.team.get(db_session, id=team_id)
+    team = await crud.team.get(db_session, id=team_id, profile=None)
     await crud.user.update_team(db_session, id=user_id, team=team)
     # TODO remove abundant database call
     user = await crud.user.get(db_session, id=user_id)
@@ -169,7 +192,7 @@ async def delete(
 
 @router.get("/user", response_model=IGetResponseBase[IRead])
 async def get_me(
-    user: User = Depends(get_current_user()),
+    user: User = Depends(get_current_user(profile="detail")),
 ):
     return IGetResponseBase[IRead](data=user)
 
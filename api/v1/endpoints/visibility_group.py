@@ -1,10 +1,12 @@
 # # Native # #
+import json
+from typing import List, Optional
 from uuid import UUID
 
 # # Installed # #
 import sqlalchemy
 from sqlmodel.ext.asyncio.session import AsyncSession
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, Header, Query, Request
 from fastapi.security import OAuth2PasswordBearer
 
 # # Package # #
@@ -13,13 +15,16 @@ from core.settings import Params, Page, settings
 from core.exceptions import NotFoundException, AlreadyExistsException, BadRequestException
 from app.model import User
 from core.base.schema import IDeleteResponseBase, IGetResponseBase, IPostResponseBase, IPutResponseBase
-from app.visibility_group.schema import ICreate, IRead, IUpdate, IFilter, IVisibilityGroupValidateResponse
+from app.visibility_group.schema import (
+    ICreate, IRead, IUpdate, IFilter, IVisibilityGroupValidateResponse, IVisibilityGroupBatchValidateResponse,
+    IVisibilityGroupDictionary
+)
 from app import crud
 from app.user.util import get_current_user
 from core.database.session import get_session
 from core.logger import logger
 from core.constants import VISIBILITY_GROUP_ENTITY_POSSIBLE_VALUES
-from core.utils import ColumnAnnotation, ApiListUtils
+from core.utils import ColumnAnnotation, ApiListUtils, etag_response
 
 router = APIRouter()
 
@@ -58,38 +63,106 @@ async def list(
 
 
 # TODO: add response model
-@router.get("/visibility_group/settings")
+@router.get("/visibility_group/settings", responses={304: {"description": "Not modified"}})
 async def get_visibility_group_settings(
     request: Request,
+    since: Optional[str] = None,
+    if_none_match: Optional[str] = Header(default=None),
     db_session: AsyncSession = Depends(get_session),
 ):
-    data = await request.app.visibility_group.get(db_session)
-    logger.debug(f"get_visibility_group_settings: {data}")
-    return data
+    """
+    prefix -> group settings, serialized once per snapshot change; the ETag is a digest of the content.
+    `since=<version>` - only the groups changed after that version: {"version", "since", "groups"},
+    deleted prefixes map to null, with the ETag "<since>..<version>";
+    the whole settings are returned if the version is not kept in the history
+    """
+    visibility_group = request.app.visibility_group
+    await visibility_group.get(db_session)
+    version, content = visibility_group.get_serialized()
+    etag = f'"{version}"'
+    delta = visibility_group.get_delta(since) if since else None
+    if delta is not None:
+        content = json.dumps(delta, default=str).encode()
+        etag = f'"{since}..{version}"'
+    logger.debug(f"get_visibility_group_settings: version {version}, {len(content)} bytes")
+    return etag_response(content, etag, if_none_match)
 
 
 @router.get("/visibility_group/validate/{visibility_group_entity}", response_model=IGetResponseBase[IVisibilityGroupValidateResponse])
 async def validate(
     request: Request,
     visibility_group_entity: str,
+    compact: bool = False,
     access_token: str = Depends(reusable_oauth2),
     db_session: AsyncSession = Depends(get_session),
 ):
+    """
+    `compact=true` returns the users as base64 serialized roaring bitmap of dense ids,
+    see `/visibility_group/dictionary`
+    """
 
     visibility_group_entity = visibility_group_entity.lower().strip()
     if visibility_group_entity not in VISIBILITY_GROUP_ENTITY_POSSIBLE_VALUES:
         raise BadRequestException(
             detail=f'Invalid value: {visibility_group_entity}. Possible values: {VISIBILITY_GROUP_ENTITY_POSSIBLE_VALUES}')
 
+    meta = await verify_jwt_token(token=access_token, token_type="access", db_session=db_session, crud=crud)
+
     data = await request.app.visibility_group.validate(
         db_session=db_session,
         visibility_group_entity=visibility_group_entity,
-        access_token=access_token
+        compact=compact,
+        payload=meta,
     )
 
+    return IGetResponseBase[IVisibilityGroupValidateResponse](meta=meta, data=data)
+
+
+@router.get("/visibility_group/validate", response_model=IGetResponseBase[IVisibilityGroupBatchValidateResponse])
+async def validate_batch(
+    request: Request,
+    entity: List[str] = Query(...),
+    compact: bool = False,
+    access_token: str = Depends(reusable_oauth2),
+    db_session: AsyncSession = Depends(get_session),
+):
+    """
+    `/visibility_group/validate?entity=opportunity&entity=seller` validates several entities at once
+    """
+    entities = list(dict.fromkeys(i.lower().strip() for i in entity))
+    for visibility_group_entity in entities:
+        if visibility_group_entity not in VISIBILITY_GROUP_ENTITY_POSSIBLE_VALUES:
+            raise BadRequestException(
+                detail=f'Invalid value: {visibility_group_entity}. '
+                       f'Possible values: {VISIBILITY_GROUP_ENTITY_POSSIBLE_VALUES}')
+
     meta = await verify_jwt_token(token=access_token, token_type="access", db_session=db_session, crud=crud)
 
-    return IGetResponseBase[IVisibilityGroupValidateResponse](meta=meta, data=data)
+    data = await request.app.visibility_group.validate_batch(
+        db_session=db_session,
+        visibility_group_entities=entities,
+        compact=compact,
+        payload=meta,
+    )
+
+    return IGetResponseBase[IVisibilityGroupBatchValidateResponse](meta=meta, data=data)
+
+
+@router.get("/visibility_group/dictionary", response_model=IGetResponseBase[IVisibilityGroupDictionary])
+async def get_dictionary(
+    request: Request,
+    since: int = 0,
+    digest: Optional[str] = None,
+    access_token: str = Depends(reusable_oauth2),
+    db_session: AsyncSession = Depends(get_session),
+):
+    """
+    users visible for the caller by dense id, for decoding compact validate responses;
+    `since`, `digest` - the dictionary version already known and the digest returned with it
+    """
+    payload = await verify_jwt_token(token=access_token, token_type="access", db_session=db_session, crud=crud)
+    data = await request.app.visibility_group.get_dictionary(db_session, payload, since=since, digest=digest)
+    return IGetResponseBase[IVisibilityGroupDictionary](data=data)
 
 
 @router.get("/visibility_group/{visibility_group_id}", response_model=IGetResponseBase[IRead])
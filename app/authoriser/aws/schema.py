@@ -31,7 +31,7 @@ class RequestVersion1(BaseModel):
         extra = 'allow'
         allow_mutation: True
 
-    @root_validator
+    @root_validator(skip_on_failure=True)
     def parse_method_arn(cls, values):
         values['methodArn']: List[str] = values['methodArn'].split(':')
         values['awsRegion']: str = values['methodArn'][3]
@@ -61,7 +61,7 @@ class RequestVersion2(BaseModel):
         extra = 'allow'
         allow_mutation: True
 
-    @root_validator
+    @root_validator(skip_on_failure=True)
     def parse_request_context(cls, values):
         values['httpMethod']: str = values['requestContext']['http']['method']
         values['resource']: str = values['requestContext']['http']['path']
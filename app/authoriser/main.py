@@ -2,19 +2,21 @@
 import os
 import re
 import json
+from typing import Optional, Tuple
 
 # # Installed # #
 from pydantic import ValidationError
 
 # # Package # #
 from app import crud
-from app.authoriser.util import rbac_validate, get_access_token
+from app.authoriser.util import rbac_validate, bundle_validate, get_access_token
 from app.authoriser.aws.schema import RequestVersion1 as AWSRequestV1, RequestVersion2 as AWSRequestV2
 from app.authoriser.yc.schema import RequestVersion as YCRequest
 from core.database.session import get_session
 from core.logger import logger
 from core.sentry import sentry_init
-from core.security import verify_jwt_token
+from core.security import decode_jwt_token, verify_jwt_token
+from core.settings import settings
 
 sentry_init()
 
@@ -63,14 +65,68 @@ async def lambda_handler(event, context):
     """2. Decode a JWT token inline"""
     """3. Lookup in a self-managed DB"""
 
-    async for db_session in get_session():
-        try:
-            authorization_header = payload.headers.get("authorization") or payload.headers.get("Authorization")
+    if settings.AUTHORISER_BUNDLE_PATH and settings.AUTHORISER_STATELESS_TOKENS:
+        # rules from the signed bundle and tokens trusted by signature: no database connection
+        principalId, context, is_authorized = authorise_stateless(payload)
+    else:
+        principalId, context, is_authorized = await authorise(payload)
+
+    """policy must be generated which will allow or deny access to the client"""
+    """keep in mind, the policy is cached for 5 minutes by default (TTL is configurable in the authorizer)"""
+
+    if AUTHORIZER_TYPE == "AWS" and payload.version == "1.0":
+        policy = AuthPolicy(principalId, payload.awsAccountId)
+        policy.restApiId = payload.awsRestApiId
+        policy.region = payload.awsRegion
+        policy.stage = payload.awsStage
+
+        if is_authorized:
+            policy.allowAllMethods()
+        else:
+            policy.denyAllMethods()
+
+        # Finally, build the policy
+        response = policy.build()
+
+        # if is_authorized:
+        response["context"] = context
+    else:
+        response = {"isAuthorized": is_authorized}
+        if is_authorized:
+            response.update({"context": context})
+
+    logger.info(f"Response: {response}")
+
+    return response
+
 
-            if not authorization_header:
-                raise Exception("No Authorization header found")
+def get_context(access_token_payload: dict, access_token: str) -> dict:
+    return {
+        "user_id": access_token_payload.get("user_id"),
+        "email": access_token_payload.get("email"),
+        "region": access_token_payload.get("region"),
+        "teams": access_token_payload.get("teams"),
+        "roles": json.dumps(access_token_payload.get("roles")),
+        "visibility_group": access_token_payload.get("visibility_group"),
+        "access_token": access_token,
+    }
 
-            access_token = get_access_token(authorization_header)
+
+def get_authorization_header(payload) -> str:
+    authorization_header = payload.headers.get("authorization") or payload.headers.get("Authorization")
+    if not authorization_header:
+        raise Exception("No Authorization header found")
+    return authorization_header
+
+
+async def authorise(payload) -> Tuple[str, Optional[dict], bool]:
+    """
+    token checked against its session and rules read from the database
+    """
+    context = None
+    async for db_session in get_session():
+        try:
+            access_token = get_access_token(get_authorization_header(payload))
             access_token_payload = await verify_jwt_token(
                 token=access_token,
                 token_type="access",
@@ -79,15 +135,7 @@ async def lambda_handler(event, context):
             )
 
             principalId = access_token_payload.get("user_id")
-            context = {
-                "user_id": access_token_payload.get("user_id"),
-                "email": access_token_payload.get("email"),
-                "region": access_token_payload.get("region"),
-                "teams": access_token_payload.get("teams"),
-                "roles": json.dumps(access_token_payload.get("roles")),
-                "visibility_group": access_token_payload.get("visibility_group"),
-                "access_token": access_token,
-            }
+            context = get_context(access_token_payload, access_token)
             is_authorized = True
         except Exception as e:
             logger.error(f"Token Validation Error: {str(e)}")
@@ -103,34 +151,32 @@ async def lambda_handler(event, context):
             except Exception as e:
                 logger.error(f"RBAC Validation Error: {str(e)}")
                 is_authorized = False
+    return principalId, context, is_authorized
 
-        """policy must be generated which will allow or deny access to the client"""
-        """keep in mind, the policy is cached for 5 minutes by default (TTL is configurable in the authorizer)"""
-
-    if AUTHORIZER_TYPE == "AWS" and payload.version == "1.0":
-        policy = AuthPolicy(principalId, payload.awsAccountId)
-        policy.restApiId = payload.awsRestApiId
-        policy.region = payload.awsRegion
-        policy.stage = payload.awsStage
-
-        if is_authorized:
-            policy.allowAllMethods()
-        else:
-            policy.denyAllMethods()
-
-        # Finally, build the policy
-        response = policy.build()
 
-        # if is_authorized:
-        response["context"] = context
-    else:
-        response = {"isAuthorized": is_authorized}
-        if is_authorized:
-            response.update({"context": context})
-
-    logger.info(f"Response: {response}")
+def authorise_stateless(payload) -> Tuple[str, Optional[dict], bool]:
+    """
+    token trusted by its signature and expiration, rules read from the signed bundle,
+    see `AUTHORISER_BUNDLE_PATH`. a revoked session stays authorised until its token expires
+    """
+    context = None
+    try:
+        access_token = get_access_token(get_authorization_header(payload))
+        access_token_payload = decode_jwt_token(token=access_token, token_type="access")
+        principalId = access_token_payload.get("user_id")
+        context = get_context(access_token_payload, access_token)
+        is_authorized = True
+    except Exception as e:
+        logger.error(f"Token Validation Error: {str(e)}")
+        return "none", context, False
 
-    return response
+    try:
+        bundle_validate(payload, access_token_payload)
+        logger.info("RBAC Validation Passed")
+    except Exception as e:
+        logger.error(f"RBAC Validation Error: {str(e)}")
+        is_authorized = False
+    return principalId, context, is_authorized
 
 
 class HttpVerb:
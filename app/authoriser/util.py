@@ -10,13 +10,16 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 # # Package # #
 from app.rbac.schema import IRBACValidate
 from app.rbac.util import RBAC
+from app.rbac.bundle import RBACBundle
 from core.aws import get_lambda_client
 from core.logger import logger
 from core.exceptions import ForbiddenException, UnauthorizedException
+from core.settings import settings
 
 __all__ = (
     "user_validate",
     "rbac_validate",
+    "bundle_validate",
     "visibility_group_validate",
 )
 
@@ -175,6 +178,23 @@ async def rbac_validate(
             raise ForbiddenException
 
 
+# rules of the stateless mode, kept between invocations of a warm lambda
+bundle = RBACBundle(settings.AUTHORISER_BUNDLE_PATH) if settings.AUTHORISER_BUNDLE_PATH else None
+
+
+def bundle_validate(request, access_token_payload: dict):
+    """Validate RBAC permissions for the current request against the signed bundle, without the database."""
+    if bundle is None:
+        raise Exception("AUTHORISER_BUNDLE_PATH not set")
+    rbac = bundle.get()
+    response = rbac.decide(
+        IRBACValidate(endpoint=request.resource, method=request.httpMethod),
+        rbac.get_principals(access_token_payload),
+    )
+    if not response["access"]:
+        raise ForbiddenException
+
+
 def visibility_group_validate(access_token, visibility_group_entity, communication):
     """Validate visibility group permissions for the current user."""
     if not access_token:
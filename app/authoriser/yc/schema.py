@@ -28,7 +28,7 @@ class RequestVersion(BaseModel):
         extra = "allow"
         allow_mutation: True
 
-    @root_validator
+    @root_validator(skip_on_failure=True)
     def parse_request_context(cls, values):
         values["resource"] = values["path"]
         return values
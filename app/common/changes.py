@@ -0,0 +1,116 @@
+# # Native # #
+import json
+import asyncio
+from contextlib import suppress
+from typing import Any, Optional
+
+# # Installed # #
+import asyncpg
+
+# # Package # #
+from core.cache import principal_cache, claims_cache
+from core.database.database import get_engine_url
+from core.settings import settings
+from core.logger import logger
+
+__all__ = (
+    "ChangeListener",
+)
+
+CHANNEL = "auth_changes"
+
+RBAC_TABLES = {"role", "resource", "permission", "team"}
+LINK_TABLES = {"linkroleuser", "linkteamuser"}
+
+
+class ChangeListener:
+    """
+    invalidation bus: triggers on the auth tables NOTIFY `auth_changes` with {"table", "id"}
+    of every changed row, one LISTEN connection per process marks the affected caches stale.
+    while connected the snapshots are polled every `CHANGES_POLL_INTERVAL` seconds as a fallback;
+    on disconnect the polling goes back to the default delay until the listener reconnects
+    """
+
+    RECONNECT_DELAY = 5
+
+    def __init__(self, app: Any):
+        self.app = app
+        self.task: Optional[asyncio.Task] = None
+        self.delays = (app.rbac.RBAC_UPDATE_DELAY, app.visibility_group.VISIBILITY_UPDATE_DELAY)
+
+    def dispatch(self, table: str, id: Optional[str]) -> None:
+        if table in RBAC_TABLES:
+            self.app.rbac.invalidate()
+            if table in ("role", "team"):
+                claims_cache.clear()
+        elif table == "visibility_group":
+            self.app.visibility_group.invalidate()
+            claims_cache.clear()
+        elif table == "user":
+            self.app.visibility_group.invalidate()
+            self.app.access_index.invalidate()
+            principal_cache.invalidate_tag(id)
+            claims_cache.invalidate(id)
+        elif table in LINK_TABLES:
+            self.app.access_index.invalidate()
+            principal_cache.invalidate_tag(id)
+            claims_cache.invalidate(id)
+        elif table == "sessions":
+            # `id` is the access token digest of the deleted session or of the replaced token
+            principal_cache.invalidate(id)
+
+    def on_notification(self, connection: Any, pid: int, channel: str, payload: str) -> None:
+        try:
+            change = json.loads(payload)
+            self.dispatch(change["table"], change.get("id"))
+        except Exception as e:
+            logger.error(f"change notification {payload} not applied: {e}")
+
+    def set_polling(self, connected: bool) -> None:
+        # a process reading the shared snapshot only checks the published file, its delay stays short
+        if self.app.rbac.shared is None:
+            self.app.rbac.RBAC_UPDATE_DELAY = settings.CHANGES_POLL_INTERVAL if connected else self.delays[0]
+        if self.app.visibility_group.shared is None:
+            self.app.visibility_group.VISIBILITY_UPDATE_DELAY = (
+                settings.CHANGES_POLL_INTERVAL if connected else self.delays[1])
+
+    async def run(self) -> None:
+        dsn = get_engine_url().set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _, closed=closed: closed.set())
+                await connection.add_listener(CHANNEL, self.on_notification)
+                # changes made while disconnected were not notified
+                self.app.rbac.invalidate()
+                self.app.visibility_group.invalidate()
+                self.app.access_index.invalidate()
+                principal_cache.clear()
+                claims_cache.clear()
+                self.set_polling(connected=True)
+                logger.info(f"listening to {CHANNEL}")
+                await closed.wait()
+                logger.warning(f"{CHANNEL} listener connection closed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"{CHANNEL} listener failed: {e}")
+            finally:
+                self.set_polling(connected=False)
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(self.RECONNECT_DELAY)
+
+    def start(self) -> None:
+        if settings.CHANGES_LISTEN and self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            # the connection is closed by the task itself
+            with suppress(asyncio.CancelledError):
+                await self.task
+            self.task = None
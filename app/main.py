@@ -7,13 +7,18 @@ import asyncio
 # # Installed # #
 from mangum import Mangum
 from fastapi import FastAPI
+from fastapi.routing import APIRoute
 
 
 # # Package # #
 from app.rbac.util import RBAC
+from app.rbac.access import AccessIndex
 from app.visibility_group.util import VisibilityGroup
 from app.admin import init_admin
+from app.sessions.util import create_sessions_partitions, SessionActivity
+from app.common.changes import ChangeListener
 from core.database.database import init_database # noqa
+from core.database.session import get_session
 from api.v1.api import router
 from core.settings import settings
 from core.logger import logger
@@ -38,18 +43,42 @@ app = FastAPI(
 app.include_router(router)
 
 app.rbac = RBAC()  # store role based access control settings in the app context
+app.rbac.set_routes(  # in-app permission checks look resources up by route template
+    (method, route.path) for route in app.routes if isinstance(route, APIRoute) for method in route.methods)
+app.access_index = AccessIndex(app.rbac)  # who can access / what-if indexes, built on first use
 app.visibility_group = VisibilityGroup()  # store visibility groups settings in the app context
+app.session_activity = SessionActivity()  # buffer of session touches, flushed periodically
+app.changes = ChangeListener(app)  # invalidates the snapshots and caches above on database changes
 
 app.add_middleware(UserMiddleware)
 
 handler = None
 
 
+async def init_sessions_partitions():
+    if not settings.SESSIONS_PARTITION_BY:
+        return
+    async for db_session in get_session():
+        await create_sessions_partitions(db_session)
+
+
 async def on_startup():
     await asyncio.gather(
         init_database(),
         init_admin(app)
         )
+    app.session_activity.start()
+    if os.getenv("AWS_LAMBDA_RUNTIME_API"):
+        # the startup event runs on each invocation: no partition DDL and no LISTEN connection per request,
+        # partitions are left to the cron job and the snapshots are refreshed by polling
+        return
+    await init_sessions_partitions()
+    app.changes.start()
+
+
+async def on_shutdown():
+    await app.changes.stop()
+    await app.session_activity.stop()
 
 
 def wrapper(event, context):
@@ -63,8 +92,10 @@ if os.getenv("AWS_LAMBDA_RUNTIME_API"):
     # mangum emits "startup" event on each request, therefore make it init only once
     logger.debug("Running on Serverless")
     app.on_event("startup")(on_startup)
+    app.on_event("shutdown")(on_shutdown)
     handler = Mangum(app, lifespan="on", api_gateway_base_path=app.root_path)
     # logger.add(handler, enqueue=False)
 else:
     app.on_event("startup")(on_startup)
+    app.on_event("shutdown")(on_shutdown)
     ...
@@ -4,4 +4,4 @@ from .role.model import Role # noqa
 from .sessions.model import Sessions # noqa
 from .team.model import Team # noqa
 from .user.model import User # noqa
-from .visibility_group.model import Visibility_Group # noqa
+from .visibility_group.model import Visibility_Group, Visibility_Group_Changelog # noqa
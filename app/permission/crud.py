@@ -15,6 +15,7 @@ class CRUD(CRUDBase[Permission, ICreate, IUpdate]):
                 and_(
                     Permission.resource_id == permission.resource_id,
                     Permission.role_id == permission.role_id,
+                    Permission.team_id == permission.team_id,
                 )
             )
         )
@@ -7,7 +7,8 @@ import uuid as uuid_pkg
 
 # # Installed # #
 from sqlmodel import SQLModel, Field
-from sqlalchemy import TIMESTAMP, Column, func
+from sqlalchemy import TIMESTAMP, CheckConstraint, Column, ForeignKey, UniqueConstraint, func
+from sqlalchemy.dialects import postgresql
 
 __all__ = (
     "Permission",
@@ -17,7 +18,7 @@ __all__ = (
 class PermissionBase(SQLModel):
     id: uuid_pkg.UUID = Field(
         default_factory=uuid_pkg.uuid4,
-        primary_key=False,
+        primary_key=True,
         index=True,
         nullable=False,
     )
@@ -31,19 +32,25 @@ class PermissionBase(SQLModel):
     created_by: Optional[UUID]
     title: Optional[str]
     description: Optional[str]
-    role_id: UUID = Field(
-        default=None, nullable=False,
-        foreign_key="auth.role.id", primary_key=True
-    )
-    resource_id: UUID = Field(
-        default=None, nullable=False,
-        foreign_key="auth.resource.id", primary_key=True
+    # the permission is granted either to a role or to a team
+    role_id: Optional[UUID] = Field(
+        default=None, nullable=True,
+        foreign_key="auth.role.id", index=True
     )
+    # team permissions go with the team or the resource, they are not link rows of a loaded collection
+    team_id: Optional[UUID] = Field(default=None, sa_column=Column(
+        "team_id", postgresql.UUID(as_uuid=True), ForeignKey("auth.team.id", ondelete="CASCADE"),
+        nullable=True, index=True))
+    resource_id: UUID = Field(default=None, sa_column=Column(
+        "resource_id", postgresql.UUID(as_uuid=True), ForeignKey("auth.resource.id", ondelete="CASCADE"),
+        nullable=False, index=True))
 
 
 class Permission(PermissionBase, table=True):
-    __table_args__ = {
-        'comment': 'Permission',
-        "schema": "auth"
-    }
+    __table_args__ = (
+        UniqueConstraint("role_id", "resource_id", name="permission_role_id_resource_id_key"),
+        UniqueConstraint("team_id", "resource_id", name="permission_team_id_resource_id_key"),
+        CheckConstraint("num_nonnulls(role_id, team_id) = 1", name="permission_principal_check"),
+        {"comment": "Permission", "schema": "auth"},
+    )
     ...
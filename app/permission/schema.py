@@ -1,6 +1,7 @@
 # # Native # #
 
 # # Installed # #
+from pydantic import root_validator
 
 # # Package # #
 from app.permission.model import PermissionBase
@@ -15,7 +16,11 @@ __all__ = (
 
 
 class ICreate(PermissionBase):
-    ...
+    @root_validator
+    def one_principal(cls, values):
+        if (values.get("role_id") is None) == (values.get("team_id") is None):
+            raise ValueError("Either role_id or team_id is required")
+        return values
 
 
 class IRead(PermissionBase, BaseUUIDModel):
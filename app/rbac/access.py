@@ -0,0 +1,168 @@
+# # Native # #
+from datetime import datetime
+from typing import Dict, Iterable, List, Set
+
+# # Installed # #
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+# # Package # #
+from core.settings import settings
+from core.logger import logger
+from core.exceptions import NotFoundException
+from app.rbac.util import RBAC
+from app.rbac.report import get_report_users
+from app.rbac.schema import IRBACValidate, IRBACImpact
+
+__all__ = (
+    "AccessIndex",
+)
+
+
+class AccessIndex:
+    """
+    inverted indexes answering who has access and who is affected by a change, next to the RBAC snapshot:
+    resource -> roles and teams (`RBAC.resource_principals`), role or team -> resources with rbac,
+    role or team -> active users and user -> roles and teams.
+    the resource indexes follow the snapshot version, memberships are reloaded every
+    `RBAC_ACCESS_INDEX_UPDATE_DELAY` seconds or after `invalidate`; built on first use
+    """
+
+    def __init__(self, rbac: RBAC):
+        self.rbac = rbac
+        self.version = ""  # RBAC snapshot version of `principal_resources`
+        self.principal_resources: Dict[str, Set[str]] = {}
+        self.members: Dict[str, Set[str]] = {}
+        self.user_principals: Dict[str, Set[str]] = {}
+        self.emails: Dict[str, str] = {}
+        self.members_update_timestamp = 0
+        self.stale = False
+
+    async def get(self, db_session: AsyncSession):
+        await self.rbac.get(db_session)
+        if self.version != self.rbac.version:
+            principal_resources: Dict[str, Set[str]] = {}
+            resources = self.rbac.rbac['resources']
+            for resource_id, principals in self.rbac.resource_principals.items():
+                if resource_id in resources and resources[resource_id]['rbac_enable']:
+                    for principal in principals:
+                        principal_resources.setdefault(principal, set()).add(resource_id)
+            self.principal_resources = principal_resources
+            self.version = self.rbac.version
+        now = int(datetime.now().timestamp())
+        if self.stale or now - self.members_update_timestamp > settings.RBAC_ACCESS_INDEX_UPDATE_DELAY:
+            self.stale = False
+            await self.update(db_session)
+            self.members_update_timestamp = now
+
+    def invalidate(self):
+        '''
+        reload memberships on the next `get`
+        '''
+        self.stale = True
+
+    async def update(self, db_session: AsyncSession):
+        members: Dict[str, Set[str]] = {}
+        user_principals: Dict[str, Set[str]] = {}
+        emails: Dict[str, str] = {}
+        for user_id, email, principals in await get_report_users(db_session):
+            emails[user_id] = email
+            user_principals[user_id] = set(principals)
+            for principal in principals:
+                members.setdefault(principal, set()).add(user_id)
+        self.members, self.user_principals, self.emails = members, user_principals, emails
+        logger.debug(f"access index: {len(emails)} users, {len(members)} roles and teams with members")
+
+    def get_users(self, principals: Iterable[str]) -> Set[str]:
+        """
+        active users of any of the roles and teams
+        """
+        return set().union(*(self.members.get(i, ()) for i in principals))
+
+    def format_users(self, user_ids: Iterable[str]) -> List[dict]:
+        return sorted(({"id": i, "email": self.emails.get(i, "")} for i in user_ids), key=lambda i: i["email"])
+
+    def who_can_access(self, req: IRBACValidate) -> dict:
+        """
+        roles, teams and users allowed to call the (method, endpoint)
+        """
+        resource_id = self.rbac.match(req.method, req.endpoint)
+        response = {"version": self.rbac.version, "resource_id": resource_id}
+        if resource_id is None:
+            return {**response, "everyone": True, "detail": "resource not found"}
+        if not self.rbac.rbac['resources'][resource_id]['rbac_enable']:
+            return {**response, "everyone": True, "detail": "rbac is disabled"}
+        principals = self.rbac.resource_principals.get(resource_id, set())
+        return {
+            **response,
+            "rbac_enable": True,
+            "detail": "rbac is enabled",
+            "roles": sorted(i for i in principals if i in self.rbac.rbac['roles']),
+            "teams": sorted(i for i in principals if i in self.rbac.rbac['teams']),
+            "users": self.format_users(self.get_users(principals)),
+        }
+
+    def get_impact(self, change: IRBACImpact) -> dict:
+        """
+        users gaining or losing access per resource if the permission or the assignment changes
+        """
+        principal = str(change.role_id or change.team_id)
+        if principal not in self.rbac.rbac['roles'] and principal not in self.rbac.rbac['teams']:
+            raise NotFoundException(detail="Role or team not found")
+        if change.resource_id is not None:
+            resources = self.get_permission_impact(str(change.resource_id), principal, change.op)
+        else:
+            resources = self.get_assignment_impact(str(change.user_id), principal, change.op)
+        return {"version": self.rbac.version, "resources": resources}
+
+    def get_permission_impact(self, resource_id: str, principal: str, op: str) -> List[dict]:
+        resource = self.rbac.rbac['resources'].get(resource_id)
+        if resource is None:
+            raise NotFoundException(detail="Resource not found")
+        if not resource['rbac_enable']:
+            return []
+        before = self.rbac.resource_principals.get(resource_id, set())
+        if op == "add":
+            granted = self.rbac.get_descendants(principal) if principal in self.rbac.rbac['roles'] else {principal}
+            after = before | granted
+        else:
+            # what the other permissions of the resource grant
+            after = set()
+            for permission in self.rbac.rbac['permissions'].values():
+                granted = str(permission['team_id'] or permission['role_id'])
+                if str(permission['resource_id']) != resource_id or granted == principal:
+                    continue
+                after |= self.rbac.get_descendants(granted) if permission['role_id'] else {granted}
+        # only members of the added or removed principals can change, and only if no other principal decides
+        gained = {i for i in self.get_users(after - before) if self.user_principals[i].isdisjoint(before)}
+        lost = {i for i in self.get_users(before - after) if self.user_principals[i].isdisjoint(after)}
+        if not gained and not lost:
+            return []
+        return [{
+            "resource_id": resource_id,
+            "method": resource['method'],
+            "endpoint": resource['endpoint'],
+            "gained": self.format_users(gained),
+            "lost": self.format_users(lost),
+        }]
+
+    def get_assignment_impact(self, user_id: str, principal: str, op: str) -> List[dict]:
+        if user_id not in self.emails:
+            raise NotFoundException(detail="User not found")
+        before = self.user_principals[user_id]
+        after = before | {principal} if op == "add" else before - {principal}
+        user = self.format_users([user_id])
+        resources = []
+        for resource_id in self.principal_resources.get(principal, ()):
+            principals = self.rbac.resource_principals[resource_id]
+            access_before, access_after = not principals.isdisjoint(before), not principals.isdisjoint(after)
+            if access_before == access_after:
+                continue
+            resource = self.rbac.rbac['resources'][resource_id]
+            resources.append({
+                "resource_id": resource_id,
+                "method": resource['method'],
+                "endpoint": resource['endpoint'],
+                "gained": user if access_after else [],
+                "lost": [] if access_after else user,
+            })
+        return sorted(resources, key=lambda i: (i["endpoint"], i["method"]))
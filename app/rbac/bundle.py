@@ -0,0 +1,162 @@
+# # Native # #
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import asyncio
+from datetime import datetime
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+
+# # Installed # #
+import boto3
+from botocore.exceptions import ClientError
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+
+# # Package # #
+from core.settings import settings
+from core.logger import logger
+from core.database.session import get_session
+from app.rbac.util import RBAC
+from app.visibility_group.util import VisibilityGroup
+
+__all__ = (
+    "dump_bundle",
+    "load_bundle",
+    "write_bundle",
+    "read_bundle",
+    "RBACBundle",
+)
+
+MAGIC = b"AUTHBDL1"
+
+# bundle layout: MAGIC | u32 header length | header json | u32 body length | body | RS256 signature
+# header: {"version", "created_at", "visibility"}, body: zlib compressed json {"rbac", "visibility"}.
+# the signature covers everything before it and is made with the access token signing key
+
+
+def dump_bundle(rbac: RBAC, visibility: Optional[dict] = None) -> bytes:
+    header = json.dumps({
+        "version": rbac.version,
+        "created_at": datetime.utcnow().isoformat(),
+        "visibility": visibility is not None,
+    }).encode()
+    body = zlib.compress(json.dumps({"rbac": rbac.rbac, "visibility": visibility}, default=str).encode())
+    data = MAGIC + struct.pack(">I", len(header)) + header + struct.pack(">I", len(body)) + body
+    key = serialization.load_pem_private_key(settings.PEM_PRIVATE_KEY, password=None)
+    return data + key.sign(data, padding.PKCS1v15(), hashes.SHA256())
+
+
+def load_bundle(bundle: bytes) -> Tuple[dict, dict]:
+    """
+    (header, body) of a bundle with a valid signature, ValueError otherwise
+    """
+    if bundle[:len(MAGIC)] != MAGIC:
+        raise ValueError("Unknown bundle format")
+    try:
+        offset = len(MAGIC)
+        (header_length,) = struct.unpack_from(">I", bundle, offset)
+        offset += 4 + header_length
+        (body_length,) = struct.unpack_from(">I", bundle, offset)
+        offset += 4 + body_length
+    except struct.error:
+        raise ValueError("Truncated bundle")
+    if offset > len(bundle):
+        raise ValueError("Truncated bundle")
+    data, signature = bundle[:offset], bundle[offset:]
+    key = serialization.load_pem_public_key(settings.PEM_PUBLIC_KEY)
+    try:
+        key.verify(signature, data, padding.PKCS1v15(), hashes.SHA256())
+    except InvalidSignature:
+        raise ValueError("Invalid bundle signature")
+    header = json.loads(data[len(MAGIC) + 4:len(MAGIC) + 4 + header_length])
+    body = json.loads(zlib.decompress(data[offset - body_length:]))
+    return header, body
+
+
+def write_bundle(path: str, bundle: bytes) -> None:
+    """
+    `path` - local file or s3://bucket/key. a local file is replaced atomically
+    """
+    url = urlparse(path)
+    if url.scheme == "s3":
+        boto3.client("s3").put_object(Bucket=url.netloc, Key=url.path.lstrip("/"), Body=bundle)
+        return
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(bundle)
+    os.replace(tmp_path, path)
+
+
+def read_bundle(path: str, tag: Optional[str] = None) -> Tuple[Optional[bytes], Optional[str]]:
+    """
+    (bundle, tag) of `path`, bundle is None if it did not change since `tag` (file mtime or s3 etag)
+    """
+    url = urlparse(path)
+    if url.scheme == "s3":
+        try:
+            response = boto3.client("s3").get_object(
+                Bucket=url.netloc, Key=url.path.lstrip("/"), **({"IfNoneMatch": tag} if tag else {}))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "304":
+                return None, tag
+            raise
+        return response["Body"].read(), response["ETag"]
+    stat = os.stat(path)
+    current = f"{stat.st_ino}.{stat.st_mtime_ns}"
+    if current == tag:
+        return None, tag
+    with open(path, "rb") as f:
+        return f.read(), current
+
+
+class RBACBundle:
+    """
+    RBAC snapshot loaded from a signed bundle instead of the database, checked for a new version
+    at most once per `AUTHORISER_BUNDLE_POLL_INTERVAL` seconds.
+    a bundle failing verification is not loaded, the previous version stays in use
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rbac = RBAC()
+        self.tag: Optional[str] = None
+        self.polled_at = 0.0
+
+    def get(self) -> RBAC:
+        if self.rbac.rbac and time.monotonic() - self.polled_at < settings.AUTHORISER_BUNDLE_POLL_INTERVAL:
+            return self.rbac
+        self.polled_at = time.monotonic()
+        try:
+            bundle, tag = read_bundle(self.path, self.tag)
+            if bundle is not None:
+                header, body = load_bundle(bundle)
+                self.rbac.load(body["rbac"])
+                self.tag = tag
+                logger.info(f"RBAC bundle loaded: {self.path}, version {header['version']}")
+        except Exception as e:
+            if not self.rbac.rbac:
+                raise
+            logger.error(f"RBAC bundle {self.path} not loaded, version {self.rbac.version} kept: {e}")
+        return self.rbac
+
+
+async def main(path: str, visibility: bool = False):
+    async for db_session in get_session():
+        rbac = RBAC()
+        await rbac.update(db_session)
+        groups = None
+        if visibility:
+            groups = {k: json.loads(v.json()) for k, v in (await VisibilityGroup().get(db_session)).items()}
+        bundle = dump_bundle(rbac, groups)
+        write_bundle(path, bundle)
+        logger.info(f"RBAC bundle written: {path}, version {rbac.version}, {len(bundle)} bytes")
+
+
+if __name__ == "__main__":
+    # python -m app.rbac.bundle <path> [--visibility]
+    asyncio.run(main(sys.argv[1], visibility="--visibility" in sys.argv[2:]))
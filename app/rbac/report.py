@@ -0,0 +1,184 @@
+# # Native # #
+import io
+import os
+import csv
+import sys
+import json
+import base64
+import asyncio
+import argparse
+from typing import Iterator, List, Sequence, Tuple
+
+if __name__ == "__main__":
+    # the report may be written to stdout: the logs go to stderr from the first record on,
+    # the settings are logged as soon as they are imported (see core/logger.py)
+    os.environ.setdefault("LOG_STREAM", "stderr")
+
+# # Installed # #
+import numpy as np
+from sqlmodel import select, func
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+# # Package # #
+from core.settings import settings
+from core.logger import logger
+from core.database.session import get_session
+from app.rbac.util import RBAC
+from app.user.model import User
+from app.common.links import LinkRoleUser, LinkTeamUser
+
+__all__ = (
+    "get_report_users",
+    "AccessReport",
+)
+
+CSV_HEADER = ("user_id", "email", "resource_id", "method", "endpoint")
+
+
+async def get_report_users(db_session: AsyncSession, inactive: bool = False) -> List[Tuple[str, str, List[str]]]:
+    """
+    (user_id, email, role and team ids) of every user, active users only unless `inactive`
+    """
+    role_ids = select(func.array_agg(LinkRoleUser.role_id)).where(
+        LinkRoleUser.user_id == User.id).scalar_subquery()
+    team_ids = select(func.array_agg(LinkTeamUser.team_id)).where(
+        LinkTeamUser.user_id == User.id).scalar_subquery()
+    statement = select(User.id, User.email, role_ids, team_ids).order_by(User.email)
+    if not inactive:
+        statement = statement.where(User.is_active)
+    response = await db_session.exec(statement)
+    return [
+        (str(user_id), email or "", [str(i) for i in (roles or []) + (teams or [])])
+        for user_id, email, roles, teams in response.all()
+    ]
+
+
+class AccessReport:
+    """
+    effective access of every user to every resource, computed in bulk instead of a decision per pair:
+    the boolean product of the user x principal (roles and teams) membership and the principal x resource
+    grants of the snapshot (inherited role permissions included), resources without rbac are open to everyone.
+    users with the same roles and teams share one access row and rows are bit-packed, the memory is about
+    principals x resources + distinct combinations x resources / 8 bytes and has to fit
+    `RBAC_REPORT_MEMORY_BUDGET`; the output is expanded per user or per resource block within it
+    """
+
+    def __init__(self, rbac: RBAC, users: Sequence[Tuple[str, str, Sequence[str]]], memory_budget: int = 0):
+        # the snapshot structures are replaced, not mutated, on update: the report keeps a consistent version
+        self.version = rbac.version
+        self.resources = rbac.rbac['resources']
+        self.resource_principals = rbac.resource_principals
+        self.resource_ids = list(self.resources)
+        self.users = users
+        self.memory_budget = memory_budget or settings.RBAC_REPORT_MEMORY_BUDGET
+        self.access = None  # distinct principal combinations x resources, bit-packed, see `build`
+        self.inverse = None  # user -> row of `access`
+
+    def build(self) -> None:
+        principals = sorted({p for i in self.resource_principals.values() for p in i})
+        index = {p: i for i, p in enumerate(principals)}
+        resources = len(self.resource_ids)
+        row_bytes = (resources + 7) // 8
+
+        # user x principal membership as rows of distinct combinations: principals not granted anything
+        # do not change the access and are left out, the last row (resources without rbac) is in every one
+        combinations = {}
+        self.inverse = np.empty(len(self.users), dtype=np.int32)
+        for i, (_, _, user_principals) in enumerate(self.users):
+            key = frozenset(index[p] for p in user_principals if p in index)
+            self.inverse[i] = combinations.setdefault(key, len(combinations))
+
+        required = (len(principals) + 1) * (resources + row_bytes) + len(combinations) * row_bytes
+        required += len(self.users) * 4
+        if required > self.memory_budget:
+            raise ValueError(
+                f"access report needs {required} bytes, more than the memory budget {self.memory_budget}")
+
+        # principal x resource grants, bit-packed along the resources
+        grants = np.zeros((len(principals) + 1, resources), dtype=bool)
+        for j, resource_id in enumerate(self.resource_ids):
+            for p in self.resource_principals.get(resource_id, ()):
+                grants[index[p], j] = True
+        grants[len(principals)] = [not i['rbac_enable'] for i in self.resources.values()]
+        grants = np.packbits(grants, axis=1)
+
+        # the boolean product membership x grants: a combination row is the OR of the rows of its principals
+        self.access = np.empty((len(combinations), row_bytes), dtype=np.uint8)
+        for row, key in enumerate(combinations):
+            self.access[row] = np.bitwise_or.reduce(grants[[*key, len(principals)]], axis=0)
+        logger.info(
+            f"access report: {len(self.users)} users, {len(combinations)} principal combinations, "
+            f"{len(principals)} principals, {resources} resources, version {self.version}")
+
+    def get_allowed(self, user: int) -> np.ndarray:
+        """
+        indexes of the resources the user (position in `users`) can access
+        """
+        return np.flatnonzero(np.unpackbits(self.access[self.inverse[user]], count=len(self.resource_ids)))
+
+    def iter_csv(self, chunk_size: int = 1 << 20) -> Iterator[str]:
+        """
+        one row per (user, resource) with access, yielded in chunks of about `chunk_size` characters
+        """
+        if self.access is None:
+            self.build()
+        resources = [(i, self.resources[i]['method'], self.resources[i]['endpoint']) for i in self.resource_ids]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(CSV_HEADER)
+        for i, (user_id, email, _) in enumerate(self.users):
+            writer.writerows((user_id, email, *resources[j]) for j in self.get_allowed(i))
+            if buffer.tell() > chunk_size:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    def iter_columns(self) -> Iterator[str]:
+        """
+        columnar json lines: {"version", "users": [[user_id, email], ...]} first, then one line per resource
+        {"resource_id", "method", "endpoint", "count", "users"} with `users` the base64 bitmap of the users
+        with access, in the order of the first line (np.unpackbits(base64 decoded, count=len(users)))
+        """
+        if self.access is None:
+            self.build()
+        yield json.dumps({"version": self.version, "users": [[i[0], i[1]] for i in self.users]}) + "\n"
+        # resource columns are expanded from the combination rows in blocks of whole bytes,
+        # a block of resources x users takes a quarter of the budget
+        block = max(1, self.memory_budget // 4 // max(1, len(self.users) * 8))
+        for start in range(0, self.access.shape[1], block):
+            columns = np.unpackbits(self.access[:, start:start + block], axis=1).T[:, self.inverse]
+            for j, column in enumerate(columns[:len(self.resource_ids) - start * 8]):
+                resource_id = self.resource_ids[start * 8 + j]
+                yield json.dumps({
+                    "resource_id": resource_id,
+                    "method": self.resources[resource_id]['method'],
+                    "endpoint": self.resources[resource_id]['endpoint'],
+                    "count": int(np.count_nonzero(column)),
+                    "users": base64.b64encode(np.packbits(column).tobytes()).decode(),
+                }) + "\n"
+
+
+async def main(path: str, output_format: str = "csv", inactive: bool = False):
+    async for db_session in get_session():
+        rbac = RBAC()
+        await rbac.update(db_session)
+        users = await get_report_users(db_session, inactive=inactive)
+    report = AccessReport(rbac, users)
+    output = sys.stdout if path == "-" else open(path, "w", newline="")
+    try:
+        for part in report.iter_csv() if output_format == "csv" else report.iter_columns():
+            output.write(part)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    # python -m app.rbac.report <path or -> [--format csv|columns] [--inactive]
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "columns"], default="csv")
+    parser.add_argument("--inactive", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(args.path, args.format, args.inactive))
@@ -1,22 +1,33 @@
 # # Native # #
-from typing import Optional
+from typing import List, Literal, Optional
 from urllib.parse import urlparse
+from uuid import UUID
 
 # # Installed # #
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, root_validator, validator
 
 # # Installed # #
 from core.logger import logger
+from core.settings import settings
 
 __all__ = (
     "IRBACRead",
     "IRBACValidate",
     "IRBACValidateResponse",
+    "IRBACValidateBatch",
+    "IRBACValidateBatchResponse",
+    "IRBACEffectivePermissions",
+    "IRBACUser",
+    "IRBACAccess",
+    "IRBACImpact",
+    "IRBACImpactResponse",
 )
 
 
 class IRBACRead(BaseModel):
     roles: Optional[dict]
+    # role id -> parent role id
+    hierarchy: Optional[dict]
     teams: Optional[dict]
     resources: Optional[dict]
     permissions: Optional[dict]
@@ -52,5 +63,94 @@ class IRBACValidateResponse(BaseModel):
     access: bool = True
     rbac_enable: bool = False
     visibility_group_enable: bool = False
+    visibility_group_entity: Optional[str]
     # permissions: list = []
     detail: str = ""
+
+
+class IRBACValidateBatch(BaseModel):
+    requests: List[IRBACValidate]
+
+    @validator('requests')
+    def requests_limit(cls, v):
+        if not v:
+            raise ValueError("Empty list is not allowed")
+        if len(v) > settings.RBAC_VALIDATE_BATCH_LIMIT:
+            raise ValueError(f"No more than {settings.RBAC_VALIDATE_BATCH_LIMIT} requests are allowed")
+        return v
+
+
+class IRBACValidateBatchResponse(BaseModel):
+    # in the order of the requests
+    results: List[IRBACValidateResponse]
+
+
+class IRBACEffectiveResource(BaseModel):
+    resource_id: str
+    method: str
+    endpoint: str
+    access: bool
+    rbac_enable: bool = False
+    visibility_group_enable: bool = False
+    visibility_group_entity: Optional[str]
+
+
+class IRBACEffectivePermissions(BaseModel):
+    # RBAC snapshot version
+    version: str
+    resources: List[IRBACEffectiveResource]
+
+
+class IRBACUser(BaseModel):
+    id: str
+    email: str
+
+
+class IRBACAccess(BaseModel):
+    # RBAC snapshot version
+    version: str
+    resource_id: Optional[str]
+    rbac_enable: bool = False
+    # every user has access: no resource matches the request or rbac is disabled for it
+    everyone: bool = False
+    detail: str = ""
+    # roles and teams having access, roles inheriting the permission included
+    roles: List[str] = []
+    teams: List[str] = []
+    # active users of the roles and teams above, empty if `everyone`
+    users: List[IRBACUser] = []
+
+
+class IRBACImpact(BaseModel):
+    """
+    a permission change (`resource_id`) or a role or team assignment change (`user_id`)
+    of a role or a team
+    """
+    op: Literal["add", "remove"]
+    role_id: Optional[UUID]
+    team_id: Optional[UUID]
+    resource_id: Optional[UUID]
+    user_id: Optional[UUID]
+
+    @root_validator
+    def one_principal_and_target(cls, values):
+        if (values.get('role_id') is None) == (values.get('team_id') is None):
+            raise ValueError("Either role_id or team_id is required")
+        if (values.get('resource_id') is None) == (values.get('user_id') is None):
+            raise ValueError("Either resource_id or user_id is required")
+        return values
+
+
+class IRBACImpactResource(BaseModel):
+    resource_id: str
+    method: str
+    endpoint: str
+    gained: List[IRBACUser] = []
+    lost: List[IRBACUser] = []
+
+
+class IRBACImpactResponse(BaseModel):
+    # RBAC snapshot version
+    version: str
+    # resources some user gains or loses access to
+    resources: List[IRBACImpactResource]
@@ -1,6 +1,10 @@
 # # Native # #
 import re
+import json
+import hashlib
+from collections import deque
 from datetime import datetime
+from typing import Deque, Dict, Iterable, List, Optional, Pattern, Set, Tuple
 
 # # Installed # #
 import httpx
@@ -11,32 +15,105 @@ from app import crud
 from core.security import verify_jwt_token
 from core.settings import settings
 from core.logger import logger
+from core.cache import TTLCache
+from core.snapshot import SharedSnapshot
 from app.rbac.schema import IRBACValidate, IRBACValidateResponse
 
 __all__ = (
     "RBAC",
+    "get_snapshot_changes",
 )
 
+SECTIONS = ("roles", "hierarchy", "teams", "resources", "permissions")
+
+
+def get_snapshot_changes(previous: dict, current: dict) -> List[dict]:
+    """
+    entries added, updated and deleted between two snapshots:
+    {"section": "resources", "op": "add" | "update" | "delete", "id": ..., "value": ...}
+    """
+    changes = []
+    for section in SECTIONS:
+        old, new = previous.get(section) or {}, current.get(section) or {}
+        for key, value in new.items():
+            if key not in old:
+                changes.append({"section": section, "op": "add", "id": key, "value": value})
+            elif old[key] != value:
+                changes.append({"section": section, "op": "update", "id": key, "value": value})
+        for key in old.keys() - new.keys():
+            changes.append({"section": section, "op": "delete", "id": key, "value": None})
+    return changes
+
 
 class RBAC:
     def __init__(self):
         self.rbac = {}
         self.rbac_update_timestamp = 0
+        self.stale = False  # set on change notifications, see `invalidate`
         self.RBAC_UPDATE_DELAY = 1  # TODO: increase this to value
+        self.RBAC_MATCH_CACHE_SIZE = 10000
         self.patterns = {"$str$": r"[\w.-]+", "$uuid$": r"[\w.-]+"}
+        # resources in snapshot order with compiled endpoint patterns: (resource_id, method, pattern)
+        self.matchers: List[Tuple[str, str, Pattern]] = []
+        # (method, endpoint) -> matched resource_id, reused until resources change
+        self.matches: Dict[Tuple[str, str], Optional[str]] = {}
+        # (method, path template) of the application routes, see `set_routes`
+        self.routes: List[Tuple[str, str]] = []
+        # (method, path template) -> resource_id deciding every request of the route, rebuilt with matchers.
+        # routes missing here are matched by the request url
+        self.route_resources: Dict[Tuple[str, str], Optional[str]] = {}
+        # role_id -> child role ids
+        self.children: Dict[str, List[str]] = {}
+        # resource_id -> roles and teams having access to it, role permissions inherited from ancestor roles
+        self.resource_principals: Dict[str, Set[str]] = {}
+        # digest of the snapshot content, the same in every process loading the same rules
+        self.version = ""
+        # (previous version, version, changes) of the latest snapshot updates, see `get_changes_since`
+        self.history: Deque[Tuple[str, str, List[dict]]] = deque(maxlen=settings.RBAC_CHANGES_HISTORY)
+        # GET /rbac response body of the current version, see `get_serialized`
+        self.serialized: Optional[bytes] = None
+        # effective permissions per distinct set of principals, see `get_effective_permissions`
+        self.effective = TTLCache(ttl=None, maxsize=1000)
+        # snapshot shared with the other worker processes of the host
+        self.shared = SharedSnapshot("rbac") if settings.SNAPSHOT_SHARED else None
 
     async def get(
         self,
         db_session: AsyncSession,
     ):
-        if not self.rbac:
-            await self.update(db_session)
+        if not self.rbac or self.stale:
+            self.stale = False
+            await self.refresh(db_session)
             self.rbac_update_timestamp = int(datetime.now().timestamp())
         if (int(datetime.now().timestamp()) - self.rbac_update_timestamp) > self.RBAC_UPDATE_DELAY:
-            await self.update(db_session)
+            await self.refresh(db_session)
             self.rbac_update_timestamp = int(datetime.now().timestamp())
         return self.rbac
 
+    def invalidate(self):
+        '''
+        refresh on the next `get`
+        '''
+        self.stale = True
+
+    async def refresh(
+        self,
+        db_session: AsyncSession,
+    ):
+        '''
+        read the database, or the snapshot published by the refresher process of the host in shared mode
+        '''
+        if self.shared is not None and not self.shared.is_refresher():
+            published = self.shared.read()
+            if published is not None:
+                self.load(published[1])
+            if self.rbac and not self.shared.refused:
+                return
+            # nothing is published yet, or the published file is not trusted
+        await self.update(db_session)
+        if self.shared is not None and self.shared.is_refresher():
+            self.shared.publish(self.version, self.rbac)
+
     async def update(
         self,
         db_session: AsyncSession,
@@ -44,22 +121,28 @@ class RBAC:
         '''
         read database, make rules, save rules to self.rbac
         '''
-        data = {"roles": {}, "resources": {}, "permissions": {}}
+        data = {"roles": {}, "hierarchy": {}, "teams": {}, "resources": {}, "permissions": {}}
         roles = await crud.role.get_all(db_session)
+        teams = await crud.team.get_all(db_session)
         resources = await crud.resource.get_all(db_session)
         permissions = await crud.permission.get_all(db_session)
         for i in roles:
             data['roles'][str(i.id)] = i.title
+            data['hierarchy'][str(i.id)] = str(i.parent_id) if i.parent_id else None
+        for i in teams:
+            data['teams'][str(i.id)] = i.title
         for i in resources:
             data['resources'][str(i.id)] = {
                 "endpoint": i.endpoint,
                 "method": i.method,
                 "rbac_enable": i.rbac_enable,
-                "visibility_group_enable": i.visibility_group_enable
+                "visibility_group_enable": i.visibility_group_enable,
+                "visibility_group_entity": i.visibility_group_entity,
             }
         for i in permissions:
             data['permissions'][str(i.id)] = {
                 "role_id": i.role_id,
+                "team_id": i.team_id,
                 "resource_id": i.resource_id
             }
         for _ in [data['resources'], data['permissions']]:
@@ -67,8 +150,107 @@ class RBAC:
                 if not isinstance(k, str) or not isinstance(v, dict):
                     ...
                     # TODO raise error
+        self.load(data)
+
+    def load(self, data: dict):
+        '''
+        save rules and build the lookup structures used by `decide`
+        '''
+        if data['resources'] != self.rbac.get('resources'):
+            self.matchers = []
+            for resource_id, resource in data['resources'].items():
+                # replace $str$ and $uuid$ with regex.
+                endpoint = resource['endpoint']
+                for pattern, regexp in self.patterns.items():
+                    endpoint = endpoint.replace(pattern, regexp)
+                self.matchers.append((resource_id, resource['method'], re.compile(endpoint)))
+            self.matches = {}
+            self.route_resources = self.map_routes(data['resources'])
+        # a permission of a role is granted to all of its descendants
+        self.children = {}
+        for role_id, parent_id in data.get('hierarchy', {}).items():
+            if parent_id:
+                self.children.setdefault(parent_id, []).append(role_id)
+        descendants: Dict[str, Set[str]] = {}
+        self.resource_principals = {}
+        for permission in data['permissions'].values():
+            # role and team ids are uuids, they share one set without clashing
+            if permission.get('team_id'):
+                self.resource_principals.setdefault(str(permission['resource_id']), set()).add(
+                    str(permission['team_id']))
+                continue
+            role_id = str(permission['role_id'])
+            if role_id not in descendants:
+                descendants[role_id] = self.get_descendants(role_id)
+            self.resource_principals.setdefault(str(permission['resource_id']), set()).update(descendants[role_id])
+        version = hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+        if version != self.version:
+            self.effective.clear()
+            self.serialized = None
+            if self.rbac:
+                self.history.append((self.version, version, get_snapshot_changes(self.rbac, data)))
+        self.version = version
         self.rbac = data
 
+    def get_descendants(self, role_id: str) -> Set[str]:
+        """
+        the role and all roles below it in the hierarchy
+        """
+        descendants = {role_id}
+        stack = list(self.children.get(role_id, []))
+        while stack:
+            child = stack.pop()
+            if child not in descendants:
+                descendants.add(child)
+                stack.extend(self.children.get(child, []))
+        return descendants
+
+    def get_changes_since(self, version: str) -> Optional[List[Tuple[str, str, List[dict]]]]:
+        """
+        snapshot updates after `version`, oldest first; None if `version` is not in the history
+        """
+        if version == self.version:
+            return []
+        updates = []
+        for update in reversed(self.history):
+            updates.append(update)
+            if update[0] == version:
+                return updates[::-1]
+        return None
+
+    def get_serialized(self) -> bytes:
+        """
+        GET /rbac response body, serialized once per snapshot version
+        """
+        if self.serialized is None:
+            self.serialized = json.dumps(
+                {"message": "Data got correctly", "meta": {}, "data": self.rbac}, default=str).encode()
+        return self.serialized
+
+    def get_delta(self, since: str) -> Optional[dict]:
+        """
+        entries changed after version `since`, one per entry with its current value;
+        None if `since` is not in the history
+        """
+        updates = self.get_changes_since(since)
+        if updates is None:
+            return None
+        added, touched = set(), {}
+        for _, _, changes in updates:
+            for change in changes:
+                key = (change["section"], change["id"])
+                if key not in touched and change["op"] == "add":
+                    added.add(key)
+                touched[key] = True
+        changes = []
+        for section, key in touched:
+            if key in self.rbac[section]:
+                op = "add" if (section, key) in added else "update"
+                changes.append({"section": section, "op": op, "id": key, "value": self.rbac[section][key]})
+            elif (section, key) not in added:
+                changes.append({"section": section, "op": "delete", "id": key, "value": None})
+        return {"version": self.version, "since": since, "changes": changes}
+
     async def get_from_api(self):
         async with httpx.ClientSession() as session:
             url = f'{settings.HOSTNAME}/api/rbac'
@@ -76,65 +258,186 @@ class RBAC:
                 r = await r.json()
         return r['data']
 
-    async def validate(
-        self,
-        db_session: AsyncSession,
-        req: IRBACValidate,
-        access_token: str,
-    ) -> IRBACValidateResponse:
-        logger.debug(f"validate request: {req}")
-        payload = await verify_jwt_token(token=access_token, token_type="access", db_session=db_session, crud=crud)
-        self.rbac = await self.get(db_session)
+    def find(self, method: str, endpoint: str) -> Optional[str]:
+        '''
+        resource_id of the first resource matching the request
+        '''
+        for resource_id, matcher_method, pattern in self.matchers:
+            if matcher_method == method and pattern.fullmatch(endpoint):
+                logger.debug(f"matched resource: {endpoint} {pattern.pattern}")
+                return resource_id
+        return None
+
+    def match(self, method: str, endpoint: str) -> Optional[str]:
+        '''
+        resource_id of the first resource matching the request, matches are memoized per (method, endpoint)
+        '''
+        key = (method, endpoint)
+        if key in self.matches:
+            return self.matches[key]
+        resource_id = self.find(method, endpoint)
+        if len(self.matches) < self.RBAC_MATCH_CACHE_SIZE:
+            self.matches[key] = resource_id
+        return resource_id
+
+    def set_routes(self, routes: Iterable[Tuple[str, str]]):
+        '''
+        (method, path template) of the application routes, e.g. ("GET", "/api/auth/v1/role/{role_id}")
+        '''
+        self.routes = [(method.lower(), path) for method, path in routes]
+        if self.rbac:
+            self.route_resources = self.map_routes(self.rbac['resources'])
+
+    def map_routes(self, resources: dict) -> Dict[Tuple[str, str], Optional[str]]:
+        '''
+        the resource matching every url of a route, found by matching the route with sample parameter values.
+        a route is left to url matching if the samples match different resources, if another resource
+        matches the route template (e.g. "/role/admin" for "/role/{role_id}") or for multi-segment parameters
+        '''
+        route_resources = {}
+        for method, path in self.routes:
+            if ":path}" in path:
+                continue
+            parts = re.split(r"\{[^}]*\}", path)
+            samples = {
+                self.find(method, sample.join(parts).lower())
+                for sample in ["00000000-0000-0000-0000-000000000000", "sample"]
+            }
+            if len(samples) != 1:
+                continue
+            resource_id = samples.pop()
+            if len(parts) == 1:
+                # no parameters, the route has a single url
+                route_resources[(method, path)] = resource_id
+                continue
+            template = re.compile("[^/]+".join(re.escape(i.lower()) for i in parts))
+            if any(
+                i != resource_id and resource['method'] == method and template.fullmatch(resource['endpoint'])
+                for i, resource in resources.items()
+            ):
+                continue
+            route_resources[(method, path)] = resource_id
+        return route_resources
+
+    def match_route(self, method: str, path: Optional[str], url: str) -> Optional[str]:
+        '''
+        resource_id for an in-app request: looked up by the route template, the url is matched
+        only for routes without a mapping
+        '''
+        key = (method.lower(), path)
+        if key in self.route_resources:
+            return self.route_resources[key]
+        req = IRBACValidate(endpoint=url, method=method)
+        return self.match(req.method, req.endpoint)
+
+    @staticmethod
+    def get_principals(payload: dict) -> Set[str]:
+        """
+        role and team ids of the access token claims
+        """
+        return {*map(str, payload['roles']), *map(str, payload.get('teams') or [])}
+
+    def decide(self, req: IRBACValidate, principals: Set[str]) -> dict:
+        return self.decide_resource(self.match(req.method, req.endpoint), principals)
+
+    def decide_resource(self, resource_id: Optional[str], principals: Set[str]) -> dict:
         response = {
             "access": True,
             "rbac_enable": False,
             "visibility_group_enable": False,
-            "permissions": [],
             "detail": ""
         }
-        # find resource_id
-        for resource_id, resource in self.rbac['resources'].items():
-            if not resource['method'] == req.method:
-                continue
-
-            # replace $str$ and $uuid$ with regex.
-            endpoint = resource['endpoint']
-            for pattern, regexp in self.patterns.items():
-                endpoint = endpoint.replace(pattern, regexp)
-
-            logger.debug(f"matching {endpoint} with {req.endpoint}")
-            if re.fullmatch(endpoint, req.endpoint):
-                logger.debug(f"matched resource: {req.endpoint} {endpoint}")
-                response["resource_id"] = resource_id
-                response['rbac_enable'] = resource['rbac_enable']
-                response['visibility_group_enable'] = resource['visibility_group_enable']
-                break
-
-        if "resource_id" not in response:
+        if resource_id is None:
             response["detail"] = "resource not found"
             logger.debug(
                 f"resource not found, hence access allowed; response: {response}")
             return response
 
+        resource = self.rbac['resources'][resource_id]
+        response["resource_id"] = resource_id
+        response['rbac_enable'] = resource['rbac_enable']
+        response['visibility_group_enable'] = resource['visibility_group_enable']
+        response['visibility_group_entity'] = resource.get('visibility_group_entity')
+
         if not response['rbac_enable']:
             response["detail"] = "rbac is disabled"
             logger.debug(
                 f"resource was found and rbac is disabled, hence access allowed; response: {response}")
             return response
 
-        # find permissions by user role_id and resource_id
-        for _, v in self.rbac['permissions'].items():
-            if str(v['role_id']) in payload['roles'] and str(v['resource_id']) == response['resource_id']:
-                response['permissions'].append(v)
-
-        if not response['permissions']:
+        # roles and teams having the permission, inherited role permissions included
+        if self.resource_principals.get(resource_id, set()).isdisjoint(principals):
             response['access'] = False
             response["detail"] = "no permissions found"
             logger.debug(
-                f"rbac is enabled, no permissions found for the role, hence access denied; response: {response}")
+                f"rbac is enabled, no permissions found for the principals, hence access denied; response: {response}")
             return response
 
         response["detail"] = "rbac is enabled, permissions found"
         logger.debug(
             f"rbac is enabled, permissions found for the role, hence access allowed; response: {response}")
         return response
+
+    async def validate(
+        self,
+        db_session: AsyncSession,
+        req: IRBACValidate,
+        access_token: Optional[str] = None,
+        payload: Optional[dict] = None,
+    ) -> IRBACValidateResponse:
+        """
+        `payload` - claims of an already verified access token, `access_token` is verified otherwise
+        """
+        logger.debug(f"validate request: {req}")
+        if payload is None:
+            payload = await verify_jwt_token(token=access_token, token_type="access", db_session=db_session, crud=crud)
+        await self.get(db_session)
+        return self.decide(req, self.get_principals(payload))
+
+    async def validate_route(
+        self,
+        db_session: AsyncSession,
+        method: str,
+        path: Optional[str],
+        url: str,
+        payload: dict,
+    ) -> IRBACValidateResponse:
+        """
+        decision for a request served by this application: `path` - template of the matched route,
+        `payload` - claims of the verified access token
+        """
+        await self.get(db_session)
+        return self.decide_resource(self.match_route(method, path, url), self.get_principals(payload))
+
+    async def validate_batch(
+        self,
+        db_session: AsyncSession,
+        reqs: List[IRBACValidate],
+        access_token: Optional[str] = None,
+        payload: Optional[dict] = None,
+    ) -> List[IRBACValidateResponse]:
+        """
+        decisions for several requests from one token verification and one snapshot read
+        """
+        logger.debug(f"validate batch request: {len(reqs)} items")
+        if payload is None:
+            payload = await verify_jwt_token(token=access_token, token_type="access", db_session=db_session, crud=crud)
+        await self.get(db_session)
+        principals = self.get_principals(payload)
+        return [self.decide(req, principals) for req in reqs]
+
+    def get_effective_permissions(self, principals: Set[str]) -> dict:
+        """
+        every resource with the access the roles and teams (see `get_principals`) have to it, in the matching order
+        (the first resource matching a request decides, requests matching no resource are allowed)
+        """
+        key = frozenset(principals)
+        effective = self.effective.get(key)
+        if effective is None:
+            effective = {"version": self.version, "resources": []}
+            for resource_id, resource in self.rbac['resources'].items():
+                principals_with_access = self.resource_principals.get(resource_id, set())
+                access = not resource['rbac_enable'] or not principals_with_access.isdisjoint(key)
+                effective["resources"].append({"resource_id": resource_id, "access": access, **resource})
+            self.effective.set(key, effective)
+        return effective
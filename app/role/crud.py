@@ -1,19 +1,98 @@
 # # Native # #
+from typing import Any, Dict, List, Optional, Union
+from uuid import UUID
 
 # # Installed # #
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import select
+from sqlalchemy import func, literal, text
+from sqlalchemy.orm import aliased, selectinload
 
 # # Package # #
 from app.role.schema import ICreate, IUpdate
 from app.role.model import Role
 from core.base.crud import CRUDBase
+from core.cache import claims_cache
+from core.exceptions import BadRequestException, ConflictException
 
 
 class CRUD(CRUDBase[Role, ICreate, IUpdate]):
+    loaders = {
+        "detail": [selectinload(Role.resources)],
+        "list": [selectinload(Role.resources)],
+        "delete": [selectinload(Role.resources), selectinload(Role.users)],
+    }
+
     async def get_role_by_title(self, db_session: AsyncSession, *, title: str) -> Role:
         role = await db_session.exec(select(Role).where(Role.title == title))
         return role.first()
 
+    async def get_ancestor_ids(self, db_session: AsyncSession, *, id: Union[UUID, str]) -> List[UUID]:
+        """
+        the role itself and its ancestors, nearest first
+        """
+        ancestors = select(Role.id, Role.parent_id, literal(0).label("depth")).where(
+            Role.id == id).cte("ancestors", recursive=True)
+        parent = aliased(Role)
+        # the depth limit stops on cycles made bypassing `check_parent`
+        ancestors = ancestors.union(
+            select(parent.id, parent.parent_id, ancestors.c.depth + 1).join(
+                ancestors, parent.id == ancestors.c.parent_id).where(ancestors.c.depth < 100)
+        )
+        response = await db_session.execute(
+            select(ancestors.c.id, func.min(ancestors.c.depth).label("depth"))
+            .group_by(ancestors.c.id).order_by(text("depth")))
+        return [i[0] for i in response.all()]
+
+    async def check_parent(
+        self, db_session: AsyncSession, *, id: Optional[Union[UUID, str]], parent_id: Optional[Union[UUID, str]]
+    ) -> None:
+        """
+        the parent has to exist and the role must not be among its ancestors.
+        hierarchy changes are serialized by a transaction level lock, so concurrent
+        changes can not create a cycle either
+        """
+        if parent_id is None:
+            return
+        await db_session.execute(text("SELECT pg_advisory_xact_lock(hashtext('auth.role.parent_id'))"))
+        ancestors = await self.get_ancestor_ids(db_session, id=parent_id)
+        if not ancestors:
+            raise BadRequestException(detail="Parent role does not exist")
+        if id is not None and str(id) in map(str, ancestors):
+            raise ConflictException(detail="Role hierarchy can not contain cycles")
+
+    async def create(
+        self,
+        db_session: AsyncSession,
+        *,
+        obj_in: Union[ICreate, Role],
+        created_by: Optional[Union[UUID, str]] = None
+    ) -> Role:
+        await self.check_parent(db_session, id=None, parent_id=obj_in.parent_id)
+        obj = await super().create(db_session, obj_in=obj_in, created_by=created_by)
+        # resources are not loaded by refresh
+        return await self.get(db_session, id=obj.id)
+
+    async def update(
+        self,
+        db_session: AsyncSession,
+        *,
+        obj_current: Role,
+        obj_new: Union[IUpdate, Dict[str, Any], Role],
+    ) -> Role:
+        update_data = obj_new if isinstance(obj_new, dict) else obj_new.dict(exclude_unset=True)
+        if "parent_id" in update_data:
+            await self.check_parent(db_session, id=obj_current.id, parent_id=update_data["parent_id"])
+        obj = await super().update(db_session, obj_current=obj_current, obj_new=obj_new)
+        claims_cache.clear()
+        return await self.get(db_session, id=obj.id)
+
+    async def remove(
+        self, db_session: AsyncSession, *, id: Union[UUID, str], profile: Optional[str] = "delete"
+    ) -> Role:
+        obj = await super().remove(db_session, id=id, profile=profile)
+        claims_cache.clear()
+        return obj
+
 
 role = CRUD(Role)
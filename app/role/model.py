@@ -1,8 +1,10 @@
 # # Native # #
 from typing import List, Optional
+from uuid import UUID
 
 # # Installed # #
-from sqlalchemy import Boolean
+from sqlalchemy import Boolean, ForeignKey
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.sql import expression
 from sqlmodel import SQLModel, Relationship, Field, Column
 
@@ -20,6 +22,10 @@ class RoleBase(SQLModel):
     title: str = Field(nullable=True, unique=True)
     default: Optional[bool] = Field(sa_column=Column(
         "default", Boolean, server_default=expression.false(), nullable=False))
+    # the role inherits permissions of its parent role (and of the parent ancestors)
+    parent_id: Optional[UUID] = Field(default=None, sa_column=Column(
+        "parent_id", postgresql.UUID(as_uuid=True), ForeignKey("auth.role.id", ondelete="SET NULL"),
+        nullable=True, index=True))
 
 
 class Role(BaseUUIDModel, RoleBase, table=True):
@@ -30,12 +36,12 @@ class Role(BaseUUIDModel, RoleBase, table=True):
     users: Optional[List["User"]] = Relationship(
         back_populates="roles", link_model=LinkRoleUser,
         sa_relationship_kwargs={
-            "lazy": "selectin"
+            "lazy": "raise"
         }
     )
     resources: Optional[List["Resource"]] = Relationship(
         back_populates="roles", link_model=Permission,
         sa_relationship_kwargs={
-            "lazy": "selectin"
+            "lazy": "raise"
         }
     )
@@ -1,4 +1,6 @@
 # # Native # #
+from typing import Any, Dict, List, Optional, Union
+from uuid import UUID
 
 # # Installed # #
 from sqlmodel.ext.asyncio.session import AsyncSession
@@ -7,23 +9,56 @@ from sqlmodel import select
 # # Package # #
 from app.sessions.schema import ICreate, IUpdate
 from core.base.crud import CRUDBase
+from core.security import get_token_digest
+from core.cache import principal_cache
 from app.sessions.model import Sessions
 
 
 class CRUD(CRUDBase[Sessions, ICreate, IUpdate]):
     async def create(self, db_session: AsyncSession, *, obj_in: ICreate) -> Sessions:
         db_obj = obj_in
+        db_obj.access_token_digest = get_token_digest(db_obj.access_token)
+        db_obj.refresh_token_digest = get_token_digest(db_obj.refresh_token)
         db_session.add(db_obj)
         await db_session.commit()
         await db_session.refresh(db_obj)
         return db_obj
 
+    async def update(
+        self,
+        db_session: AsyncSession,
+        *,
+        obj_current: Sessions,
+        obj_new: Union[IUpdate, Dict[str, Any], Sessions],
+    ) -> Sessions:
+        if isinstance(obj_new, dict):
+            obj_new = dict(obj_new)
+            if "access_token" in obj_new:
+                obj_new["access_token_digest"] = get_token_digest(obj_new["access_token"])
+            if "refresh_token" in obj_new:
+                obj_new["refresh_token_digest"] = get_token_digest(obj_new["refresh_token"])
+        principal_cache.invalidate(obj_current.access_token_digest)
+        return await super().update(db_session, obj_current=obj_current, obj_new=obj_new)
+
+    async def remove(
+        self, db_session: AsyncSession, *, id: Union[UUID, str], profile: Optional[str] = "delete"
+    ) -> Sessions:
+        session = await super().remove(db_session, id=id, profile=profile)
+        principal_cache.invalidate(session.access_token_digest)
+        return session
+
+    async def get_by_user_id(self, db_session: AsyncSession, *, user_id: UUID) -> List[Sessions]:
+        sessions = await db_session.exec(select(Sessions).where(Sessions.user_id == user_id))
+        return sessions.all()
+
     async def get_by_access_token(self, db_session: AsyncSession, *, access_token: str) -> Sessions:
-        sessions = await db_session.exec(select(Sessions).where(Sessions.access_token == access_token))
+        sessions = await db_session.exec(
+            select(Sessions).where(Sessions.access_token_digest == get_token_digest(access_token)))
         return sessions.first()
 
     async def get_by_refresh_token(self, db_session: AsyncSession, *, refresh_token: str) -> Sessions:
-        sessions = await db_session.exec(select(Sessions).where(Sessions.refresh_token == refresh_token))
+        sessions = await db_session.exec(
+            select(Sessions).where(Sessions.refresh_token_digest == get_token_digest(refresh_token)))
         return sessions.first()
 
 
@@ -1,6 +1,7 @@
 # # Native # #
 import uuid
 from uuid import UUID
+from typing import Optional
 from datetime import datetime
 
 # # Installed # #
@@ -23,13 +24,16 @@ class SessionsBase(SQLModel):
     cookie: str
     access_token: str
     refresh_token: str
+    access_token_digest: Optional[str] = Field(default=None, index=True)
+    refresh_token_digest: Optional[str] = Field(default=None, index=True)
     token_type: str = "bearer"
     expires_at: int
     created_at: datetime = Field(sa_column=Column(TIMESTAMP, server_default=func.now()))
+    last_seen_at: Optional[datetime] = Field(sa_column=Column(TIMESTAMP, nullable=True))
     user_id: UUID = Field(
         default=None,
         foreign_key="auth.user.id",
-        index=False,
+        index=True,
         sa_column_kwargs={"unique": False},
     )
 
@@ -0,0 +1,222 @@
+# # Native # #
+import asyncio
+from contextlib import suppress
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from uuid import UUID
+
+# # Installed # #
+from sqlalchemy import TIMESTAMP, column, or_, text, update, values
+from sqlalchemy.dialects import postgresql
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+# # Package # #
+from core.settings import settings
+from core.logger import logger
+from core.database.session import get_session
+from app.sessions.model import Sessions
+
+__all__ = (
+    "SessionActivity",
+    "get_partition_name",
+    "get_partition_ddl",
+    "create_sessions_partitions",
+    "drop_sessions_partitions",
+)
+
+PARTITION_PREFIX = "sessions_p"
+PARTITION_DATE_FORMAT = "%Y%m%d"
+
+
+def get_partition_start(moment: datetime, interval_days: int) -> datetime:
+    """
+    align the moment to the beginning of the partition it belongs to
+    """
+    epoch_days = (moment.date() - datetime(1970, 1, 1).date()).days
+    start_days = epoch_days - epoch_days % interval_days
+    return datetime(1970, 1, 1) + timedelta(days=start_days)
+
+
+def get_partition_name(start: datetime) -> str:
+    return f"{PARTITION_PREFIX}{start.strftime(PARTITION_DATE_FORMAT)}"
+
+
+def get_timestamp(moment: datetime) -> int:
+    return int((moment - datetime(1970, 1, 1)).total_seconds())
+
+
+def get_partition_bound(moment: datetime, partition_by: str) -> str:
+    # created_at is a timestamp, expires_at is unix timestamp in seconds
+    if partition_by == "expires_at":
+        return str(get_timestamp(moment))
+    return f"'{moment.isoformat(sep=' ')}'"
+
+
+def get_partition_ddl(
+    partition_by: str,
+    now: Optional[datetime] = None,
+    interval_days: Optional[int] = None,
+    premake: Optional[int] = None,
+) -> List[str]:
+    """
+    statements creating the current partition and `premake` partitions ahead of it
+    """
+    now = now or datetime.utcnow()
+    interval_days = interval_days or settings.SESSIONS_PARTITION_INTERVAL_DAYS
+    premake = settings.SESSIONS_PARTITION_PREMAKE if premake is None else premake
+
+    statements = []
+    start = get_partition_start(now, interval_days)
+    for _ in range(premake + 1):
+        end = start + timedelta(days=interval_days)
+        statements.append(
+            f"CREATE TABLE IF NOT EXISTS auth.{get_partition_name(start)} "
+            f"PARTITION OF auth.sessions FOR VALUES "
+            f"FROM ({get_partition_bound(start, partition_by)}) TO ({get_partition_bound(end, partition_by)})"
+        )
+        start = end
+    return statements
+
+
+async def get_sessions_partitions(db_session: AsyncSession) -> List[str]:
+    response = await db_session.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+        "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+        "JOIN pg_namespace ns ON parent.relnamespace = ns.oid "
+        "WHERE ns.nspname = 'auth' AND parent.relname = 'sessions'"
+    ))
+    return [i[0] for i in response.all()]
+
+
+async def create_sessions_partitions(db_session: AsyncSession) -> None:
+    if not settings.SESSIONS_PARTITION_BY:
+        return
+    for statement in get_partition_ddl(settings.SESSIONS_PARTITION_BY):
+        await db_session.execute(text(statement))
+    await db_session.commit()
+
+
+async def drop_sessions_partitions(db_session: AsyncSession) -> List[str]:
+    """
+    retention is done by dropping whole partitions instead of row-by-row deletes.
+    a partition is dropped once all of its range is older than the retention period and, when partitioned
+    by created_at, none of its sessions is still valid. rows of the default partition (outside of the
+    created ranges) are deleted one by one under the same conditions
+    """
+    partition_by = settings.SESSIONS_PARTITION_BY
+    if not partition_by:
+        return []
+    interval = timedelta(days=settings.SESSIONS_PARTITION_INTERVAL_DAYS)
+    now = datetime.utcnow()
+    threshold = now - timedelta(days=settings.SESSIONS_PARTITION_RETENTION_DAYS)
+    expired = {"now": get_timestamp(now)}
+    dropped = []
+    for name in await get_sessions_partitions(db_session):
+        if not name.startswith(PARTITION_PREFIX):
+            continue  # default partition and manually attached ones are kept
+        try:
+            start = datetime.strptime(name[len(PARTITION_PREFIX):], PARTITION_DATE_FORMAT)
+        except ValueError:
+            continue
+        if start + interval > threshold:
+            continue
+        if partition_by == "created_at":
+            response = await db_session.execute(
+                text(f"SELECT 1 FROM auth.{name} WHERE expires_at > :now LIMIT 1"), expired)
+            if response.first() is not None:
+                continue
+        await db_session.execute(text(f"DROP TABLE IF EXISTS auth.{name}"))
+        dropped.append(name)
+    bound = threshold if partition_by == "created_at" else get_timestamp(threshold)
+    response = await db_session.execute(
+        text(f"DELETE FROM auth.sessions_default WHERE {partition_by} < :bound AND expires_at <= :now"),
+        {"bound": bound, **expired},
+    )
+    await db_session.commit()
+    if dropped:
+        logger.info(f"sessions partitions dropped: {dropped}")
+    if response.rowcount:
+        logger.info(f"sessions deleted from the default partition: {response.rowcount}")
+    return dropped
+
+
+class SessionActivity:
+    """
+    write-behind "last seen" tracking.
+    touches are kept in memory, coalesced per session and flushed periodically
+    in a single UPDATE ... FROM (VALUES ...) statement
+    """
+
+    def __init__(self):
+        self.buffer: Dict[UUID, datetime] = {}
+        self.SESSION_ACTIVITY_FLUSH_INTERVAL = settings.SESSION_ACTIVITY_FLUSH_INTERVAL
+        self.task: Optional[asyncio.Task] = None
+
+    def touch(self, session_id: UUID, moment: Optional[datetime] = None) -> None:
+        if not self.SESSION_ACTIVITY_FLUSH_INTERVAL:
+            return
+        moment = moment or datetime.utcnow()
+        if session_id not in self.buffer or self.buffer[session_id] < moment:
+            self.buffer[session_id] = moment
+
+    async def flush(self, db_session: AsyncSession) -> int:
+        if not self.buffer:
+            return 0
+        # swap the buffer, touches arriving during the flush go to the next batch
+        buffer, self.buffer = self.buffer, {}
+        activity = values(
+            column("id", postgresql.UUID(as_uuid=True)),
+            column("last_seen_at", TIMESTAMP),
+            name="activity",
+        ).data(list(buffer.items()))
+        statement = (
+            update(Sessions)
+            .where(Sessions.id == activity.c.id)
+            .where(or_(Sessions.last_seen_at.is_(None), Sessions.last_seen_at < activity.c.last_seen_at))
+            .values(last_seen_at=activity.c.last_seen_at)
+            .execution_options(synchronize_session=False)
+        )
+        try:
+            await db_session.execute(statement)
+            await db_session.commit()
+        except (Exception, asyncio.CancelledError) as e:
+            # cancelled by `stop` in the middle of a flush: the final flush writes the batch
+            logger.error(f"session activity flush failed: {e!r}")
+            for session_id, moment in buffer.items():
+                self.touch(session_id, moment)
+            raise
+        logger.debug(f"session activity flushed: {len(buffer)} sessions")
+        return len(buffer)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.SESSION_ACTIVITY_FLUSH_INTERVAL)
+            try:
+                async for db_session in get_session():
+                    await self.flush(db_session)
+            except Exception:
+                ...  # already logged, touches are retried with the next flush
+
+    def start(self) -> None:
+        if self.SESSION_ACTIVITY_FLUSH_INTERVAL and self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self.task
+            self.task = None
+        async for db_session in get_session():
+            await self.flush(db_session)
+
+
+async def main():
+    async for db_session in get_session():
+        await create_sessions_partitions(db_session)
+        await drop_sessions_partitions(db_session)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,19 +1,57 @@
 # # Native # #
+from typing import Any, Dict, Optional, Union
+from uuid import UUID
 
 # # Installed # #
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import select
+from sqlalchemy.orm import selectinload
 
 # # Package # #
 from app.team.schema import ICreate, IUpdate
 from core.base.crud import CRUDBase
+from core.cache import claims_cache
 from app.team.model import Team
 
 
 class CRUD(CRUDBase[Team, ICreate, IUpdate]):
+    loaders = {
+        "detail": [selectinload(Team.users)],
+        "list": [selectinload(Team.users)],
+        "delete": [selectinload(Team.users)],
+    }
+
     async def get_team_by_title(self, db_session: AsyncSession, *, title: str) -> Team:
         team = await db_session.exec(select(Team).where(Team.title == title))
         return team.first()
 
+    async def create(
+        self,
+        db_session: AsyncSession,
+        *,
+        obj_in: Union[ICreate, Team],
+        created_by: Optional[Union[UUID, str]] = None
+    ) -> Team:
+        obj = await super().create(db_session, obj_in=obj_in, created_by=created_by)
+        # users are not loaded by refresh
+        return await self.get(db_session, id=obj.id)
+
+    async def update(
+        self,
+        db_session: AsyncSession,
+        *,
+        obj_current: Team,
+        obj_new: Union[IUpdate, Dict[str, Any], Team],
+    ) -> Team:
+        obj = await super().update(db_session, obj_current=obj_current, obj_new=obj_new)
+        return await self.get(db_session, id=obj.id)
+
+    async def remove(
+        self, db_session: AsyncSession, *, id: Union[UUID, str], profile: Optional[str] = "delete"
+    ) -> Team:
+        obj = await super().remove(db_session, id=id, profile=profile)
+        claims_cache.clear()
+        return obj
+
 
 team = CRUD(Team)
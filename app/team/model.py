@@ -26,6 +26,6 @@ class Team(BaseUUIDModel, TeamBase, table=True):
     users: Optional[List["User"]] = Relationship(
         back_populates="teams", link_model=LinkTeamUser,
         sa_relationship_kwargs={
-            "lazy": "selectin"
+            "lazy": "raise"
         }
     )
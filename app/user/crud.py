@@ -1,41 +1,166 @@
 # # Native # #
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 from datetime import datetime
 from uuid import UUID
 
 # # Installed # #
-from sqlalchemy.orm import selectinload
+from sqlalchemy import String, JSON, cast
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import joinedload, selectinload
 from pydantic.networks import EmailStr
 from sqlmodel.ext.asyncio.session import AsyncSession
-from sqlmodel import select
+from sqlmodel import select, func
 from sqlalchemy.exc import SQLAlchemyError
 
 # # Package # #
 from core.base.crud import CRUDBase
-from app.user.schema import ICreate, IUpdate
+from app.user.schema import ICreate, IUpdate, IProvision, Principal
 from core.exceptions import BadRequestException, ConflictException
 from core.security import verify_password
 from app.user.model import User
 from app.role.model import Role
 from app.team.model import Team
 from app.visibility_group.model import Visibility_Group
+from app.sessions.model import Sessions
+from app.common.links import LinkRoleUser, LinkTeamUser
+from core.cache import principal_cache, claims_cache
 
 __all__ = ("user",)
 
 
 class CRUD(CRUDBase[User, ICreate, IUpdate]):
+    # relationships raise when accessed without being loaded by the profile.
+    # the visibility group is joined to the user row, collections are loaded with one query each
+    loaders = {
+        # access token claims: roles, teams and visibility group prefix
+        "claims": [selectinload(User.roles), selectinload(User.teams), joinedload(User.visibility_group)],
+        "detail": [
+            selectinload(User.roles), selectinload(User.teams),
+            joinedload(User.visibility_group), selectinload(User.sessions)
+        ],
+        "list": [selectinload(User.roles), selectinload(User.teams), joinedload(User.visibility_group)],
+        "sessions": [selectinload(User.sessions)],
+        # collections whose rows are removed with the user, and the rest of the response
+        "delete": [
+            selectinload(User.roles), selectinload(User.teams),
+            joinedload(User.visibility_group), selectinload(User.sessions)
+        ],
+    }
+    visibility_column = "id"
+
     async def get_by_email(
-        self, db_session: AsyncSession, *, email: str
+        self, db_session: AsyncSession, *, email: str, profile: Optional[str] = "detail"
     ) -> Optional[User]:
+        # served by the lower(email) functional index
         users = await db_session.exec(
-            select(User).where(User.email == email).options(selectinload("*"))
+            select(User).where(func.lower(User.email) == email.lower()).options(*self.get_options(profile))
         )
         return users.first()
 
+    async def get_principal(
+        self, db_session: AsyncSession, *, access_token_digest: str
+    ) -> Optional[Principal]:
+        """
+        session, user and ids of user roles and teams in a single query
+        """
+        role_ids = select(func.array_agg(LinkRoleUser.role_id)).where(
+            LinkRoleUser.user_id == User.id).scalar_subquery()
+        team_ids = select(func.array_agg(LinkTeamUser.team_id)).where(
+            LinkTeamUser.user_id == User.id).scalar_subquery()
+        response = await db_session.exec(
+            select(Sessions.id, User, role_ids, team_ids)
+            .join(User, User.id == Sessions.user_id)
+            .where(Sessions.access_token_digest == access_token_digest)
+        )
+        row = response.first()
+        if not row:
+            return None
+        return Principal(session_id=row[0], user=row[1], role_ids=row[2] or [], team_ids=row[3] or [])
+
+    @staticmethod
+    def get_claims_columns(user_id: Any, visibility_group_id: Any) -> Tuple[Any, Any, Any]:
+        """
+        scalar subqueries of the access token claims correlated to the given user columns
+        """
+        roles = select(func.json_object_agg(cast(Role.id, String), Role.title, type_=JSON)).join(
+            LinkRoleUser, LinkRoleUser.role_id == Role.id).where(LinkRoleUser.user_id == user_id).scalar_subquery()
+        teams = select(func.array_agg(LinkTeamUser.team_id)).where(
+            LinkTeamUser.user_id == user_id).scalar_subquery()
+        visibility_group = select(Visibility_Group.prefix).where(
+            Visibility_Group.id == visibility_group_id).scalar_subquery()
+        return roles, teams, visibility_group
+
+    @staticmethod
+    def make_claims(user_id: Union[UUID, str], email: str, roles: Any, teams: Any, visibility_group: Any) -> dict:
+        claims = {
+            "user_id": str(user_id),
+            "email": email,
+            "roles": roles or {},
+            "teams": [str(i) for i in teams or []],
+            "visibility_group": visibility_group,
+        }
+        claims_cache.set(str(user_id), claims)
+        return claims
+
+    async def get_claims(self, db_session: AsyncSession, *, user: User) -> dict:
+        """
+        access token claims of the user: roles as id -> title map, team ids and visibility group prefix.
+        built with one query without loading relationships and cached until they change
+        """
+        claims = claims_cache.get(str(user.id))
+        if claims is not None:
+            return claims
+        response = await db_session.exec(
+            select(User.email, *self.get_claims_columns(User.id, User.visibility_group_id)).where(User.id == user.id)
+        )
+        return self.make_claims(user.id, *response.one())
+
+    async def provision(self, db_session: AsyncSession, *, obj_in: IProvision) -> Tuple[User, dict]:
+        """
+        create the user on the first sso login or return the existing one, together with its claims,
+        in a single INSERT ... ON CONFLICT (lower(email)) DO UPDATE ... RETURNING statement.
+        concurrent first logins of the same user do not race on the unique email
+        """
+        columns = User.__table__.columns
+        data = {k: v for k, v in obj_in.dict().items() if k in columns and v is not None}
+        statement = insert(User).values(**data)
+        upserted = statement.on_conflict_do_update(
+            index_elements=[func.lower(User.email)],
+            set_={"picture": func.coalesce(statement.excluded.picture, User.picture)},
+        ).returning(*columns).cte("upserted")
+        response = await db_session.execute(
+            select(upserted, *self.get_claims_columns(upserted.c.id, upserted.c.visibility_group_id))
+        )
+        row = response.one()
+        await db_session.commit()
+        user = User(**dict(zip(columns.keys(), row[:len(columns)], strict=True)))
+        claims = self.make_claims(user.id, user.email, *row[len(columns):])
+        return user, claims
+
+    async def update(
+        self,
+        db_session: AsyncSession,
+        *,
+        obj_current: User,
+        obj_new: Union[IUpdate, Dict[str, Any], User],
+    ) -> User:
+        user = await super().update(db_session, obj_current=obj_current, obj_new=obj_new)
+        principal_cache.invalidate_tag(str(user.id))
+        claims_cache.invalidate(str(user.id))
+        return user
+
+    async def remove(
+        self, db_session: AsyncSession, *, id: Union[UUID, str], profile: Optional[str] = "delete"
+    ) -> User:
+        user = await super().remove(db_session, id=id, profile=profile)
+        principal_cache.invalidate_tag(str(id))
+        claims_cache.invalidate(str(id))
+        return user
+
     async def update_role(
         self, db_session: AsyncSession, *, id: UUID, role: Role
     ) -> None:
-        user = await super().get(db_session, id=id)
+        user = await super().get(db_session, id=id, profile="claims")
         if role in user.roles:
             user.roles.remove(role)
         else:
@@ -43,12 +168,14 @@ class CRUD(CRUDBase[User, ICreate, IUpdate]):
         db_session.add(user)
         await db_session.commit()
         await db_session.refresh(user)
+        principal_cache.invalidate_tag(str(id))
+        claims_cache.invalidate(str(id))
         return
 
     async def update_team(
         self, db_session: AsyncSession, *, id: UUID, team: Team
     ) -> None:
-        user = await super().get(db_session, id=id)
+        user = await super().get(db_session, id=id, profile="claims")
         if team in user.teams:
             user.teams.remove(team)
         else:
@@ -56,12 +183,14 @@ class CRUD(CRUDBase[User, ICreate, IUpdate]):
         db_session.add(user)
         await db_session.commit()
         await db_session.refresh(user)
+        principal_cache.invalidate_tag(str(id))
+        claims_cache.invalidate(str(id))
         return
 
     async def update_visibility_group(
         self, db_session: AsyncSession, *, id: UUID, visibility_group: Visibility_Group
     ) -> None:
-        user = await super().get(db_session, id=id)
+        user = await super().get(db_session, id=id, profile="claims")
         if visibility_group == user.visibility_group:
             user.visibility_group = None
         else:
@@ -69,6 +198,8 @@ class CRUD(CRUDBase[User, ICreate, IUpdate]):
         db_session.add(user)
         await db_session.commit()
         await db_session.refresh(user)
+        principal_cache.invalidate_tag(str(id))
+        claims_cache.invalidate(str(id))
         return
 
     async def update_is_active(
@@ -85,14 +216,15 @@ class CRUD(CRUDBase[User, ICreate, IUpdate]):
             db_session.add(x)
             await db_session.commit()
             await db_session.refresh(x)
+            principal_cache.invalidate_tag(str(x.id))
             response.append(x)
         return response
 
     async def authenticate(
-        self, db_session: AsyncSession, *, email: EmailStr, password: str
+        self, db_session: AsyncSession, *, email: EmailStr, password: str, profile: Optional[str] = None
     ) -> Optional[User]:
         try:
-            user = await self.get_by_email(db_session, email=email)
+            user = await self.get_by_email(db_session, email=email, profile=profile)
         except SQLAlchemyError as e:
             raise ConflictException(detail=f"Database error: {e.orig}")
         if not user:
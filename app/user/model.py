@@ -4,7 +4,7 @@ from typing import List, Optional, Set
 
 # # Installed # #
 from pydantic import EmailStr, AnyHttpUrl
-from sqlalchemy import String, Boolean
+from sqlalchemy import BigInteger, Boolean, Identity, Index, String, text
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.sql import expression
 from sqlmodel import Field, SQLModel, Relationship, Column
@@ -21,7 +21,8 @@ class UserBase(SQLModel):
     first_name: Optional[str]
     last_name: Optional[str]
     full_name: Optional[str]
-    email: Optional[EmailStr] = Field(index=True, unique=True)
+    # unique case-insensitively, see ix_auth_user_lower_email
+    email: Optional[EmailStr]
     hashed_password: Optional[str] = None
     is_active: Optional[bool] = Field(
         sa_column=Column(
@@ -59,28 +60,36 @@ class UserBase(SQLModel):
 
 
 class User(BaseUUIDModel, UserBase, table=True):
-    __table_args__ = {"comment": "User", "schema": "auth"}
+    __table_args__ = (
+        # case-insensitive lookups and uniqueness, the conflict target of sso provisioning
+        Index("ix_auth_user_lower_email", text("lower(email)"), unique=True),
+        {"comment": "User", "schema": "auth"},
+    )
+    # compact integer id, users are referenced by it in visibility group bitmaps
+    dense_id: Optional[int] = Field(
+        sa_column=Column("dense_id", BigInteger, Identity(), unique=True, nullable=False)
+    )
     roles: List["Role"] = Relationship(
         back_populates="users", link_model=LinkRoleUser,
         sa_relationship_kwargs={
-            "lazy": "selectin"
+            "lazy": "raise"
         })
     teams: List["Team"] = Relationship(
         back_populates="users", link_model=LinkTeamUser,
         sa_relationship_kwargs={
-            "lazy": "selectin"
+            "lazy": "raise"
         })
     sessions: List["Sessions"] = Relationship(
         back_populates="user",
         sa_relationship_kwargs={
             "cascade": "delete",
-            "uselist": True, "lazy": "selectin"
+            "uselist": True, "lazy": "raise"
         },
     )
     visibility_group: "Visibility_Group" = Relationship(
         back_populates="user",
         sa_relationship_kwargs={
-            "uselist": False, "lazy": "selectin"
+            "uselist": False, "lazy": "raise"
         }
     )
 
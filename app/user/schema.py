@@ -1,5 +1,5 @@
 # # Native # #
-from typing import Optional, List, Union, Literal
+from typing import Any, Optional, List, NamedTuple, Union, Literal
 from uuid import UUID
 
 # # Installed # #
@@ -7,21 +7,24 @@ from pydantic import BaseModel, EmailStr, validator, root_validator, AnyHttpUrl
 
 # # Package # #
 from app.user.model import UserBase
+from app.role.model import RoleBase
+from app.team.model import TeamBase
 from core.security import get_password_hash, create_password
 from core.logger import logger
 from core.base.model import BaseUUIDModel
 from core.base.schema import BaseMeta
-from app.role.schema import IRead as IReadRole
-from app.team.schema import IRead as IReadTeam
 from app.sessions.schema import IRead as IReadSessions
 from app.visibility_group.schema import IRead as IReadVisibilityGroup
 
 __all__ = (
     "ICreate",
     "IRead",
+    "IReadList",
     "IUpdate",
     "IIdentityProvider",
+    "IProvision",
     "IFilter",
+    "Principal",
 )
 
 
@@ -95,10 +98,45 @@ class ICreate(BaseModel):
         return values
 
 
-class IRead(UserBase, BaseUUIDModel):
+class IProvision(BaseModel):
+    """
+    user created on the first sso login. no password is generated, sso users log in via the provider
+    """
+    first_name: str
+    last_name: Optional[str]
+    full_name: Optional[str]
+    email: EmailStr
+    picture: Optional[AnyHttpUrl]
+    is_active: bool = True
+
+    @validator("email")
+    def str_attr_must_be_lower(cls, v):
+        return v.lower().strip()
+
+    @root_validator
+    def create_full_name(cls, values):
+        values["full_name"] = f"{values.get('first_name') or ''} {values.get('last_name') or ''}".strip()
+        return values
+
+
+class IReadRole(RoleBase, BaseUUIDModel):
+    """
+    role of a user, its resources and users are not loaded
+    """
+
+
+class IReadTeam(TeamBase, BaseUUIDModel):
+    """
+    team of a user, its users are not loaded
+    """
+
+
+class IReadList(UserBase, BaseUUIDModel):
+    """
+    user of the list, sessions are loaded for a single user only (see `crud.user.loaders`)
+    """
     roles: Optional[List[IReadRole]]
     teams: Optional[List[IReadTeam]]
-    sessions: Optional[List[IReadSessions]]
     visibility_group: Optional[IReadVisibilityGroup]
 
     @root_validator
@@ -108,6 +146,10 @@ class IRead(UserBase, BaseUUIDModel):
         return values
 
 
+class IRead(IReadList):
+    sessions: Optional[List[IReadSessions]]
+
+
 class IUpdate(BaseModel):
     team_id: Optional[UUID]
     phone: Optional[str]
@@ -135,4 +177,12 @@ class IAuthMeta(BaseMeta):
 
     @validator("roles")
     def get_role_title(cls, v):
-        return [r.title for r in v]
+        return [r if isinstance(r, str) else r.title for r in v]
+
+
+class Principal(NamedTuple):
+    """user behind an access token, resolved by `crud.user.get_principal`"""
+    session_id: UUID
+    user: Any
+    role_ids: List[UUID]
+    team_ids: List[UUID]
@@ -1,6 +1,6 @@
 
 # # Native # #
-from typing import Optional, Callable, Awaitable
+from typing import Dict, Optional, Callable, Awaitable
 
 # # Installed # #
 from fastapi import Depends, Request
@@ -10,12 +10,12 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 
 # # Package # #
 from core.settings import settings
-from core.security import verify_jwt_token
+from core.security import decode_jwt_token, get_token_digest
+from core.cache import principal_cache
 from app.user.model import User
 from app import crud
 from core.exceptions import NotFoundException, UnauthorizedException, ConflictException, ForbiddenException
 from core.base.schema import IMetaGeneral
-from app.rbac.schema import IRBACValidate
 from core.database.session import get_session
 
 __all__ = (
@@ -35,33 +35,76 @@ async def get_general_meta(
     return IMetaGeneral(roles=current_roles)
 
 
+# endpoint function -> path template of its route, None for functions serving several routes
+route_paths: Dict[Callable, Optional[str]] = {}
+
+
+def get_route_path(request: Request) -> Optional[str]:
+    """
+    path template of the route matched by the request
+    """
+    endpoint = request.scope.get("endpoint")
+    if endpoint not in route_paths:
+        paths = {route.path for route in request.app.routes if getattr(route, "endpoint", None) is endpoint}
+        route_paths[endpoint] = paths.pop() if len(paths) == 1 else None
+    return route_paths[endpoint]
+
+
 def get_current_user(
-    required_permissions: Optional[bool] = None
+    required_permissions: Optional[bool] = None,
+    profile: Optional[str] = None,
+    visibility_group_entity: Optional[str] = None,
 ) -> Callable[[Request, AsyncSession, str], Awaitable[User]]:
+    """
+    `profile` - loader profile of the returned user, see `crud.user.loaders`.
+    without profile the user is resolved together with the session in a single query
+    and its relationships are not loaded.
+    `visibility_group_entity` - for resources with visibility_group_enable the ids of the users visible for
+    the entity are set to `request.state.visible_user_ids`, to be passed to
+    `get_multi_paginated(visible_user_ids=...)`. without it visibility groups are not validated
+    """
     async def current_user(
             request: Request,
             db_session: AsyncSession = Depends(get_session),
             access_token: str = Depends(reusable_oauth2)
     ) -> User:
-        payload = await verify_jwt_token(token=access_token, token_type="access", db_session=db_session, crud=crud)
+        payload = decode_jwt_token(token=access_token, token_type="access")
+        access_token_digest = get_token_digest(access_token)
 
-        user = await crud.user.get(db_session, id=payload["user_id"])
-        if not user:
-            raise NotFoundException(detail="User not found")
-        if not user.sessions:
-            raise UnauthorizedException(detail="User has no active sessions")
-        if not user.is_active:
+        principal = principal_cache.get(access_token_digest)
+        if principal is None:
+            principal = await crud.user.get_principal(db_session, access_token_digest=access_token_digest)
+            if not principal:
+                raise UnauthorizedException(detail="Access token not found")
+            principal_cache.set(access_token_digest, principal, tags=[str(principal.user.id)])
+        if not principal.user.is_active:
             raise ConflictException(detail="User is not active")
+        request.app.session_activity.touch(principal.session_id)
+
         if required_permissions:
-            data = await request.app.rbac.validate(
+            # the token is verified already, rbac gets the principal roles and teams instead of the token.
+            # the resource is looked up by the matched route template
+            data = await request.app.rbac.validate_route(
                 db_session,
-                IRBACValidate.parse_obj({
-                    "endpoint": str(request.url),
-                    "method": request.method}),
-                access_token=access_token)
+                request.method,
+                get_route_path(request),
+                str(request.url),
+                payload={
+                    **payload,
+                    "roles": [str(i) for i in principal.role_ids],
+                    "teams": [str(i) for i in principal.team_ids]})
             if not data['access']:
                 raise ForbiddenException(detail="User does not have required permissions")
-            # TODO validate visibility
+            if visibility_group_entity and data['visibility_group_enable']:
+                visibility = await request.app.visibility_group.validate(
+                    db_session, visibility_group_entity, payload=payload)
+                request.state.visible_user_ids = [i["id"] for i in visibility["users"]]
+
+        if profile is None:
+            return principal.user
+        user = await crud.user.get(db_session, id=principal.user.id, profile=profile)
+        if not user:
+            raise NotFoundException(detail="User not found")
         return user
 
     return current_user
@@ -1,14 +1,21 @@
 # # Native # #
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple, Union
+from uuid import UUID
 
 # # Installed # #
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import select
+from sqlalchemy import delete, func, text
 from sqlalchemy.orm import selectinload
 
 # # Package # #
 from app.visibility_group.schema import ICreate, IUpdate
 from core.base.crud import CRUDBase
-from app.visibility_group.model import Visibility_Group
+from core.cache import claims_cache
+from core.constants import VISIBILITY_GROUP_ENTITY_POSSIBLE_VALUES
+from app.user.model import User
+from app.visibility_group.model import Visibility_Group, Visibility_Group_Changelog
 
 
 class CRUD(CRUDBase[Visibility_Group, ICreate, IUpdate]):
@@ -20,5 +27,87 @@ class CRUD(CRUDBase[Visibility_Group, ICreate, IUpdate]):
         visibility_group = await db_session.exec(select(Visibility_Group).options(selectinload(Visibility_Group.user)))
         return visibility_group.all()
 
+    async def get_changes_xmin(self, db_session: AsyncSession) -> int:
+        """
+        transactions with txid below the snapshot xmin are finished, changes made by the rest
+        may become visible later, so the next poll starts from this value
+        """
+        response = await db_session.execute(select(func.txid_snapshot_xmin(func.txid_current_snapshot())))
+        return response.scalar_one()
+
+    async def get_changes(self, db_session: AsyncSession, *, xmin: int) -> List[Visibility_Group_Changelog]:
+        response = await db_session.exec(
+            select(Visibility_Group_Changelog)
+            .where(Visibility_Group_Changelog.txid >= xmin)
+            .order_by(Visibility_Group_Changelog.id)
+        )
+        return response.all()
+
+    async def remove_changes(self, db_session: AsyncSession, *, older_than: timedelta) -> int:
+        response = await db_session.execute(
+            delete(Visibility_Group_Changelog).where(Visibility_Group_Changelog.created_at < func.now() - older_than))
+        await db_session.commit()
+        return response.rowcount
+
+    async def get_by_ids(self, db_session: AsyncSession, *, ids: List[UUID]) -> List[Visibility_Group]:
+        response = await db_session.exec(select(Visibility_Group).where(Visibility_Group.id.in_(ids)))
+        return response.all()
+
+    async def get_members(
+        self, db_session: AsyncSession, *, user_ids: List[UUID]
+    ) -> List[Tuple[UUID, str, Optional[UUID], int]]:
+        response = await db_session.execute(
+            select(User.id, User.email, User.visibility_group_id, User.dense_id).where(User.id.in_(user_ids)))
+        return response.all()
+
+    async def get_visible_users(
+        self, db_session: AsyncSession, *, prefix: str, entity: str, user_id: UUID
+    ) -> List[Tuple[Optional[UUID], List[str], Optional[int], Optional[UUID], Optional[str], Optional[int]]]:
+        """
+        visibility resolved in SQL with ltree ancestor/descendant operators on auth.visibility_group.path.
+        rows are (group admin, group entity settings, caller dense id, user id, email, dense id),
+        a single row with empty user columns when nothing is visible, no rows when the group does not exist
+        """
+        if entity not in VISIBILITY_GROUP_ENTITY_POSSIBLE_VALUES:
+            raise ValueError(f"Invalid visibility group entity: {entity}")
+        response = await db_session.execute(text(f"""
+            WITH g AS (
+                SELECT id, path, admin, coalesce({entity}, '{{}}') AS settings
+                FROM auth.visibility_group WHERE prefix = :prefix
+            )
+            SELECT g.admin, g.settings, (SELECT dense_id FROM auth.user WHERE id = :user_id), u.id, u.email, u.dense_id
+            FROM g LEFT JOIN LATERAL (
+                SELECT u.id, u.email, u.dense_id
+                FROM auth.visibility_group v JOIN auth.user u ON u.visibility_group_id = v.id
+                WHERE (
+                    v.id = g.id
+                    AND ('user' = ANY(g.settings) OR ('admin' = ANY(g.settings) AND g.admin = :user_id))
+                ) OR (
+                    v.id <> g.id AND v.path <@ g.path AND 'parent' = ANY(v.{entity})
+                ) OR (
+                    v.id <> g.id AND v.path @> g.path AND 'child' = ANY(v.{entity})
+                )
+            ) u ON true
+        """), {"prefix": prefix, "user_id": user_id})
+        return response.all()
+
+    async def update(
+        self,
+        db_session: AsyncSession,
+        *,
+        obj_current: Visibility_Group,
+        obj_new: Union[IUpdate, Dict[str, Any], Visibility_Group],
+    ) -> Visibility_Group:
+        obj = await super().update(db_session, obj_current=obj_current, obj_new=obj_new)
+        claims_cache.clear()
+        return obj
+
+    async def remove(
+        self, db_session: AsyncSession, *, id: Union[UUID, str], profile: Optional[str] = "delete"
+    ) -> Visibility_Group:
+        obj = await super().remove(db_session, id=id, profile=profile)
+        claims_cache.clear()
+        return obj
+
 
 visibility_group = CRUD(Visibility_Group)
@@ -1,10 +1,11 @@
 # # Native # #
+from datetime import datetime
 from typing import List, Optional
 from uuid import UUID
 
 
 # # Installed # #
-from sqlalchemy import String
+from sqlalchemy import TIMESTAMP, BigInteger, String, func, text
 from sqlalchemy.dialects import postgresql
 from sqlmodel import Field, Relationship, SQLModel, Column
 
@@ -13,6 +14,7 @@ from core.base.model import BaseUUIDModel
 
 __all__ = (
     "Visibility_Group",
+    "Visibility_Group_Changelog",
 )
 
 
@@ -29,6 +31,7 @@ class VisibilityGroupBase(SQLModel):
         default=None, sa_column=Column(postgresql.ARRAY(String())))
 
 
+# auth.visibility_group.path, the prefix as ltree, is generated by the database and is not mapped
 class Visibility_Group(BaseUUIDModel, VisibilityGroupBase, table=True):
     __table_args__ = {
         'comment': 'Visibility Group',
@@ -36,3 +39,21 @@ class Visibility_Group(BaseUUIDModel, VisibilityGroupBase, table=True):
     }
     user: List["User"] = Relationship(
         sa_relationship_kwargs={'uselist': True}, back_populates="visibility_group")
+
+
+class Visibility_Group_Changelog(SQLModel, table=True):
+    """
+    filled by triggers on auth.visibility_group and auth.user (visibility_group_id, email),
+    polled by the visibility group snapshot to apply changes incrementally
+    """
+    __table_args__ = {
+        'comment': 'Visibility Group changelog',
+        "schema": "auth"
+    }
+    id: Optional[int] = Field(sa_column=Column(BigInteger, primary_key=True, autoincrement=True))
+    txid: Optional[int] = Field(
+        sa_column=Column(BigInteger, server_default=text("txid_current()"), nullable=False, index=True))
+    created_at: Optional[datetime] = Field(
+        sa_column=Column(TIMESTAMP, server_default=func.now(), nullable=False, index=True))
+    entity: str  # visibility_group | user
+    entity_id: UUID
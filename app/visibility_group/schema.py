@@ -1,6 +1,6 @@
 # # Native # #
 from typing_extensions import TypedDict
-from typing import Optional, List, Union
+from typing import Dict, Optional, List, Union
 from uuid import UUID
 
 # # Installed # #
@@ -16,7 +16,9 @@ __all__ = (
     "IRead",
     "IUpdate",
     "IVisibilityGroupSettings",
-    "IVisibilityGroupValidateResponse"
+    "IVisibilityGroupValidateResponse",
+    "IVisibilityGroupBatchValidateResponse",
+    "IVisibilityGroupDictionary",
 )
 
 
@@ -81,6 +83,7 @@ class IFilter(VisibilityGroupBase):
 class UserIdentity(TypedDict, total=False):
     id: UUID
     email: str
+    dense_id: int
 
 
 class IVisibilityGroupSettings(BaseModel):
@@ -96,3 +99,25 @@ class IVisibilityGroupSettings(BaseModel):
 
 class IVisibilityGroupValidateResponse(BaseModel):
     users: Union[List[UserIdentity], None]
+    # compact format: base64 serialized roaring bitmap of users dense ids
+    bitmap: Optional[str]
+    dictionary_version: Optional[int]
+
+
+class IVisibilityGroupBatchValidateResponse(BaseModel):
+    # users visible for any of the entities, listed once
+    users: Union[List[UserIdentity], None]
+    # entity -> positions of its users in `users`
+    entities: Optional[Dict[str, List[int]]]
+    # compact format: entity -> base64 serialized roaring bitmap of users dense ids
+    bitmaps: Optional[Dict[str, str]]
+    dictionary_version: Optional[int]
+
+
+class IVisibilityGroupDictionary(BaseModel):
+    version: int
+    # digest of the caller's visible dense ids up to `version`, sent back with `since`
+    digest: str
+    # the users are the whole dictionary, not the tail after `since`
+    full: bool
+    users: List[UserIdentity]
@@ -1,54 +1,415 @@
 # # Native # #
-from datetime import datetime
+import json
+import asyncio
+import base64
+import hashlib
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
 from uuid import UUID
 
 # # Installed # #
 import httpx
+from pydantic import BaseModel
+from pyroaring import BitMap
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 # # Package # #
 from app import crud
 from core.security import verify_jwt_token
 from core.logger import logger
+from core.database.session import get_session
 from core.settings import settings
+from core.snapshot import SharedSnapshot
 from core.exceptions import ConflictException
-from app.visibility_group.schema import IVisibilityGroupSettings
+from core.constants import VISIBILITY_GROUP_ENTITY_POSSIBLE_VALUES
+from app.visibility_group.model import Visibility_Group
+from app.visibility_group.schema import IVisibilityGroupSettings, UserIdentity
 
-__all__ = ("VisibilityGroup",)
+__all__ = ("VisibilityGroup", "VisibilityIndex")
+
+ENTITIES = VISIBILITY_GROUP_ENTITY_POSSIBLE_VALUES
+
+
+def get_parent_prefix(prefix: str) -> Optional[str]:
+    return prefix.rsplit("/", 1)[0] if "/" in prefix else None
+
+
+def get_depth(prefix: str) -> int:
+    return prefix.count("/")
+
+
+def get_dictionary_digest(dense_ids: Iterable[int]) -> str:
+    """digest of a set of dense ids, tells whether the visible users up to a dictionary version changed"""
+    return hashlib.blake2b(",".join(map(str, sorted(dense_ids))).encode(), digest_size=16).hexdigest()
+
+
+def encode(value: Any) -> Any:
+    return value.dict() if isinstance(value, BaseModel) else str(value)
+
+
+class VisibilityIndex:
+    """
+    prefix tree of visibility groups with the users visible for every (group, entity, admin/non-admin)
+    combination precomputed:
+    * own group users, if the entity settings contain "user" (or "admin" for the group admin);
+    * users of descendant groups having "parent" in their entity settings (`down`, accumulated bottom-up);
+    * users of ancestor groups having "child" in their entity settings (`up`, accumulated top-down).
+    prefixes missing in between (e.g. "a/b" for "a/b/c") are kept as empty tree nodes.
+    a change of a group affects its ancestors and its subtree only, see `refresh`.
+    user sets are roaring bitmaps of the users dense ids, lists of identities are built on first request
+    """
+
+    def __init__(self, visibility: Optional[Dict[str, IVisibilityGroupSettings]] = None):
+        self.visibility: Dict[str, IVisibilityGroupSettings] = {}
+        self.identities: Dict[int, UserIdentity] = {}  # dense id -> identity
+        self.dense: Dict[UUID, int] = {}
+        self.dictionary_version = 0  # the highest dense id known
+        self.own: Dict[str, BitMap] = {}
+        self.nodes: Set[str] = set()
+        self.children: Dict[str, Set[str]] = {}
+        self.down: Dict[str, Dict[str, BitMap]] = {entity: {} for entity in ENTITIES}
+        self.up: Dict[str, Dict[str, BitMap]] = {entity: {} for entity in ENTITIES}
+        # (prefix, entity, is_admin) -> (visible users, whether the caller is added as the owner)
+        self.entries: Dict[Tuple[str, str, bool], Tuple[BitMap, bool]] = {}
+        self.lists: Dict[Tuple[str, str, bool], List[UserIdentity]] = {}
+        for group in (visibility or {}).values():
+            self.put(group)
+        self.refresh(self.nodes)
+
+    def settings_of(self, prefix: str, entity: str) -> List[str]:
+        group = self.visibility.get(prefix)
+        return (getattr(group, entity) or []) if group else []
+
+    def add_identity(self, user: UserIdentity) -> int:
+        self.identities[user["dense_id"]] = user
+        self.dense[user["id"]] = user["dense_id"]
+        self.dictionary_version = max(self.dictionary_version, user["dense_id"])
+        return user["dense_id"]
+
+    def put(self, group: IVisibilityGroupSettings) -> None:
+        self.visibility[group.prefix] = group
+        self.own[group.prefix] = BitMap(self.add_identity(user) for user in group.user)
+        prefix = group.prefix
+        while prefix is not None and prefix not in self.nodes:
+            self.nodes.add(prefix)
+            parent = get_parent_prefix(prefix)
+            if parent is not None:
+                self.children.setdefault(parent, set()).add(prefix)
+            prefix = parent
+
+    def pop(self, prefix: str) -> Tuple[Optional[IVisibilityGroupSettings], List[str]]:
+        """
+        (settings of the removed group, tree nodes removed with it).
+        `up` and `down` of the removed nodes are dropped: a node added again is new for `refresh`
+        """
+        group = self.visibility.pop(prefix, None)
+        for dense_id in self.own.pop(prefix, BitMap()):
+            identity = self.identities.pop(dense_id, None)
+            if identity is not None:
+                self.dense.pop(identity["id"], None)
+        # empty nodes left without children are dropped
+        removed = []
+        while prefix is not None and prefix in self.nodes and prefix not in self.visibility \
+                and not self.children.get(prefix):
+            self.nodes.discard(prefix)
+            self.children.pop(prefix, None)
+            for entity in ENTITIES:
+                self.up[entity].pop(prefix, None)
+                self.down[entity].pop(prefix, None)
+            removed.append(prefix)
+            parent = get_parent_prefix(prefix)
+            if parent is not None:
+                self.children[parent].discard(prefix)
+            prefix = parent
+        return group, removed
+
+    def add_user(self, prefix: str, user: UserIdentity) -> None:
+        group = self.visibility[prefix]
+        group.user = [i for i in group.user if i["id"] != user["id"]] + [user]
+        self.own[prefix].add(self.add_identity(user))
+
+    def remove_user(self, prefix: str, user_id: UUID) -> None:
+        group = self.visibility[prefix]
+        group.user = [i for i in group.user if i["id"] != user_id]
+        if user_id in self.dense:
+            dense_id = self.dense.pop(user_id)
+            self.identities.pop(dense_id, None)
+            self.own[prefix].discard(dense_id)
+
+    def refresh(self, changed: Iterable[str]) -> None:
+        """
+        recompute `down` for the changed groups and their ancestors, `up` for their subtrees
+        and the entries of both
+        """
+        ancestors: Set[str] = set()
+        subtree: Set[str] = set()
+        for prefix in changed:
+            root = prefix
+            while prefix is not None and prefix not in ancestors:
+                ancestors.add(prefix)
+                if prefix in self.nodes and prefix not in self.up[ENTITIES[0]]:
+                    root = prefix  # a new node, its subtree is recomputed from it
+                prefix = get_parent_prefix(prefix)
+            stack = [root]
+            while stack:
+                prefix = stack.pop()
+                if prefix not in subtree:
+                    subtree.add(prefix)
+                    stack.extend(self.children.get(prefix, ()))
+
+        bottom_up = sorted(ancestors, key=get_depth, reverse=True)
+        top_down = sorted(subtree, key=get_depth)
+        for entity in ENTITIES:
+            down, up = self.down[entity], self.up[entity]
+            for prefix in bottom_up:
+                if prefix not in self.nodes:
+                    down.pop(prefix, None)
+                    continue
+                shared = BitMap()
+                for child in self.children.get(prefix, ()):
+                    shared |= down[child]
+                    if "parent" in self.settings_of(child, entity):
+                        shared |= self.own[child]
+                down[prefix] = shared
+            for prefix in top_down:
+                if prefix not in self.nodes:
+                    up.pop(prefix, None)
+                    continue
+                parent = get_parent_prefix(prefix)
+                shared = BitMap(up[parent]) if parent is not None else BitMap()
+                if parent is not None and "child" in self.settings_of(parent, entity):
+                    shared |= self.own[parent]
+                up[prefix] = shared
+
+        for prefix in ancestors | subtree:
+            self.update_entries(prefix)
+
+    def update_entries(self, prefix: str) -> None:
+        for entity in ENTITIES:
+            for is_admin in (True, False):
+                self.entries.pop((prefix, entity, is_admin), None)
+                self.lists.pop((prefix, entity, is_admin), None)
+        if prefix not in self.visibility:
+            return
+        for entity in ENTITIES:
+            entity_settings = self.settings_of(prefix, entity)
+            base = self.down[entity][prefix] | self.up[entity][prefix]
+            if "user" in entity_settings:
+                admin = non_admin = (base | self.own[prefix], False)
+            elif "admin" in entity_settings:
+                admin = (base | self.own[prefix], False)
+                non_admin = (base, "owner" in entity_settings)
+            else:
+                admin = non_admin = (base, "owner" in entity_settings)
+            self.entries[(prefix, entity, True)] = admin
+            self.entries[(prefix, entity, False)] = non_admin
+
+    def get_users(self, key: Tuple[str, str, bool]) -> List[UserIdentity]:
+        if key not in self.lists:
+            self.lists[key] = [self.identities[i] for i in self.entries[key][0]]
+        return self.lists[key]
+
+    def __getstate__(self) -> dict:
+        # identity lists are rebuilt on demand, they are not part of a shared snapshot
+        return {**self.__dict__, "lists": {}}
+
+
+def get_settings(group: Visibility_Group, users: List[UserIdentity]) -> IVisibilityGroupSettings:
+    return IVisibilityGroupSettings(
+        id=group.id,
+        admin=group.admin,
+        prefix=group.prefix,
+        user=users,
+        **{entity: getattr(group, entity) or [] for entity in ENTITIES},
+    )
 
 
 class VisibilityGroup:
     def __init__(self):
-        self.visibility = {}
+        self.index = VisibilityIndex()
+        self.prefixes: Dict[UUID, str] = {}  # group id -> prefix
+        self.members: Dict[UUID, UUID] = {}  # user id -> group id
+        # changelog position: entries of transactions from `xmin` on may still appear,
+        # `applied` keeps the ones already seen to skip them
+        self.xmin: Optional[int] = None
+        self.applied: Dict[int, int] = {}
         self.visibility_update_timestamp = 0
         self.VISIBILITY_UPDATE_DELAY = 1  # TODO: increase this to value
+        self.stale = False  # set on change notifications, see `invalidate`
+        # incremented on every change of the index, the version of a shared snapshot
+        self.revision = 0
+        # (revision, prefixes of the changed groups or None if all of them could change), see `get_delta`
+        self.history: Deque[Tuple[int, Optional[Set[str]]]] = deque(maxlen=settings.VISIBILITY_CHANGES_HISTORY)
+        # digest of the serialized settings -> revision, for the revisions kept in the history
+        self.versions: Dict[str, int] = {}
+        # (revision, digest, GET /visibility_group/settings response body), see `get_serialized`
+        self.serialized: Optional[Tuple[int, str, bytes]] = None
+        # snapshot shared with the other worker processes of the host
+        self.shared = SharedSnapshot("visibility_group") if settings.SNAPSHOT_SHARED else None
+
+    @property
+    def visibility(self) -> Dict[str, IVisibilityGroupSettings]:
+        return self.index.visibility
 
     async def get(
         self,
         db_session: AsyncSession,
     ):
-        if not self.visibility:
-            await self.update(db_session)
+        elapsed = int(datetime.now().timestamp()) - self.visibility_update_timestamp
+        if self.shared is not None and not self.shared.is_refresher() and self.read_shared(elapsed):
+            return self.visibility
+        if self.xmin is None or elapsed > settings.VISIBILITY_CHANGELOG_RETENTION_HOURS * 3600:
+            await self.reload(db_session)
             self.visibility_update_timestamp = int(datetime.now().timestamp())
-        if (
-            int(datetime.now().timestamp()) - self.visibility_update_timestamp
-        ) > self.VISIBILITY_UPDATE_DELAY:
+        elif elapsed > self.VISIBILITY_UPDATE_DELAY or self.stale:
+            self.stale = False
             await self.update(db_session)
             self.visibility_update_timestamp = int(datetime.now().timestamp())
+        if self.shared is not None and self.shared.is_refresher():
+            self.shared.publish(self.revision, (self.index, self.prefixes, self.members))
         return self.visibility
 
-    async def update(
+    def invalidate(self):
+        """
+        apply the changelog on the next `get`
+        """
+        self.stale = True
+
+    def read_shared(self, elapsed: int) -> bool:
+        """
+        switch to the snapshot published by the refresher process of the host if there is a new one.
+        False if nothing is loaded yet or the published file is not trusted, the database is read then
+        """
+        if self.revision and elapsed <= self.VISIBILITY_UPDATE_DELAY and not self.stale:
+            return True
+        self.stale = False
+        published = self.shared.read()
+        if published is not None:
+            self.revision, (self.index, self.prefixes, self.members) = published
+            # revisions of another refresher are not comparable with the ones seen before
+            self.history.clear()
+            self.versions = {}
+            self.history.append((self.revision, None))
+            # the changelog position belongs to the refresher, a process taking over reloads
+            self.xmin = None
+        self.visibility_update_timestamp = int(datetime.now().timestamp())
+        return bool(self.revision) and not self.shared.refused
+
+    async def reload(
         self,
         db_session: AsyncSession,
     ):
-        self.visibility = await crud.visibility_group.get_visibility_group_and_users(
+        xmin = await crud.visibility_group.get_changes_xmin(db_session)
+        # changes visible now are already part of the groups loaded below
+        changes = await crud.visibility_group.get_changes(db_session, xmin=xmin)
+        visibility = await crud.visibility_group.get_visibility_group_and_users(
             db_session
         )
-        self.visibility = {
-            i.prefix: IVisibilityGroupSettings.parse_obj(i) for i in self.visibility
-        }
+        self.load({i.prefix: IVisibilityGroupSettings.parse_obj(i) for i in visibility})
+        self.xmin = xmin
+        self.applied = {i.id: i.txid for i in changes}
         # logger.debug(f'Visibility group updated: {self.visibility}')
 
+    def load(self, visibility: Dict[str, IVisibilityGroupSettings]):
+        self.index = VisibilityIndex(visibility)
+        self.prefixes = {group.id: prefix for prefix, group in visibility.items()}
+        self.members = {user["id"]: group.id for group in visibility.values() for user in group.user}
+        self.revision += 1
+        self.history.append((self.revision, None))
+
+    async def update(
+        self,
+        db_session: AsyncSession,
+    ):
+        """
+        apply the changes recorded into the changelog since the previous update
+        """
+        xmin = await crud.visibility_group.get_changes_xmin(db_session)
+        changes = [
+            i for i in await crud.visibility_group.get_changes(db_session, xmin=self.xmin)
+            if i.id not in self.applied
+        ]
+        self.applied.update({i.id: i.txid for i in changes})
+        self.applied = {k: v for k, v in self.applied.items() if v >= xmin}
+        self.xmin = xmin
+        if not changes:
+            return
+
+        group_ids = {i.entity_id for i in changes if i.entity == "visibility_group"}
+        user_ids = {i.entity_id for i in changes if i.entity == "user"}
+        changed: Set[str] = set()
+
+        # groups are popped first, so prefixes can be swapped between groups
+        groups = await crud.visibility_group.get_by_ids(db_session, ids=list(group_ids)) if group_ids else []
+        users = {}
+        for group_id in group_ids:
+            prefix = self.prefixes.pop(group_id, None)
+            if prefix is not None:
+                current, _ = self.index.pop(prefix)
+                users[group_id] = current.user if current else []
+                changed.add(prefix)
+        for group in groups:
+            self.index.put(get_settings(group, users.get(group.id, [])))
+            self.prefixes[group.id] = group.prefix
+            changed.add(group.prefix)
+
+        members = await crud.visibility_group.get_members(db_session, user_ids=list(user_ids)) if user_ids else []
+        members = {i[0]: i for i in members}
+        for user_id in user_ids:
+            prefix = self.prefixes.get(self.members.pop(user_id, None))
+            if prefix is not None:
+                self.index.remove_user(prefix, user_id)
+                changed.add(prefix)
+            if user_id not in members or members[user_id][2] is None:
+                continue
+            _, email, group_id, dense_id = members[user_id]
+            prefix = self.prefixes.get(group_id)
+            if prefix is None:
+                logger.warning(f"Visibility group {group_id} of user {user_id} is not loaded, reloading")
+                self.xmin = None
+                return
+            self.index.add_user(prefix, {"id": user_id, "email": email, "dense_id": dense_id})
+            self.members[user_id] = group_id
+            changed.add(prefix)
+
+        self.index.refresh(changed)
+        self.revision += 1
+        self.history.append((self.revision, changed))
+        logger.debug(f"Visibility group changes applied: {len(changes)}, groups refreshed: {len(changed)}")
+
+    def get_serialized(self) -> Tuple[str, bytes]:
+        """
+        (digest, GET /visibility_group/settings response body), serialized once per revision
+        """
+        if self.serialized is None or self.serialized[0] != self.revision:
+            content = json.dumps(self.visibility, default=encode).encode()
+            digest = hashlib.sha256(content).hexdigest()
+            self.serialized = (self.revision, digest, content)
+            oldest = self.history[0][0] if self.history else self.revision
+            self.versions = {k: v for k, v in self.versions.items() if v >= oldest}
+            self.versions[digest] = self.revision
+        return self.serialized[1], self.serialized[2]
+
+    def get_delta(self, since: str) -> Optional[dict]:
+        """
+        current settings of the groups changed after version `since` (None for deleted prefixes);
+        None if `since` is unknown or the changes after it are not kept
+        """
+        version, _ = self.get_serialized()
+        revision = self.versions.get(since)
+        if revision is None or (self.history and self.history[0][0] > revision + 1):
+            return None
+        changed: Set[str] = set()
+        for i, prefixes in self.history:
+            if i <= revision:
+                continue
+            if prefixes is None:
+                return None
+            changed |= prefixes
+        groups = {prefix: encode(self.visibility[prefix]) if prefix in self.visibility else None for prefix in changed}
+        return {"version": version, "since": since, "groups": groups}
+
     async def get_from_api(self):
         async with httpx.ClientSession() as session:
             url = f"{settings.HOSTNAME}/api/vi/visibility_group/settings"
@@ -56,69 +417,178 @@ class VisibilityGroup:
                 r = await r.json()
         return r["data"]
 
-    async def validate(
-        self, db_session: AsyncSession, visibility_group_entity: str, access_token: str
+    def resolve(
+        self, prefix: str, visibility_group_entity: str, user_id: str, email: str, compact: bool = False
     ) -> dict:
         """
-        return the list of users whose data can be accessed by the user whose token is passed
+        users visible for the member of the group, a dictionary lookup in the precomputed index.
+        `compact` returns base64 serialized roaring bitmap of dense ids instead of the list,
+        ids are resolved with the dictionary of the same or a newer version
         """
+        group = self.visibility.get(prefix)
+        if group is None:
+            raise ConflictException(
+                detail="Visibility group user belongs to does not exist"
+            )
+        if visibility_group_entity not in VISIBILITY_GROUP_ENTITY_POSSIBLE_VALUES:
+            raise ConflictException(detail="Visibility group entity does not exist")
 
-        response = {"users": []}
-
-        payload = await verify_jwt_token(token=access_token, token_type="access", db_session=db_session, crud=crud)
-        if payload["visibility_group"] is None:
-            raise ConflictException(detail="User has no visibility_group")
+        is_admin = str(group.admin) == str(user_id)
+        key = (prefix, visibility_group_entity, is_admin)
+        bitmap, owner = self.index.entries[key]
+        dense_id = self.index.dense.get(UUID(user_id))
+        if compact:
+            if owner and dense_id is not None:
+                bitmap = bitmap | BitMap([dense_id])
+            return {
+                "bitmap": base64.b64encode(bitmap.serialize()).decode(),
+                "dictionary_version": self.index.dictionary_version,
+            }
+        users = self.index.get_users(key)
+        if owner:
+            users = users + [self.index.identities.get(dense_id) or {"id": UUID(user_id), "email": email}]
+        return {"users": users}
 
-        visibility_groups = await self.get(db_session)
-        if payload["visibility_group"] not in visibility_groups:
+    async def resolve_sql(
+        self,
+        db_session: AsyncSession,
+        prefix: str,
+        visibility_group_entity: str,
+        user_id: str,
+        email: str,
+        compact: bool = False,
+    ) -> dict:
+        """
+        the same as `resolve`, but computed by the database, for organisations too large for the snapshot.
+        `dictionary_version` of the compact response is the highest dense id in it
+        """
+        if visibility_group_entity not in VISIBILITY_GROUP_ENTITY_POSSIBLE_VALUES:
+            raise ConflictException(detail="Visibility group entity does not exist")
+        rows = await crud.visibility_group.get_visible_users(
+            db_session, prefix=prefix, entity=visibility_group_entity, user_id=UUID(user_id))
+        if not rows:
             raise ConflictException(
                 detail="Visibility group user belongs to does not exist"
             )
 
-        visibility_group = visibility_groups[payload["visibility_group"]].dict()
+        admin, entity_settings, dense_id = rows[0][:3]
+        users = [{"id": i[3], "email": i[4], "dense_id": i[5]} for i in rows if i[3] is not None]
+        own = "user" in entity_settings or ("admin" in entity_settings and str(admin) == str(user_id))
+        if not own and "owner" in entity_settings:
+            users.append({"id": UUID(user_id), "email": email, "dense_id": dense_id})
+        if compact:
+            bitmap = BitMap(i["dense_id"] for i in users if i.get("dense_id") is not None)
+            return {
+                "bitmap": base64.b64encode(bitmap.serialize()).decode(),
+                "dictionary_version": bitmap.max() if bitmap else 0,
+            }
+        return {"users": users}
 
-        logger.debug(f"Visibility groups: {visibility_groups}")
-        logger.debug(f"User visibility group: {visibility_group}")
+    async def validate(
+        self,
+        db_session: AsyncSession,
+        visibility_group_entity: str,
+        access_token: Optional[str] = None,
+        compact: bool = False,
+        payload: Optional[dict] = None,
+    ) -> dict:
+        """
+        return the list of users whose data can be accessed by the user whose token is passed,
+        the token is not verified again when its verified `payload` is passed
+        """
+        payload = await self.get_payload(db_session, access_token, payload)
+        response = await self.resolve_payload(db_session, payload, visibility_group_entity, compact)
+        logger.debug(f"Visibility group response: {len(response.get('users') or [])} users")
+        return response
 
-        if visibility_group_entity not in visibility_group:
-            raise ConflictException(detail="Visibility group entity does not exist")
+    async def get_payload(self, db_session: AsyncSession, access_token: Optional[str], payload: Optional[dict]) -> dict:
+        if payload is None:
+            payload = await verify_jwt_token(
+                token=access_token, token_type="access", db_session=db_session, crud=crud)
+        if payload["visibility_group"] is None:
+            raise ConflictException(detail="User has no visibility_group")
+        if settings.VISIBILITY_GROUP_MODE != "sql":
+            await self.get(db_session)
+        return payload
+
+    async def resolve_payload(
+        self, db_session: AsyncSession, payload: dict, visibility_group_entity: str, compact: bool = False
+    ) -> dict:
+        if settings.VISIBILITY_GROUP_MODE == "sql":
+            return await self.resolve_sql(
+                db_session, payload["visibility_group"], visibility_group_entity, payload["user_id"],
+                payload["email"], compact)
+        return self.resolve(
+            payload["visibility_group"], visibility_group_entity, payload["user_id"], payload["email"], compact)
+
+    async def validate_batch(
+        self,
+        db_session: AsyncSession,
+        visibility_group_entities: List[str],
+        access_token: Optional[str] = None,
+        compact: bool = False,
+        payload: Optional[dict] = None,
+    ) -> dict:
+        """
+        validate several entities with one token verification and one snapshot read.
+        users visible for any of the entities are listed once, entities refer to them by position
+        """
+        payload = await self.get_payload(db_session, access_token, payload)
+        response = {"users": [], "entities": {}, "bitmaps": {}, "dictionary_version": 0}
+        positions: Dict[UUID, int] = {}
+        for entity in visibility_group_entities:
+            resolved = await self.resolve_payload(db_session, payload, entity, compact)
+            if compact:
+                response["bitmaps"][entity] = resolved["bitmap"]
+                response["dictionary_version"] = max(response["dictionary_version"], resolved["dictionary_version"])
+                continue
+            references = []
+            for user in resolved["users"]:
+                if user["id"] not in positions:
+                    positions[user["id"]] = len(response["users"])
+                    response["users"].append(user)
+                references.append(positions[user["id"]])
+            response["entities"][entity] = references
+        if compact:
+            response["users"] = response["entities"] = None
+        else:
+            response["bitmaps"] = response["dictionary_version"] = None
+        logger.debug(f"Visibility group batch response: {len(response['users'] or [])} users")
+        return response
 
-        if "admin" in visibility_group[visibility_group_entity] and str(
-            visibility_group["admin"]
-        ) == str(payload["user_id"]):
-            # if user is admin of the visibility group, he can access all the data in this group
-            response["users"].extend(visibility_group["user"])
+    async def get_dictionary(
+        self, db_session: AsyncSession, payload: dict, since: int = 0, digest: Optional[str] = None
+    ) -> dict:
+        """
+        dense id -> user identity for the users visible for the caller (for any entity).
+        only users with dense ids greater than `since` are returned while the caller's visible users up to `since`
+        are unchanged, `digest` is the one returned with `since`; otherwise the whole dictionary is returned
+        (`full`) and replaces the one the caller has
+        """
+        payload = await self.get_payload(db_session, None, payload)
+        users: Dict[int, UserIdentity] = {}
+        for entity in ENTITIES:
+            for user in (await self.resolve_payload(db_session, payload, entity))["users"]:
+                if user.get("dense_id") is not None:
+                    users[user["dense_id"]] = user
+        if settings.VISIBILITY_GROUP_MODE == "sql":
+            version = max(users, default=0)
+        else:
+            version = self.index.dictionary_version
+        full = not since or digest != get_dictionary_digest(i for i in users if i <= since)
+        return {
+            "version": version,
+            "digest": get_dictionary_digest(i for i in users if i <= version),
+            "full": full,
+            "users": [users[i] for i in sorted(users) if full or i > since],
+        }
 
-        elif "user" in visibility_group[visibility_group_entity]:
-            response["users"].extend(visibility_group["user"])
+async def main():
+    async for db_session in get_session():
+        removed = await crud.visibility_group.remove_changes(
+            db_session, older_than=timedelta(hours=settings.VISIBILITY_CHANGELOG_RETENTION_HOURS))
+        logger.info(f"visibility group changelog entries removed: {removed}")
 
-        elif "owner" in visibility_group[visibility_group_entity]:
-            response["users"].extend(
-                [{"id": UUID(payload["user_id"]), "email": payload["email"]}]
-            )
 
-        # looking for child visibility groups
-        for prefix, value in visibility_groups.items():
-            if (
-                prefix.startswith(visibility_group["prefix"])
-                and prefix != visibility_group["prefix"]
-            ):
-                value = value.dict()
-                if "parent" in value[visibility_group_entity]:
-                    response["users"].extend(value["user"])
-
-        # looking for parent visibility groups
-        parents_prefixes = []
-        for i in visibility_group["prefix"].split("/")[:-1]:
-            if len(parents_prefixes) == 0:
-                parents_prefixes.append(i)
-            else:
-                parents_prefixes.append(f"{parents_prefixes[-1]}/{i}")
-        for prefix, value in visibility_groups.items():
-            if prefix in parents_prefixes:
-                value = value.dict()
-                if "child" in value[visibility_group_entity]:
-                    response["users"].extend(value["user"])
-
-        logger.debug(f"Visibility group response: {response}")
-        return response
+if __name__ == "__main__":
+    asyncio.run(main())
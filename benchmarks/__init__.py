@@ -0,0 +1,6 @@
+# # Native # #
+import os
+
+# the result documents are written to stdout, the application logs go to stderr from the first record on
+# (the settings are logged at import), see core/logger.py
+os.environ.setdefault("LOG_STREAM", "stderr")
@@ -0,0 +1,265 @@
+"""
+authorisation hot paths on synthetic snapshots: RBAC matching and validation, visibility group validation,
+JWT sign/verify, AuthPolicy.build and lambda_handler end to end with the sample AWS/YC events
+
+    python -m benchmarks.authorisation --resources 1000 --roles 100 --groups 1000 --users 20000 \
+        --output bench.json [--postgres]
+
+lambda_handler runs in the stateless mode (signed bundle, no database) and, with --postgres, against the
+configured Postgres: the synthetic rules, a user and its session are inserted and deleted at the end.
+prints the JSON document (also written to --output), results of two runs are compared with
+`python -m benchmarks.compare`
+"""
+# # Native # #
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+from uuid import UUID, uuid4
+
+# # Installed # #
+from sqlalchemy import delete, insert
+
+# # Package # #
+from core.logger import logger
+from core.settings import settings
+from core.security import create_jwt_token, decode_jwt_token, get_token_digest
+from core.constants import VISIBILITY_GROUP_ENTITY_POSSIBLE_VALUES
+from core.database.session import async_session_factory
+from app.rbac.util import RBAC
+from app.rbac.schema import IRBACValidate
+from app.rbac.bundle import RBACBundle, dump_bundle, write_bundle
+from app.visibility_group.util import VisibilityGroup
+from app.authoriser import main as authoriser
+from app.authoriser import util as authoriser_util
+from app.role.model import Role
+from app.team.model import Team
+from app.resource.model import Resource
+from app.permission.model import Permission
+from app.user.model import User
+from app.sessions.model import Sessions
+from benchmarks.util import EVENTS, get_metadata, make_event, make_rbac, make_requests, measure, measure_async
+from benchmarks.visibility_group import make_visibility
+
+# the snapshots are loaded once, nothing is refreshed during a run
+NO_REFRESH = 10 ** 9
+
+
+def make_payload(data: dict, visibility: dict, seed: int) -> dict:
+    """
+    access token claims of a user with a few roles and a team of the synthetic rules
+    """
+    rnd = random.Random(seed)
+    prefix = rnd.choice([i for i, group in visibility.items() if group.user])
+    user = visibility[prefix].user[0]
+    roles = rnd.sample(list(data["roles"]), min(3, len(data["roles"])))
+    return {
+        "user_id": str(user["id"]),
+        "email": user["email"],
+        "roles": {i: data["roles"][i] for i in roles},
+        "teams": rnd.sample(list(data["teams"]), min(1, len(data["teams"]))),
+        "visibility_group": prefix,
+    }
+
+
+async def bench_rbac(args, data: dict, payload: dict) -> dict:
+    rbac = RBAC()
+    started = time.perf_counter()
+    rbac.load(data)
+    load_seconds = time.perf_counter() - started
+    rbac.RBAC_UPDATE_DELAY = NO_REFRESH
+    rbac.rbac_update_timestamp = int(datetime.now().timestamp())
+    requests = [IRBACValidate(method=m, endpoint=u) for m, u in make_requests(data, args.requests, args.seed)]
+    return {
+        "rbac.load": {"seconds": round(load_seconds, 3)},
+        # first match of every url, without the memoized matches
+        "rbac.find": measure(rbac.find, [(i.method, i.endpoint) for i in requests]),
+        # token claims already verified, as in-app checks and batches do
+        "rbac.validate": await measure_async(
+            lambda req: rbac.validate(None, req, payload=payload), [(i,) for i in requests]),
+    }
+
+
+async def bench_visibility_group(args, visibility: dict) -> dict:
+    vg = VisibilityGroup()
+    started = time.perf_counter()
+    vg.load(visibility)
+    load_seconds = time.perf_counter() - started
+    # a loaded snapshot with a changelog position is served without the database
+    vg.xmin = 0
+    vg.VISIBILITY_UPDATE_DELAY = NO_REFRESH
+    vg.visibility_update_timestamp = int(datetime.now().timestamp())
+    rnd = random.Random(args.seed)
+    members = [(prefix, user) for prefix, group in visibility.items() for user in group.user]
+    calls = []
+    for _ in range(args.requests):
+        prefix, user = rnd.choice(members)
+        payload = {"user_id": str(user["id"]), "email": user["email"], "visibility_group": prefix}
+        calls.append((rnd.choice(VISIBILITY_GROUP_ENTITY_POSSIBLE_VALUES), payload))
+    return {
+        "visibility_group.load": {"seconds": round(load_seconds, 3)},
+        "visibility_group.validate": await measure_async(
+            lambda entity, payload: vg.validate(None, entity, payload=payload), calls),
+        "visibility_group.validate_compact": await measure_async(
+            lambda entity, payload: vg.validate(None, entity, compact=True, payload=payload), calls),
+    }
+
+
+def bench_jwt(args, payload: dict) -> dict:
+    tokens = [create_jwt_token(payload, timedelta(minutes=15), "access")[0] for _ in range(args.requests // 10 or 1)]
+    return {
+        "jwt.sign": measure(create_jwt_token, [(payload, timedelta(minutes=15), "access")] * len(tokens)),
+        "jwt.verify": measure(decode_jwt_token, [(i, "access") for i in tokens]),
+    }
+
+
+def bench_policy(args) -> dict:
+    def build_all(principal_id):
+        policy = authoriser.AuthPolicy(principal_id, "123456789012")
+        policy.allowAllMethods()
+        return policy.build()
+
+    def build_methods(principal_id):
+        policy = authoriser.AuthPolicy(principal_id, "123456789012")
+        for i in range(args.policy_methods):
+            policy.allowMethod(authoriser.HttpVerb.GET, f"/api/bench/v1/entity{i}/*")
+        policy.denyMethod(authoriser.HttpVerb.ALL, "*")
+        return policy.build()
+
+    principals = [(str(uuid4()),) for _ in range(args.requests)]
+    return {
+        "auth_policy.build": measure(build_all, principals),
+        f"auth_policy.build_{args.policy_methods}_methods": measure(
+            build_methods, principals[:args.requests // 10 or 1]),
+    }
+
+
+async def bench_lambda_handler(args, data: dict, token: str, mode: str) -> dict:
+    requests = make_requests(data, args.lambda_requests, args.seed)
+    results = {}
+    for kind in EVENTS:
+        events = [make_event(kind, token, method, url) for method, url in requests]
+        authorised = []
+
+        async def handle(authorizer_type, event, authorised=authorised):
+            authoriser.AUTHORIZER_TYPE = authorizer_type
+            response = await authoriser.lambda_handler(event, None)
+            if "isAuthorized" in response:
+                authorised.append(response["isAuthorized"])
+            else:
+                authorised.append(response["policyDocument"]["Statement"][0]["Effect"] == "Allow")
+
+        results[f"lambda_handler.{mode}.{kind}"] = {
+            **await measure_async(handle, events),
+            "authorised_ratio": round(sum(authorised) / len(authorised), 3),
+        }
+    return results
+
+
+async def bench_lambda_stateless(args, data: dict, token: str) -> dict:
+    rbac = RBAC()
+    rbac.load(data)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "rbac.bundle")
+        write_bundle(path, dump_bundle(rbac))
+        previous = settings.AUTHORISER_BUNDLE_PATH, settings.AUTHORISER_STATELESS_TOKENS, authoriser_util.bundle
+        settings.AUTHORISER_BUNDLE_PATH, settings.AUTHORISER_STATELESS_TOKENS = path, True
+        authoriser_util.bundle = RBACBundle(path)
+        try:
+            return await bench_lambda_handler(args, data, token, "stateless")
+        finally:
+            settings.AUTHORISER_BUNDLE_PATH, settings.AUTHORISER_STATELESS_TOKENS, authoriser_util.bundle = previous
+
+
+def uuid_or_none(value):
+    return UUID(value) if value else None
+
+
+async def bench_lambda_database(args, data: dict, payload: dict, token: str, expires_at: int) -> dict:
+    """
+    the rules, the user and its session are committed, the authoriser reads them with its own sessions
+    """
+    user_id, session_id = UUID(payload["user_id"]), uuid4()
+    rows = [
+        (Role, [
+            {"id": UUID(k), "title": v, "parent_id": uuid_or_none(data["hierarchy"][k])}
+            for k, v in data["roles"].items()
+        ]),
+        (Team, [{"id": UUID(k), "title": v} for k, v in data["teams"].items()]),
+        (Resource, [{"id": UUID(k), **v} for k, v in data["resources"].items()]),
+        (Permission, [
+            {"id": UUID(k), **{key: uuid_or_none(value) for key, value in v.items()}}
+            for k, v in data["permissions"].items()
+        ]),
+        (User, [{"id": user_id, "email": f"{uuid4().hex[:8]}.{payload['email']}"}]),
+        (Sessions, [{
+            "id": session_id, "cookie": "", "access_token": token, "refresh_token": "",
+            "access_token_digest": get_token_digest(token), "expires_at": expires_at, "user_id": user_id,
+        }]),
+    ]
+    try:
+        async with async_session_factory() as db_session:
+            for model, values in rows:
+                for i in range(0, len(values), 10000):
+                    await db_session.execute(insert(model.__table__), values[i:i + 10000])
+            await db_session.commit()
+        return await bench_lambda_handler(args, data, token, "database")
+    finally:
+        async with async_session_factory() as db_session:
+            for model, values in reversed(rows):
+                table = model.__table__
+                await db_session.execute(delete(table).where(table.c.id.in_([i["id"] for i in values])))
+            await db_session.commit()
+
+
+async def run(args) -> dict:
+    data = make_rbac(args.resources, args.roles, args.teams, args.seed)
+    visibility = make_visibility(args.groups, args.users, args.branching, args.seed)
+    payload = make_payload(data, visibility, args.seed)
+    token, expires_at = create_jwt_token(payload, timedelta(hours=1), "access")
+
+    results = {}
+    results.update(await bench_rbac(args, data, payload))
+    results.update(await bench_visibility_group(args, visibility))
+    results.update(bench_jwt(args, payload))
+    results.update(bench_policy(args))
+    results.update(await bench_lambda_stateless(args, data, token))
+    if args.postgres:
+        results.update(await bench_lambda_database(args, data, payload, token, expires_at))
+    return {"benchmark": "authorisation", **get_metadata(args), "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resources", type=int, default=1000)
+    parser.add_argument("--roles", type=int, default=100)
+    parser.add_argument("--teams", type=int, default=20)
+    parser.add_argument("--groups", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--branching", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--lambda-requests", type=int, default=500)
+    parser.add_argument("--policy-methods", type=int, default=50)
+    parser.add_argument("--postgres", action="store_true", help="also run lambda_handler against the database")
+    parser.add_argument("--log-level", default="WARNING", help="level of the application logs, written to stderr")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    # logs go to stderr, stdout is the result document
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+    result = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(result)
+    print(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+compare two benchmark result documents, e.g. of the base and the head commit
+
+    python -m benchmarks.compare base.json head.json --metric p50_us --threshold 0.1
+
+prints a JSON document with the change of every result present in both, exits with 1 if any of them
+is slower than the base by more than the threshold (a ratio, 0.1 - 10%)
+"""
+# # Native # #
+import sys
+import json
+import argparse
+
+
+def compare(base: dict, head: dict, metric: str, threshold: float) -> dict:
+    changes = {}
+    for name, result in head["results"].items():
+        # timings in microseconds, loads in seconds
+        key = metric if metric in result else "seconds"
+        if key not in result or key not in base["results"].get(name, {}) or not base["results"][name][key]:
+            continue
+        change = result[key] / base["results"][name][key] - 1
+        changes[name] = {
+            "metric": key,
+            "base": base["results"][name][key],
+            "head": result[key],
+            "change": round(change, 3),
+            "regression": change > threshold,
+        }
+    return {
+        "base": base.get("commit"),
+        "head": head.get("commit"),
+        "parameters_differ": base.get("parameters") != head.get("parameters"),
+        "regressions": sorted(name for name, i in changes.items() if i["regression"]),
+        "results": changes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--metric", default="p50_us", choices=["mean_us", "p50_us", "p99_us"])
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    result = compare(base, head, args.metric, args.threshold)
+    print(json.dumps(result, indent=2))
+    sys.exit(1 if result["regressions"] else 0)
+
+
+if __name__ == "__main__":
+    main()
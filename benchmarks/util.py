@@ -0,0 +1,155 @@
+# # Native # #
+import os
+import sys
+import json
+import time
+import random
+import subprocess
+from datetime import datetime
+from statistics import mean
+from typing import Awaitable, Callable, List, Tuple
+from uuid import uuid4
+
+__all__ = (
+    "summarize",
+    "measure",
+    "measure_async",
+    "make_rbac",
+    "make_requests",
+    "make_event",
+    "get_metadata",
+)
+
+EVENTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "app", "authoriser")
+# sample events of the gateways: (AUTHORIZER_TYPE, file)
+EVENTS = {
+    "aws.v1": ("AWS", "aws/aws-lambda/lambda-authorizer/request.v.1.0.json"),
+    "aws.v2": ("AWS", "aws/aws-lambda/lambda-authorizer/request.v.2.0.json"),
+    "yc": ("YC", "yc/events.yc-function/function-authorizer/event.json"),
+}
+METHODS = ["get", "post", "put", "delete", "patch"]
+
+
+def summarize(samples: List[float]) -> dict:
+    """
+    timings in seconds -> microseconds statistics
+    """
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "mean_us": round(mean(samples) * 1e6, 2),
+        "p50_us": round(samples[len(samples) // 2] * 1e6, 2),
+        "p99_us": round(samples[min(int(len(samples) * 0.99), len(samples) - 1)] * 1e6, 2),
+        "ops_per_s": round(len(samples) / sum(samples), 1) if sum(samples) else None,
+    }
+
+
+def measure(fn: Callable, args: List[tuple], warmup: int = 10) -> dict:
+    for i in args[:warmup]:
+        fn(*i)
+    samples = []
+    for i in args:
+        started = time.perf_counter()
+        fn(*i)
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+async def measure_async(fn: Callable[..., Awaitable], args: List[tuple], warmup: int = 10) -> dict:
+    for i in args[:warmup]:
+        await fn(*i)
+    samples = []
+    for i in args:
+        started = time.perf_counter()
+        await fn(*i)
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def make_rbac(resources: int, roles: int, teams: int, seed: int) -> dict:
+    """
+    RBAC snapshot data (see `RBAC.update`): roles in a hierarchy, resources spread over services with
+    $uuid$/$str$ placeholders, a few permissions per resource granted to roles or teams
+    """
+    rnd = random.Random(seed)
+    run = uuid4().hex[:8]  # titles are unique in the database
+    role_ids = [str(uuid4()) for _ in range(roles)]
+    team_ids = [str(uuid4()) for _ in range(teams)]
+    data = {"roles": {}, "hierarchy": {}, "teams": {}, "resources": {}, "permissions": {}}
+    for i, role_id in enumerate(role_ids):
+        data["roles"][role_id] = f"bench-{run}-role-{i}"
+        # parents come first, rows can be inserted in this order
+        data["hierarchy"][role_id] = rnd.choice(role_ids[:i]) if i and rnd.random() < 0.5 else None
+    for i, team_id in enumerate(team_ids):
+        data["teams"][team_id] = f"bench-{run}-team-{i}"
+    for i in range(resources):
+        endpoint = f"/api/bench/v1/service{i % 50}/entity{i}"
+        endpoint += rnd.choice(["", "/$uuid$", "/$str$", "/$uuid$/items/$str$"])
+        resource_id = str(uuid4())
+        data["resources"][resource_id] = {
+            "endpoint": endpoint,
+            "method": rnd.choice(METHODS),
+            "rbac_enable": rnd.random() < 0.9,
+            "visibility_group_enable": False,
+            "visibility_group_entity": None,
+        }
+        for principal in rnd.sample(role_ids + team_ids, min(rnd.randint(1, 3), roles + teams)):
+            data["permissions"][str(uuid4())] = {
+                "role_id": principal if principal in data["roles"] else None,
+                "team_id": principal if principal in data["teams"] else None,
+                "resource_id": resource_id,
+            }
+    return data
+
+
+def make_requests(data: dict, count: int, seed: int) -> List[Tuple[str, str]]:
+    """
+    (method, url) of the resources with values for the placeholders, a tenth matches no resource
+    """
+    rnd = random.Random(seed)
+    resources = list(data["resources"].values())
+    requests = []
+    for _ in range(count):
+        if rnd.random() < 0.1:
+            requests.append((rnd.choice(METHODS), f"/api/bench/v1/unknown/{uuid4()}"))
+            continue
+        resource = rnd.choice(resources)
+        url = resource["endpoint"].replace("$uuid$", str(uuid4())).replace("$str$", f"item{rnd.randint(0, 999)}")
+        requests.append((resource["method"], url))
+    return requests
+
+
+def make_event(kind: str, token: str, method: str, url: str) -> Tuple[str, dict]:
+    """
+    (AUTHORIZER_TYPE, event) of the sample event `kind` (see `EVENTS`) with the token and the request
+    """
+    authorizer_type, path = EVENTS[kind]
+    with open(os.path.join(EVENTS_DIR, path)) as f:
+        event = json.load(f)
+    event["headers"]["Authorization"] = f"Bearer {token}"
+    event["headers"].pop("authorization", None)
+    if kind == "aws.v2":
+        event["rawPath"] = url
+        event["requestContext"]["http"].update({"method": method.upper(), "path": url})
+    else:
+        event.update({"resource": url, "path": url, "httpMethod": method.upper()})
+    return authorizer_type, event
+
+
+def get_metadata(args) -> dict:
+    """
+    what the results are comparable by: commit, interpreter, machine and the synthetic sizes
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "created_at": datetime.utcnow().isoformat(),
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "cpus": os.cpu_count(),
+        "parameters": vars(args),
+    }
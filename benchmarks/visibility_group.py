@@ -0,0 +1,123 @@
+"""
+VisibilityGroup snapshot load and validate benchmark on a synthetic hierarchy
+
+    python -m benchmarks.visibility_group --groups 10000 --users 200000
+
+prints a JSON document with the timings
+"""
+# # Native # #
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from statistics import mean
+from uuid import uuid4
+
+# # Package # #
+from core.constants import VISIBILITY_GROUP_ENTITY_POSSIBLE_VALUES, VISIBILITY_GROUP_ENTITY_SETTINGS
+from app.visibility_group.schema import IVisibilityGroupSettings
+from app.visibility_group.util import VisibilityGroup
+
+
+def make_visibility(groups: int, users: int, branching: int, seed: int) -> dict:
+    """
+    `groups` groups in a tree with `branching` children per node, `users` spread evenly between the groups
+    """
+    rnd = random.Random(seed)
+    prefixes = [f"g{i}" for i in range(min(branching, groups))]
+    queue = list(prefixes)
+    while len(prefixes) < groups:
+        parent = queue.pop(0)
+        for i in range(branching):
+            if len(prefixes) >= groups:
+                break
+            prefixes.append(f"{parent}/g{i}")
+            queue.append(prefixes[-1])
+
+    members = {prefix: [] for prefix in prefixes}
+    for i in range(users):
+        members[prefixes[i % groups]].append({"id": uuid4(), "email": f"user{i}@example.com", "dense_id": i + 1})
+
+    visibility = {}
+    for prefix in prefixes:
+        visibility[prefix] = IVisibilityGroupSettings(
+            id=uuid4(),
+            admin=members[prefix][0]["id"] if members[prefix] else None,
+            prefix=prefix,
+            user=members[prefix],
+            **{
+                entity: rnd.sample(VISIBILITY_GROUP_ENTITY_SETTINGS, rnd.randint(0, 2))
+                for entity in VISIBILITY_GROUP_ENTITY_POSSIBLE_VALUES
+            },
+        )
+    return visibility
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--groups", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=200000)
+    parser.add_argument("--branching", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    visibility = make_visibility(args.groups, args.users, args.branching, args.seed)
+    vg = VisibilityGroup()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    vg.load(visibility)
+    load_seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rnd = random.Random(args.seed)
+    members = [(prefix, user) for prefix, group in visibility.items() for user in group.user]
+
+    # a user moving to another group, the way changelog entries are applied
+    moves = []
+    for _ in range(100):
+        (source, user), (target, _) = rnd.choice(members), rnd.choice(members)
+        if user not in vg.visibility[source].user:
+            continue
+        started = time.perf_counter()
+        vg.index.remove_user(source, user["id"])
+        vg.index.add_user(target, user)
+        vg.index.refresh({source, target})
+        moves.append(time.perf_counter() - started)
+    members = [(prefix, user) for prefix, group in vg.visibility.items() for user in group.user]
+    samples = {False: [], True: []}
+    sizes = []
+    bitmap_sizes = []
+    for _ in range(args.requests):
+        prefix, user = rnd.choice(members)
+        entity = rnd.choice(VISIBILITY_GROUP_ENTITY_POSSIBLE_VALUES)
+        for compact in (False, True):
+            started = time.perf_counter()
+            response = vg.resolve(prefix, entity, str(user["id"]), user["email"], compact)
+            samples[compact].append(time.perf_counter() - started)
+        sizes.append(len(vg.resolve(prefix, entity, str(user["id"]), user["email"])["users"]))
+        bitmap_sizes.append(len(response["bitmap"]))
+    for i in samples.values():
+        i.sort()
+
+    print(json.dumps({
+        "benchmark": "visibility_group",
+        "groups": args.groups,
+        "users": args.users,
+        "load_seconds": round(load_seconds, 3),
+        "load_peak_mb": round(peak / 2 ** 20, 1),
+        "move_user_mean_ms": round(mean(moves) * 1e3, 2),
+        "validate_mean_us": round(mean(samples[False]) * 1e6, 2),
+        "validate_p99_us": round(samples[False][int(len(samples[False]) * 0.99)] * 1e6, 2),
+        "validate_compact_mean_us": round(mean(samples[True]) * 1e6, 2),
+        "validate_compact_p99_us": round(samples[True][int(len(samples[True]) * 0.99)] * 1e6, 2),
+        "users_per_response_mean": round(mean(sizes), 1),
+        "bitmap_base64_bytes_mean": round(mean(bitmap_sizes), 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+in-memory snapshot vs SQL (ltree) visibility resolution on a synthetic hierarchy inserted into the
+configured Postgres inside a transaction which is rolled back at the end
+
+    python -m benchmarks.visibility_group_sql --groups 10000 --users 200000 --requests 1000
+
+prints a JSON document with the timings
+"""
+# # Native # #
+import argparse
+import asyncio
+import json
+import random
+import time
+from statistics import mean
+from uuid import uuid4
+
+# # Installed # #
+from sqlalchemy import insert
+
+# # Package # #
+from app import crud
+from app.user.model import User
+from app.visibility_group.model import Visibility_Group
+from app.visibility_group.schema import IVisibilityGroupSettings
+from app.visibility_group.util import VisibilityGroup
+from core.constants import VISIBILITY_GROUP_ENTITY_POSSIBLE_VALUES
+from core.database.session import async_session_factory
+from benchmarks.visibility_group import make_visibility
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return round(samples[min(int(len(samples) * q), len(samples) - 1)] * 1e3, 3)
+
+
+async def run(args) -> dict:
+    root = f"bench{uuid4().hex[:8]}"
+    visibility = make_visibility(args.groups, args.users, args.branching, args.seed)
+    async with async_session_factory() as db_session:
+        try:
+            await db_session.execute(insert(Visibility_Group.__table__), [
+                {"id": group.id, "prefix": f"{root}/{prefix}", "admin": group.admin,
+                 **{entity: getattr(group, entity) for entity in VISIBILITY_GROUP_ENTITY_POSSIBLE_VALUES}}
+                for prefix, group in visibility.items()
+            ])
+            users = [
+                {"id": user["id"], "email": f"{root}.{user['email']}", "visibility_group_id": group.id}
+                for group in visibility.values() for user in group.user
+            ]
+            for i in range(0, len(users), 10000):
+                await db_session.execute(insert(User.__table__), users[i:i + 10000])
+
+            vg = VisibilityGroup()
+            started = time.perf_counter()
+            groups = await crud.visibility_group.get_visibility_group_and_users(db_session)
+            vg.load({i.prefix: IVisibilityGroupSettings.parse_obj(i) for i in groups})
+            load_seconds = time.perf_counter() - started
+
+            rnd = random.Random(args.seed)
+            members = [(f"{root}/{prefix}", user) for prefix, group in visibility.items() for user in group.user]
+            samples = {"memory": [], "sql": []}
+            for _ in range(args.requests):
+                prefix, user = rnd.choice(members)
+                entity = rnd.choice(VISIBILITY_GROUP_ENTITY_POSSIBLE_VALUES)
+                email = f"{root}.{user['email']}"
+                started = time.perf_counter()
+                memory = vg.resolve(prefix, entity, str(user["id"]), email)
+                samples["memory"].append(time.perf_counter() - started)
+                started = time.perf_counter()
+                sql = await vg.resolve_sql(db_session, prefix, entity, str(user["id"]), email)
+                samples["sql"].append(time.perf_counter() - started)
+                assert {i["id"] for i in memory["users"]} == {i["id"] for i in sql["users"]}
+        finally:
+            await db_session.rollback()
+
+    return {
+        "benchmark": "visibility_group_sql",
+        "groups": args.groups,
+        "users": args.users,
+        "memory_load_seconds": round(load_seconds, 3),
+        **{
+            f"{mode}_{name}_ms": value
+            for mode, values in samples.items()
+            for name, value in (
+                ("mean", round(mean(values) * 1e3, 3)),
+                ("p50", percentile(values, 0.5)),
+                ("p99", percentile(values, 0.99)),
+            )
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--groups", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=200000)
+    parser.add_argument("--branching", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    print(json.dumps(asyncio.run(run(parser.parse_args())), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,14 @@
 # # Native # #
 from datetime import datetime
-from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union
+from typing import Any, Dict, Generic, Iterable, List, Optional, Type, TypeVar, Union
 from uuid import UUID
 # # Installed # #
 from fastapi_pagination.ext.async_sqlmodel import paginate
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
+from sqlalchemy import any_, bindparam
+from sqlalchemy.dialects import postgresql
 from sqlmodel import SQLModel, and_, select, func, or_
-from sqlalchemy.orm import selectinload
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel.sql.expression import Select, SelectOfScalar
 
@@ -22,6 +23,12 @@ T = TypeVar("T", bound=SQLModel)
 
 
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
+    # named loading profiles: profile name -> loader options, e.g.
+    # {"detail": [selectinload(User.roles)]}. relationships are not loaded unless listed
+    loaders: Dict[str, List[Any]] = {}
+    # column holding the user a row belongs to, rows are visibility-scoped by it
+    visibility_column: str = "created_by"
+
     def __init__(self, model: Type[ModelType]):
         """
         CRUD object with default methods to Create, Read, Update, Delete (CRUD).
@@ -31,12 +38,17 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         """
         self.model = model
 
+    def get_options(self, profile: Optional[str]) -> List[Any]:
+        if profile is None:
+            return []
+        return self.loaders.get(profile, [])
+
     async def get(
-        self, db_session: AsyncSession, *, id: Union[UUID, str]
+        self, db_session: AsyncSession, *, id: Union[UUID, str], profile: Optional[str] = "detail"
     ) -> Optional[ModelType]:
         response = await db_session.exec(
             select(self.model).where(
-                self.model.id == id).options(selectinload('*'))
+                self.model.id == id).options(*self.get_options(profile))
         )
         return response.first()
 
@@ -64,11 +76,11 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         return response.all()
 
     async def get_multi(
-        self, db_session: AsyncSession, *, skip: int = 0, limit: int = 100
+        self, db_session: AsyncSession, *, skip: int = 0, limit: int = 100, profile: Optional[str] = "list"
     ) -> List[ModelType]:
         response = await db_session.exec(
             select(self.model).offset(skip).limit(
-                limit).order_by(self.model.id)
+                limit).order_by(self.model.id).options(*self.get_options(profile))
         )
         return response.all()
 
@@ -77,18 +89,33 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         filters: Optional[Dict[str, Any]] = None,
         scope: Optional[List[str]] = None,
         params: Optional[Params] = Params(),
-        query: Optional[Union[T, Select[T], SelectOfScalar[T]]] = None
+        query: Optional[Union[T, Select[T], SelectOfScalar[T]]] = None,
+        profile: Optional[str] = "list",
+        visible_user_ids: Optional[Iterable[UUID]] = None,
     ) -> Page[ModelType]:
+        """
+        `visible_user_ids` - users whose rows the caller can see (see `get_current_user`), `None` - no scoping
+        """
         sub_where, join_table = await self.__get_sub_query_filters(filters=filters)
         select_fields = await self.__get_select_fields(scope=scope)
         if query is None:
             query = select(*select_fields)
             for table in join_table:
                 query = query.join(*table).select_from(self.model)
-            query = query.where(
-                *sub_where).options(selectinload('*'))
+            query = query.where(*sub_where)
+            if not scope:
+                # loader options apply to entities only, not to scoped columns
+                query = query.options(*self.get_options(profile))
+        if visible_user_ids is not None:
+            query = query.where(self.get_visibility_filter(visible_user_ids))
         return await paginate(db_session, query, params)
 
+    def get_visibility_filter(self, user_ids: Iterable[UUID]):
+        # the whole set is sent as a single array parameter: column = ANY(:ids)
+        ids = bindparam(
+            "visible_user_ids", list(user_ids), type_=postgresql.ARRAY(postgresql.UUID(as_uuid=True)), unique=True)
+        return getattr(self.model, self.visibility_column) == any_(ids)
+
     async def create(
         self, db_session: AsyncSession,
         *,
@@ -133,9 +160,11 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         return obj_current
 
     async def remove(
-        self, db_session: AsyncSession, *, id: Union[UUID, str]
+        self, db_session: AsyncSession, *, id: Union[UUID, str], profile: Optional[str] = "delete"
     ) -> ModelType:
-        response = await db_session.exec(select(self.model).where(self.model.id == id))
+        # the "delete" profile loads collections whose link rows have to be removed too
+        response = await db_session.exec(
+            select(self.model).where(self.model.id == id).options(*self.get_options(profile)))
         obj = response.one()
         await db_session.delete(obj)
         await db_session.commit()
@@ -0,0 +1,94 @@
+# # Native # #
+import time
+from typing import Any, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+# # Installed # #
+
+# # Package # #
+from core.settings import settings
+
+__all__ = (
+    "TTLCache",
+    "principal_cache",
+    "claims_cache",
+    "get_claims_cache_ttl",
+)
+
+
+class TTLCache:
+    """
+    in-process cache with optional expiration and tag based invalidation.
+    `ttl` - seconds an entry lives, `None` - entries never expire, `0` - cache is disabled
+    """
+
+    def __init__(self, ttl: Optional[float] = None, maxsize: int = 10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.data: Dict[Hashable, Tuple[float, Any]] = {}
+        self.tags: Dict[Hashable, Set[Hashable]] = {}
+        # key -> its tags, expired and evicted keys are removed from `tags` as well
+        self.key_tags: Dict[Hashable, Set[Hashable]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl is None or self.ttl > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if key not in self.data:
+            return None
+        expires_at, value = self.data[key]
+        if expires_at and expires_at < time.monotonic():
+            self.invalidate(key)
+            return None
+        return value
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[Hashable] = ()) -> None:
+        if not self.enabled:
+            return
+        # a replaced entry takes the new tags and becomes the newest one
+        self.invalidate(key)
+        if len(self.data) >= self.maxsize:
+            self.invalidate(next(iter(self.data)))  # the oldest entry
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0
+        self.data[key] = (expires_at, value)
+        tags = set(tags)
+        if tags:
+            self.key_tags[key] = tags
+        for tag in tags:
+            self.tags.setdefault(tag, set()).add(key)
+
+    def invalidate(self, key: Hashable) -> None:
+        self.data.pop(key, None)
+        for tag in self.key_tags.pop(key, ()):
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+    def invalidate_tag(self, tag: Hashable) -> None:
+        for key in list(self.tags.get(tag, ())):
+            self.invalidate(key)
+
+    def clear(self) -> None:
+        self.data.clear()
+        self.tags.clear()
+        self.key_tags.clear()
+
+
+# principals resolved by get_current_user, keyed by access token digest and tagged by user id
+principal_cache = TTLCache(ttl=settings.PRINCIPAL_CACHE_TTL)
+
+
+def get_claims_cache_ttl() -> int:
+    if settings.CLAIMS_CACHE_TTL is not None:
+        return settings.CLAIMS_CACHE_TTL
+    return 300 if settings.CHANGES_LISTEN else 0
+
+
+# access token claims documents keyed by user id, see `crud.user.get_claims`.
+# role titles, team ids and visibility group prefixes are part of the claims: updates and deletes of roles,
+# teams and visibility groups clear the whole cache, user changes drop the user entry. other processes learn
+# about them from CHANGES_LISTEN notifications only (app/common/changes.py), so without the listener the
+# cache is off unless CLAIMS_CACHE_TTL is set
+claims_cache = TTLCache(ttl=get_claims_cache_ttl())
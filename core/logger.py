@@ -1,4 +1,5 @@
 # # Native # #
+import os
 import sys
 
 # # Installed # #
@@ -14,5 +15,7 @@ __all__ = (
 
 logger.remove()
 logger.level("INFO", color="<green>")
-logger.add(sys.stdout, colorize=True, enqueue=False, level="DEBUG",
+# LOG_STREAM=stderr keeps stdout for the output of command line tools, it is read before anything is logged
+logger.add(sys.stderr if os.getenv("LOG_STREAM") == "stderr" else sys.stdout,
+           colorize=True, enqueue=False, level="DEBUG",
            format="<green>{time:HH:mm:ss}</green> | {level} | <level>{message}</level>")
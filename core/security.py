@@ -1,6 +1,7 @@
 # # Native # #
 import json
 import random
+import hashlib
 import string
 from datetime import datetime, timedelta
 
@@ -21,6 +22,8 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 __all__ = (
     "create_cookie",
     "create_jwt_token",
+    "get_token_digest",
+    "decode_jwt_token",
     "verify_jwt_token",
     "create_password",
     "get_password_hash",
@@ -40,7 +43,15 @@ def create_jwt_token(subject: dict, expires_delta: timedelta, token_type: str) -
     return encoded_jwt, expire
 
 
-async def verify_jwt_token(token: str, token_type: str, db_session: AsyncSession, crud) -> dict:
+def get_token_digest(token: str) -> str:
+    # sessions are looked up by a fixed size digest instead of the whole jwt
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def decode_jwt_token(token: str, token_type: str) -> dict:
+    """
+    verify signature, expiration and payload of the token without looking up its session
+    """
     try:
         payload = jwt.decode(token, settings.PEM_PUBLIC_KEY,
                              algorithms=["RS256"], options={"verify_exp": True})
@@ -53,15 +64,10 @@ async def verify_jwt_token(token: str, token_type: str, db_session: AsyncSession
                 raise UnauthorizedException(detail="Invalid token payload")
             if not isinstance(payload['roles'], dict):
                 raise UnauthorizedException(detail="Invalid token payload roles")
-            if not await crud.sessions.get_by_access_token(db_session, access_token=token):
-                raise UnauthorizedException(detail="Access token not found")
-            return payload
         elif token_type == "refresh":
             if not set(["user_id"]).issubset(payload.keys()):
                 raise UnauthorizedException(detail="Invalid token payload")
-            if not await crud.sessions.get_by_refresh_token(db_session, refresh_token=token):
-                raise UnauthorizedException(detail="Refresh token not found")
-            return payload
+        return payload
     except jwt.ExpiredSignatureError:
         raise UnauthorizedException(detail="Token expired")
     except UnauthorizedException:
@@ -70,6 +76,22 @@ async def verify_jwt_token(token: str, token_type: str, db_session: AsyncSession
         raise UnauthorizedException(detail=f"Invalid token: {e}")
 
 
+async def verify_jwt_token(token: str, token_type: str, db_session: AsyncSession, crud) -> dict:
+    payload = decode_jwt_token(token, token_type)
+    try:
+        if token_type == "access":
+            if not await crud.sessions.get_by_access_token(db_session, access_token=token):
+                raise UnauthorizedException(detail="Access token not found")
+        elif token_type == "refresh":
+            if not await crud.sessions.get_by_refresh_token(db_session, refresh_token=token):
+                raise UnauthorizedException(detail="Refresh token not found")
+        return payload
+    except UnauthorizedException:
+        raise
+    except Exception as e:
+        raise UnauthorizedException(detail=f"Invalid token: {e}")
+
+
 async def verify_password(plain_password: str, hashed_password: str) -> bool:
     try:
         return pwd_context.verify(plain_password, hashed_password)
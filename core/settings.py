@@ -63,6 +63,49 @@ class Settings(BaseSettings):
     YC_SERVICE_ACCOUNT_ID: Optional[str]
     YC_AUTHORIZED_KEY_ID: Optional[str]
     YC_PRIVATE_KEY: Optional[str]
+    # sessions table partitioning, see docs/Session.md
+    SESSIONS_PARTITION_BY: Optional[Literal["created_at", "expires_at"]] = None
+    SESSIONS_PARTITION_INTERVAL_DAYS: int = 7
+    SESSIONS_PARTITION_PREMAKE: int = 4
+    SESSIONS_PARTITION_RETENTION_DAYS: int = 90
+    # seconds between flushes of the session activity buffer, 0 disables tracking
+    SESSION_ACTIVITY_FLUSH_INTERVAL: int = 30
+    # seconds a resolved principal is cached by access token digest, 0 disables the cache
+    PRINCIPAL_CACHE_TTL: int = 0
+    # seconds a per-user access token claims document is cached, 0 disables the cache.
+    # unset - 300 with CHANGES_LISTEN, 0 otherwise, see `claims_cache` in core/cache.py
+    CLAIMS_CACHE_TTL: Optional[int] = None
+    # hours visibility group changelog entries are kept; a snapshot not polled for longer is fully reloaded
+    VISIBILITY_CHANGELOG_RETENTION_HOURS: int = 24
+    # max (method, endpoint) pairs accepted by /rbac/validate/batch
+    RBAC_VALIDATE_BATCH_LIMIT: int = 100
+    # RBAC snapshot updates kept in process for resuming /rbac/changes streams
+    RBAC_CHANGES_HISTORY: int = 1000
+    # seconds a /rbac/changes stream is kept open, clients resume it with Last-Event-ID and a valid token
+    RBAC_CHANGES_STREAM_TIMEOUT: int = 3600
+    # bytes the access review report (/rbac/report, `python -m app.rbac.report`) may hold in memory
+    RBAC_REPORT_MEMORY_BUDGET: int = 512 * 1024 * 1024
+    # seconds between reloads of the user memberships of the access index (/rbac/access, /rbac/impact)
+    RBAC_ACCESS_INDEX_UPDATE_DELAY: int = 60
+    # memory - visibility is resolved from the in-process snapshot, sql - by a query per request
+    VISIBILITY_GROUP_MODE: Literal["memory", "sql"] = "memory"
+    # visibility snapshot updates kept in process for /visibility_group/settings?since= deltas
+    VISIBILITY_CHANGES_HISTORY: int = 1000
+    # worker processes of a host share the rbac and visibility snapshots through files in SNAPSHOT_SHARED_DIR,
+    # one of them reads the database, see core/snapshot.py
+    SNAPSHOT_SHARED: bool = False
+    SNAPSHOT_SHARED_DIR: str = "/dev/shm/auth-snapshot"
+    # lambda authoriser: RBAC rules are read from a signed bundle (local path or s3://bucket/key,
+    # written by `python -m app.rbac.bundle`) instead of the database
+    AUTHORISER_BUNDLE_PATH: Optional[str] = None
+    AUTHORISER_BUNDLE_POLL_INTERVAL: int = 30
+    # access tokens are trusted by signature and expiration without the session lookup,
+    # together with AUTHORISER_BUNDLE_PATH the authoriser does not connect to the database
+    AUTHORISER_STATELESS_TOKENS: bool = False
+    # caches are invalidated by postgres notifications on the auth tables, see app/common/changes.py;
+    # snapshots are then polled every CHANGES_POLL_INTERVAL seconds as a fallback
+    CHANGES_LISTEN: bool = False
+    CHANGES_POLL_INTERVAL: int = 60
 
     class Config(BaseSettings.Config):
         # env_prefix = "AWS_"
@@ -0,0 +1,130 @@
+# # Native # #
+import os
+import mmap
+import fcntl
+import time
+import stat
+import pickle
+from typing import Any, Optional, Tuple
+
+# # Installed # #
+
+# # Package # #
+from core.settings import settings
+from core.logger import logger
+
+__all__ = (
+    "SharedSnapshot",
+)
+
+MAGIC = b"AUTHSNAP1"
+
+
+class SharedSnapshot:
+    """
+    compiled snapshot shared by the worker processes of a host through a file in `SNAPSHOT_SHARED_DIR`
+    (tmpfs, /dev/shm by default).
+    the process holding the `<name>.lock` flock is the refresher: it reads the database and publishes
+    new versions, the others map the published file read-only instead of querying the database.
+    a version is written to a temporary file and renamed over `<name>.snapshot`, so readers see either
+    the previous or the new version; a reader switches when the file inode changes.
+    the lock is released when the refresher exits and the next process checking takes it over.
+    the payload is a pickle: it is read only while the directory and the file are owned by the service user
+    and not writable by others
+    """
+
+    LOCK_RETRY_DELAY = 1  # seconds between attempts of a reader to become the refresher
+
+    def __init__(self, name: str, directory: Optional[str] = None):
+        self.directory = directory or settings.SNAPSHOT_SHARED_DIR
+        self.path = os.path.join(self.directory, f"{name}.snapshot")
+        self.lock_path = os.path.join(self.directory, f"{name}.lock")
+        self.lock_fd: Optional[int] = None
+        self.lock_attempted_at = 0.0
+        self.inode: Optional[Tuple[int, int]] = None  # (st_dev, st_ino) of the loaded version
+        self.published: Any = None  # version last published by this process
+        self.refused: Optional[str] = None  # reason the published file was last refused, logged once
+
+    def is_refresher(self) -> bool:
+        if self.lock_fd is not None:
+            return True
+        if time.monotonic() - self.lock_attempted_at < self.LOCK_RETRY_DELAY:
+            return False
+        self.lock_attempted_at = time.monotonic()
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self.lock_fd = fd
+        logger.info(f"shared snapshot refresher: {self.path}, pid {os.getpid()}")
+        return True
+
+    def publish(self, version: Any, payload: Any) -> None:
+        """
+        write a new version, nothing is written if `version` is the one published last
+        """
+        if version == self.published:
+            return
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            pickle.dump((version, payload), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        st = os.stat(self.path)
+        self.inode = (st.st_dev, st.st_ino)
+        self.published = version
+        logger.debug(f"shared snapshot published: {self.path}, version {version}, {st.st_size} bytes")
+
+    @staticmethod
+    def get_untrusted_reason(path: str, st: os.stat_result) -> Optional[str]:
+        """
+        why `path` can be replaced by someone other than the service user, None if it can not
+        """
+        if st.st_uid != os.getuid():
+            return f"{path} is owned by uid {st.st_uid}, not {os.getuid()}"
+        if st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            return f"{path} is writable by group or others ({stat.filemode(st.st_mode)})"
+        return None
+
+    def refuse(self, reason: str) -> None:
+        if reason != self.refused:
+            logger.error(f"shared snapshot is not read: {reason}")
+        self.refused = reason
+
+    def read(self) -> Optional[Tuple[Any, Any]]:
+        """
+        (version, payload) of the published file if it changed since the previous read, None otherwise.
+        None as well if the directory or the file is not private to the service user
+        """
+        try:
+            reason = self.get_untrusted_reason(self.directory, os.lstat(self.directory))
+            fd = os.open(self.path, os.O_RDONLY | os.O_NOFOLLOW)
+        except FileNotFoundError:
+            return None
+        except OSError as e:  # ELOOP: the file is a symlink
+            self.refuse(f"{self.path}: {e}")
+            return None
+        try:
+            st = os.fstat(fd)
+            reason = reason or self.get_untrusted_reason(self.path, st)
+            if reason:
+                self.refuse(reason)
+                return None
+            self.refused = None
+            inode = (st.st_dev, st.st_ino)
+            if inode == self.inode or st.st_size <= len(MAGIC):
+                return None
+            with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mapped:
+                if mapped[:len(MAGIC)] != MAGIC:
+                    logger.warning(f"shared snapshot {self.path} has unknown format, ignored")
+                    return None
+                with memoryview(mapped)[len(MAGIC):] as view:
+                    version, payload = pickle.loads(view)
+        finally:
+            os.close(fd)
+        self.inode = inode
+        return version, payload
@@ -7,9 +7,10 @@ import struct
 import base64
 import traceback
 from uuid import UUID
-from typing import List, Type, Union, Dict, Any
+from typing import List, Optional, Type, Union, Dict, Any
 
 # # Installed # #
+from fastapi import Response
 from sqlmodel import SQLModel
 from pydantic import BaseModel
 from cryptography.hazmat.primitives.asymmetric.rsa import (
@@ -34,6 +35,7 @@ __all__ = (
     "jwk2pem",
     "ColumnAnnotation",
     "ApiListUtils",
+    "etag_response",
 )
 
 
@@ -129,6 +131,16 @@ class ApiListUtils:
                 detail=f"Invalid scope. Possible values are: {possible_values}")
 
 
+def etag_response(content: bytes, etag: str, if_none_match: Optional[str] = None) -> Response:
+    """
+    already serialized json `content` with a strong `etag`, 304 Not Modified if `If-None-Match` lists it
+    """
+    headers = {"ETag": etag}
+    if if_none_match and (if_none_match.strip() == "*" or etag in [i.strip() for i in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
 def lambda_request(lambda_client, function_name, payload, **kwargs) -> dict:
     try:
         response = lambda_client.invoke(
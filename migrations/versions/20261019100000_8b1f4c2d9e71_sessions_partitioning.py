@@ -0,0 +1,144 @@
+"""sessions_partitioning
+
+Revision ID: 8b1f4c2d9e71
+Revises: 627f75ac5c76
+Create Date: 2026-10-19 10:00:00.000000
+
+Adds token digests to auth.sessions and optionally turns the table into a
+range partitioned one. Partitioning is enabled with
+`alembic -x sessions_partition_by=created_at upgrade head` (or `expires_at`),
+the SESSIONS_PARTITION_BY setting is used when the argument is omitted.
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op, context
+import sqlalchemy as sa
+
+from core.settings import settings
+
+
+# revision identifiers, used by Alembic.
+revision = '8b1f4c2d9e71'
+down_revision = '627f75ac5c76'
+branch_labels = None
+depends_on = None
+
+
+def get_partition_by():
+    partition_by = context.get_x_argument(as_dictionary=True).get(
+        "sessions_partition_by", settings.SESSIONS_PARTITION_BY)
+    if partition_by not in (None, "", "created_at", "expires_at"):
+        raise ValueError(f"Invalid sessions_partition_by value: {partition_by}")
+    return partition_by or None
+
+
+def get_partition_ddl(partition_by):
+    """
+    the current partition and SESSIONS_PARTITION_PREMAKE ahead of it, as of this revision:
+    later partitions are created by app.sessions.util
+    """
+    epoch = datetime(1970, 1, 1)
+    interval_days = settings.SESSIONS_PARTITION_INTERVAL_DAYS
+
+    def get_bound(moment):
+        if partition_by == "expires_at":
+            return str(int((moment - epoch).total_seconds()))
+        return f"'{moment.isoformat(sep=' ')}'"
+
+    epoch_days = (datetime.utcnow().date() - epoch.date()).days
+    start = epoch + timedelta(days=epoch_days - epoch_days % interval_days)
+    statements = []
+    for _ in range(settings.SESSIONS_PARTITION_PREMAKE + 1):
+        end = start + timedelta(days=interval_days)
+        statements.append(
+            f"CREATE TABLE IF NOT EXISTS auth.sessions_p{start.strftime('%Y%m%d')} "
+            f"PARTITION OF auth.sessions FOR VALUES FROM ({get_bound(start)}) TO ({get_bound(end)})"
+        )
+        start = end
+    return statements
+
+
+def upgrade() -> None:
+    op.add_column('sessions', sa.Column('access_token_digest', sa.String(), nullable=True), schema='auth')
+    op.add_column('sessions', sa.Column('refresh_token_digest', sa.String(), nullable=True), schema='auth')
+    op.execute(
+        "UPDATE auth.sessions SET "
+        "access_token_digest = encode(sha256(convert_to(access_token, 'UTF8')), 'hex'), "
+        "refresh_token_digest = encode(sha256(convert_to(refresh_token, 'UTF8')), 'hex')"
+    )
+
+    partition_by = get_partition_by()
+    if not partition_by:
+        op.create_index('ix_auth_sessions_access_token_digest', 'sessions', ['access_token_digest'], schema='auth')
+        op.create_index('ix_auth_sessions_refresh_token_digest', 'sessions', ['refresh_token_digest'], schema='auth')
+        op.create_index('ix_auth_sessions_user_id', 'sessions', ['user_id'], schema='auth')
+        return
+
+    # unique constraints of a partitioned table have to include the partition key
+    op.execute("ALTER TABLE auth.sessions RENAME TO sessions_unpartitioned")
+    op.execute(f"""
+        CREATE TABLE auth.sessions (
+            created_at TIMESTAMP NOT NULL DEFAULT now(),
+            id UUID NOT NULL,
+            cookie VARCHAR NOT NULL,
+            access_token VARCHAR NOT NULL,
+            refresh_token VARCHAR NOT NULL,
+            access_token_digest VARCHAR,
+            refresh_token_digest VARCHAR,
+            token_type VARCHAR NOT NULL,
+            expires_at INTEGER NOT NULL,
+            user_id UUID REFERENCES auth.user (id),
+            PRIMARY KEY (id, {partition_by})
+        ) PARTITION BY RANGE ({partition_by})
+    """)
+    op.execute("COMMENT ON TABLE auth.sessions IS 'Sessions'")
+    # indexes created on the parent are created on every partition as well
+    op.create_index('ix_auth_sessions_access_token_digest', 'sessions', ['access_token_digest'], schema='auth')
+    op.create_index('ix_auth_sessions_refresh_token_digest', 'sessions', ['refresh_token_digest'], schema='auth')
+    op.create_index('ix_auth_sessions_user_id', 'sessions', ['user_id'], schema='auth')
+    op.execute("CREATE TABLE auth.sessions_default PARTITION OF auth.sessions DEFAULT")
+    for statement in get_partition_ddl(partition_by):
+        op.execute(statement)
+    op.execute(
+        "INSERT INTO auth.sessions (created_at, id, cookie, access_token, refresh_token, access_token_digest, "
+        "refresh_token_digest, token_type, expires_at, user_id) "
+        "SELECT coalesce(created_at, now()), id, cookie, access_token, refresh_token, access_token_digest, "
+        "refresh_token_digest, token_type, expires_at, user_id FROM auth.sessions_unpartitioned"
+    )
+    op.execute("DROP TABLE auth.sessions_unpartitioned")
+
+
+def downgrade() -> None:
+    is_partitioned = op.get_bind().execute(sa.text(
+        "SELECT count(*) FROM pg_partitioned_table WHERE partrelid = 'auth.sessions'::regclass"
+    )).scalar()
+    if is_partitioned:
+        op.execute("ALTER TABLE auth.sessions RENAME TO sessions_partitioned")
+        op.execute("""
+            CREATE TABLE auth.sessions (
+                created_at TIMESTAMP DEFAULT now(),
+                id UUID NOT NULL PRIMARY KEY,
+                cookie VARCHAR NOT NULL,
+                access_token VARCHAR NOT NULL,
+                refresh_token VARCHAR NOT NULL,
+                token_type VARCHAR NOT NULL,
+                expires_at INTEGER NOT NULL,
+                user_id UUID REFERENCES auth.user (id)
+            )
+        """)
+        op.execute("COMMENT ON TABLE auth.sessions IS 'Sessions'")
+        op.execute(
+            "INSERT INTO auth.sessions (created_at, id, cookie, access_token, refresh_token, token_type, "
+            "expires_at, user_id) "
+            "SELECT created_at, id, cookie, access_token, refresh_token, token_type, expires_at, user_id "
+            "FROM auth.sessions_partitioned"
+        )
+        op.execute("DROP TABLE auth.sessions_partitioned CASCADE")
+        return
+
+    op.drop_index('ix_auth_sessions_user_id', table_name='sessions', schema='auth')
+    op.drop_index('ix_auth_sessions_refresh_token_digest', table_name='sessions', schema='auth')
+    op.drop_index('ix_auth_sessions_access_token_digest', table_name='sessions', schema='auth')
+    op.drop_column('sessions', 'refresh_token_digest', schema='auth')
+    op.drop_column('sessions', 'access_token_digest', schema='auth')
@@ -0,0 +1,24 @@
+"""sessions_last_seen_at
+
+Revision ID: 3c6a9d0e5f42
+Revises: 8b1f4c2d9e71
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c6a9d0e5f42'
+down_revision = '8b1f4c2d9e71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('sessions', sa.Column('last_seen_at', sa.TIMESTAMP(), nullable=True), schema='auth')
+
+
+def downgrade() -> None:
+    op.drop_column('sessions', 'last_seen_at', schema='auth')
@@ -0,0 +1,30 @@
+"""user_lower_email_index
+
+Revision ID: 5e2b7f1a8c03
+Revises: 3c6a9d0e5f42
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e2b7f1a8c03'
+down_revision = '3c6a9d0e5f42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # fails if there are emails differing only by case, they have to be merged first
+    op.create_index('ix_auth_user_lower_email', 'user', [sa.text('lower(email)')], unique=True, schema='auth')
+    # lower(email) is the only unique email index: sso provisioning upserts on it, a second unique index
+    # on email would fail concurrent inserts instead of resolving them
+    op.execute("ALTER TABLE auth.user DROP CONSTRAINT IF EXISTS user_email_key")
+    op.execute("DROP INDEX IF EXISTS auth.ix_auth_user_email")
+
+
+def downgrade() -> None:
+    op.create_unique_constraint('user_email_key', 'user', ['email'], schema='auth')
+    op.drop_index('ix_auth_user_lower_email', table_name='user', schema='auth')
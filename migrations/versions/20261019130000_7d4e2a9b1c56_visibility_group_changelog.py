@@ -0,0 +1,77 @@
+"""visibility_group_changelog
+
+Revision ID: 7d4e2a9b1c56
+Revises: 5e2b7f1a8c03
+Create Date: 2026-10-19 13:00:00.000000
+
+Changes of auth.visibility_group rows and of auth.user visibility_group_id/email
+are recorded into auth.visibility_group_changelog by triggers.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '7d4e2a9b1c56'
+down_revision = '5e2b7f1a8c03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'visibility_group_changelog',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('txid', sa.BigInteger(), server_default=sa.text('txid_current()'), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('entity', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('entity_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        schema='auth',
+        comment='Visibility Group changelog',
+    )
+    op.create_index(
+        'ix_auth_visibility_group_changelog_txid', 'visibility_group_changelog', ['txid'], schema='auth')
+    op.create_index(
+        'ix_auth_visibility_group_changelog_created_at', 'visibility_group_changelog', ['created_at'], schema='auth')
+
+    op.execute("""
+        CREATE FUNCTION auth.visibility_group_changelog_record() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO auth.visibility_group_changelog (entity, entity_id)
+            VALUES (TG_ARGV[0], CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER visibility_group_changelog
+        AFTER INSERT OR UPDATE OR DELETE ON auth.visibility_group
+        FOR EACH ROW EXECUTE FUNCTION auth.visibility_group_changelog_record('visibility_group')
+    """)
+    op.execute("""
+        CREATE TRIGGER visibility_group_changelog_insert_delete
+        AFTER INSERT OR DELETE ON auth.user
+        FOR EACH ROW EXECUTE FUNCTION auth.visibility_group_changelog_record('user')
+    """)
+    op.execute("""
+        CREATE TRIGGER visibility_group_changelog_update
+        AFTER UPDATE OF visibility_group_id, email ON auth.user
+        FOR EACH ROW
+        WHEN (OLD.visibility_group_id IS DISTINCT FROM NEW.visibility_group_id OR OLD.email IS DISTINCT FROM NEW.email)
+        EXECUTE FUNCTION auth.visibility_group_changelog_record('user')
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS visibility_group_changelog_update ON auth.user")
+    op.execute("DROP TRIGGER IF EXISTS visibility_group_changelog_insert_delete ON auth.user")
+    op.execute("DROP TRIGGER IF EXISTS visibility_group_changelog ON auth.visibility_group")
+    op.execute("DROP FUNCTION IF EXISTS auth.visibility_group_changelog_record()")
+    op.drop_index(
+        'ix_auth_visibility_group_changelog_created_at', table_name='visibility_group_changelog', schema='auth')
+    op.drop_index('ix_auth_visibility_group_changelog_txid', table_name='visibility_group_changelog', schema='auth')
+    op.drop_table('visibility_group_changelog', schema='auth')
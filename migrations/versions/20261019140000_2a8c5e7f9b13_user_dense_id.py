@@ -0,0 +1,26 @@
+"""user_dense_id
+
+Revision ID: 2a8c5e7f9b13
+Revises: 7d4e2a9b1c56
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '2a8c5e7f9b13'
+down_revision = '7d4e2a9b1c56'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # existing rows are numbered when the identity column is added
+    op.execute("ALTER TABLE auth.user ADD COLUMN dense_id BIGINT GENERATED BY DEFAULT AS IDENTITY")
+    op.create_unique_constraint('user_dense_id_key', 'user', ['dense_id'], schema='auth')
+
+
+def downgrade() -> None:
+    op.drop_constraint('user_dense_id_key', 'user', schema='auth')
+    op.drop_column('user', 'dense_id', schema='auth')
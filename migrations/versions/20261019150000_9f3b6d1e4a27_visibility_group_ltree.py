@@ -0,0 +1,40 @@
+"""visibility_group_ltree
+
+Revision ID: 9f3b6d1e4a27
+Revises: 2a8c5e7f9b13
+Create Date: 2026-10-19 15:00:00.000000
+
+Adds auth.visibility_group.path, the prefix as ltree, for resolving visibility in SQL
+(VISIBILITY_GROUP_MODE=sql). Prefix segments may contain characters ltree labels
+do not allow, so every segment is hex encoded.
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9f3b6d1e4a27'
+down_revision = '2a8c5e7f9b13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS ltree")
+    op.execute("""
+        CREATE FUNCTION auth.prefix_to_ltree(prefix text) RETURNS ltree AS $$
+            SELECT coalesce(string_agg('x' || encode(convert_to(label, 'UTF8'), 'hex'), '.' ORDER BY n), '')::ltree
+            FROM unnest(string_to_array(prefix, '/')) WITH ORDINALITY AS t(label, n)
+        $$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE
+    """)
+    op.execute(
+        "ALTER TABLE auth.visibility_group "
+        "ADD COLUMN path ltree GENERATED ALWAYS AS (auth.prefix_to_ltree(prefix)) STORED"
+    )
+    op.execute("CREATE INDEX ix_auth_visibility_group_path ON auth.visibility_group USING gist (path)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS auth.ix_auth_visibility_group_path")
+    op.execute("ALTER TABLE auth.visibility_group DROP COLUMN IF EXISTS path")
+    op.execute("DROP FUNCTION IF EXISTS auth.prefix_to_ltree(text)")
@@ -0,0 +1,31 @@
+"""role_parent
+
+Revision ID: 4c7e1b8d2f35
+Revises: 9f3b6d1e4a27
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '4c7e1b8d2f35'
+down_revision = '9f3b6d1e4a27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('role', sa.Column('parent_id', postgresql.UUID(as_uuid=True), nullable=True), schema='auth')
+    op.create_foreign_key(
+        'role_parent_id_fkey', 'role', 'role', ['parent_id'], ['id'],
+        source_schema='auth', referent_schema='auth', ondelete='SET NULL')
+    op.create_index('ix_auth_role_parent_id', 'role', ['parent_id'], schema='auth')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_auth_role_parent_id', table_name='role', schema='auth')
+    op.drop_constraint('role_parent_id_fkey', 'role', schema='auth', type_='foreignkey')
+    op.drop_column('role', 'parent_id', schema='auth')
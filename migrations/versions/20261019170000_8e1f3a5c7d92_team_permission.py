@@ -0,0 +1,52 @@
+"""team_permission
+
+Revision ID: 8e1f3a5c7d92
+Revises: 4c7e1b8d2f35
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = '8e1f3a5c7d92'
+down_revision = '4c7e1b8d2f35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # permissions are keyed by id, (role_id, resource_id) stays unique for role permissions
+    op.drop_constraint('permission_pkey', 'permission', schema='auth', type_='primary')
+    op.create_primary_key('permission_pkey', 'permission', ['id'], schema='auth')
+    op.create_unique_constraint(
+        'permission_role_id_resource_id_key', 'permission', ['role_id', 'resource_id'], schema='auth')
+    op.alter_column('permission', 'role_id', existing_type=sqlmodel.sql.sqltypes.GUID(), nullable=True, schema='auth')
+    op.add_column('permission', sa.Column('team_id', sqlmodel.sql.sqltypes.GUID(), nullable=True), schema='auth')
+    op.create_foreign_key(
+        'permission_team_id_fkey', 'permission', 'team', ['team_id'], ['id'],
+        source_schema='auth', referent_schema='auth')
+    op.create_unique_constraint(
+        'permission_team_id_resource_id_key', 'permission', ['team_id', 'resource_id'], schema='auth')
+    op.create_check_constraint(
+        'permission_principal_check', 'permission', 'num_nonnulls(role_id, team_id) = 1', schema='auth')
+    op.create_index('ix_auth_permission_role_id', 'permission', ['role_id'], schema='auth')
+    op.create_index('ix_auth_permission_team_id', 'permission', ['team_id'], schema='auth')
+    op.create_index('ix_auth_permission_resource_id', 'permission', ['resource_id'], schema='auth')
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM auth.permission WHERE team_id IS NOT NULL")
+    op.drop_index('ix_auth_permission_resource_id', table_name='permission', schema='auth')
+    op.drop_index('ix_auth_permission_team_id', table_name='permission', schema='auth')
+    op.drop_index('ix_auth_permission_role_id', table_name='permission', schema='auth')
+    op.drop_constraint('permission_principal_check', 'permission', schema='auth', type_='check')
+    op.drop_constraint('permission_team_id_resource_id_key', 'permission', schema='auth', type_='unique')
+    op.drop_constraint('permission_team_id_fkey', 'permission', schema='auth', type_='foreignkey')
+    op.drop_column('permission', 'team_id', schema='auth')
+    op.alter_column('permission', 'role_id', existing_type=sqlmodel.sql.sqltypes.GUID(), nullable=False, schema='auth')
+    op.drop_constraint('permission_role_id_resource_id_key', 'permission', schema='auth', type_='unique')
+    op.drop_constraint('permission_pkey', 'permission', schema='auth', type_='primary')
+    op.create_primary_key('permission_pkey', 'permission', ['role_id', 'resource_id'], schema='auth')
@@ -0,0 +1,54 @@
+"""change_notify
+
+Revision ID: 3b9d7f2e6a48
+Revises: 8e1f3a5c7d92
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9d7f2e6a48'
+down_revision = '8e1f3a5c7d92'
+branch_labels = None
+depends_on = None
+
+# table -> column sent as the id of the changed row
+TABLES = {
+    'role': 'id',
+    'resource': 'id',
+    'permission': 'id',
+    'team': 'id',
+    'visibility_group': 'id',
+    'user': 'id',
+    'linkroleuser': 'user_id',
+    'linkteamuser': 'user_id',
+}
+
+
+def upgrade() -> None:
+    # notifications are delivered on commit, identical ones of a transaction are sent once
+    op.execute("""
+        CREATE FUNCTION auth.notify_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('auth_changes', json_build_object(
+                'table', TG_TABLE_NAME,
+                'id', to_jsonb(CASE WHEN TG_OP = 'DELETE' THEN OLD ELSE NEW END) ->> TG_ARGV[0]
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    for table, column in TABLES.items():
+        op.execute(f"""
+            CREATE TRIGGER notify_change
+            AFTER INSERT OR UPDATE OR DELETE ON auth.{table}
+            FOR EACH ROW EXECUTE FUNCTION auth.notify_change('{column}')
+        """)
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS notify_change ON auth.{table}")
+    op.execute("DROP FUNCTION IF EXISTS auth.notify_change()")
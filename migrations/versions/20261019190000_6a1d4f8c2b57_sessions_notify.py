@@ -0,0 +1,41 @@
+"""sessions_notify
+
+Revision ID: 6a1d4f8c2b57
+Revises: 3b9d7f2e6a48
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '6a1d4f8c2b57'
+down_revision = '3b9d7f2e6a48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # cached principals are keyed by the access token digest: a deleted session or a replaced token sends the old
+    # digest. the table name is fixed, TG_TABLE_NAME is the partition name in triggers of a partitioned table
+    op.execute("""
+        CREATE FUNCTION auth.notify_session_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('auth_changes', json_build_object(
+                'table', 'sessions',
+                'id', OLD.access_token_digest
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER notify_change
+        AFTER UPDATE OF access_token_digest, user_id OR DELETE ON auth.sessions
+        FOR EACH ROW EXECUTE FUNCTION auth.notify_session_change()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS notify_change ON auth.sessions")
+    op.execute("DROP FUNCTION IF EXISTS auth.notify_session_change()")
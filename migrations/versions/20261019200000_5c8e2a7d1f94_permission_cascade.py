@@ -0,0 +1,39 @@
+"""permission_cascade
+
+Revision ID: 5c8e2a7d1f94
+Revises: 6a1d4f8c2b57
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5c8e2a7d1f94'
+down_revision = '6a1d4f8c2b57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # team permissions are not link rows of a loaded collection, the database removes them with the team or the
+    # resource. the change_notify trigger fires for the cascaded rows as well
+    op.drop_constraint('permission_team_id_fkey', 'permission', schema='auth', type_='foreignkey')
+    op.create_foreign_key(
+        'permission_team_id_fkey', 'permission', 'team', ['team_id'], ['id'],
+        source_schema='auth', referent_schema='auth', ondelete='CASCADE')
+    op.drop_constraint('permission_resource_id_fkey', 'permission', schema='auth', type_='foreignkey')
+    op.create_foreign_key(
+        'permission_resource_id_fkey', 'permission', 'resource', ['resource_id'], ['id'],
+        source_schema='auth', referent_schema='auth', ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    op.drop_constraint('permission_resource_id_fkey', 'permission', schema='auth', type_='foreignkey')
+    op.create_foreign_key(
+        'permission_resource_id_fkey', 'permission', 'resource', ['resource_id'], ['id'],
+        source_schema='auth', referent_schema='auth')
+    op.drop_constraint('permission_team_id_fkey', 'permission', schema='auth', type_='foreignkey')
+    op.create_foreign_key(
+        'permission_team_id_fkey', 'permission', 'team', ['team_id'], ['id'],
+        source_schema='auth', referent_schema='auth')
@@ -1,5 +1,12 @@
 import pytest
+import pytest_asyncio
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.main import app
+from core.database.database import async_engine, get_engine_url
 from fastapi.testclient import TestClient
 
 pytest.test_username = "test@test.com"
@@ -11,3 +18,31 @@ pytest.expires_at = 0
 def test_client():
     with TestClient(app) as client:
         yield client
+
+
+@pytest.fixture
+def query_counter():
+    """counts sql statements executed inside the `with` block"""
+    @contextmanager
+    def counter():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+    return counter
+
+
+@pytest_asyncio.fixture
+async def db_session():
+    """session of its own engine, the app pool is bound to the event loop of the test client"""
+    engine = create_async_engine(get_engine_url(), poolclass=NullPool)
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        yield session
+    await engine.dispose()
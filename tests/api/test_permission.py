@@ -1,7 +1,10 @@
 import json
 import pytest
+from app import crud
 from tests.api.test_role import Test as TestRole
 from tests.api.test_resource import Test as TestResource
+from tests.api.test_team import Test as TestTeam
+from tests.api.test_auth import Test as TestAuth
 
 
 @pytest.mark.usefixtures("test_client")
@@ -9,6 +12,8 @@ class Test:
     url = "api/auth/v1/permission"
     role = TestRole()
     resource = TestResource()
+    team = TestTeam()
+    auth = TestAuth()
 
     @pytest.mark.asyncio
     async def test_create(self, test_client):
@@ -54,6 +59,86 @@ class Test:
         )
         assert response.status_code == 200
 
+    @pytest.mark.asyncio
+    async def test_loaded_collections(self, test_client, db_session):
+        headers = {"Authorization": f"Bearer {pytest.test_token}"}
+        # the updated role is read again with its resources
+        data = {"title": self.role.create_object()["title"]}
+        response = test_client.patch(f"api/auth/v1/role/{pytest.test_role_id}", headers=headers, json=data)
+        assert response.status_code == 200
+        assert pytest.test_resource_id in [i["id"] for i in response.json()["data"]["resources"]]
+        roles = {str(i.id): i for i in await crud.role.get_multi(db_session, skip=0, limit=10 ** 6)}
+        assert pytest.test_resource_id in [str(i.id) for i in roles[pytest.test_role_id].resources]
+
+        # the updated team is read again with its users
+        await self.team.test_create(test_client=test_client)
+        user_id = test_client.get("api/auth/v1/user", headers=headers).json()["data"]["id"]
+        test_client.patch(f"api/auth/v1/user/{user_id}/team/{pytest.test_team_id}", headers=headers)
+        try:
+            response = test_client.patch(
+                f"api/auth/v1/team/{pytest.test_team_id}", headers=headers, json=self.team.create_object())
+            assert response.status_code == 200
+            assert [i["email"] for i in response.json()["data"]["users"]] == [
+                test_client.get("api/auth/v1/user", headers=headers).json()["data"]["email"]]
+        finally:
+            test_client.patch(f"api/auth/v1/user/{user_id}/team/{pytest.test_team_id}", headers=headers)
+
+    @pytest.mark.asyncio
+    async def test_team_permission(self, test_client):
+        await self.team.test_create(test_client=test_client)
+        response = test_client.post(
+            self.url,
+            headers={"Authorization": f"Bearer {pytest.test_token}"},
+            data=json.dumps(
+                {
+                    "resource_id": pytest.test_resource_id,
+                    "team_id": pytest.test_team_id,
+                    "title": "test",
+                }
+            ),
+        )
+        assert response.status_code == 200
+        team_permission_id = response.json()["data"]["id"]
+
+        response = test_client.post(
+            self.url,
+            headers={"Authorization": f"Bearer {pytest.test_token}"},
+            data=json.dumps(
+                {
+                    "resource_id": pytest.test_resource_id,
+                    "role_id": pytest.test_role_id,
+                    "team_id": pytest.test_team_id,
+                }
+            ),
+        )
+        assert response.status_code == 422
+
+        # a token whose team holds the permission is allowed, without the team it is denied
+        headers = {"Authorization": f"Bearer {pytest.test_token}"}
+        resource = test_client.get(f"api/auth/v1/resource/{pytest.test_resource_id}", headers=headers).json()["data"]
+        user_id = test_client.get("api/auth/v1/user", headers=headers).json()["data"]["id"]
+        access = []
+        for _ in range(2):
+            # membership is toggled, the teams claim is in a new token
+            response = test_client.patch(f"api/auth/v1/user/{user_id}/team/{pytest.test_team_id}", headers=headers)
+            assert response.status_code == 200
+            await self.auth.test_refresh(test_client)
+            headers = {"Authorization": f"Bearer {pytest.test_token}"}
+            test_client.app.rbac.invalidate()
+            response = test_client.post(
+                "api/auth/v1/rbac/validate", headers=headers,
+                json={"method": resource["method"], "endpoint": resource["endpoint"]})
+            assert response.status_code == 200
+            assert response.json()["data"]["rbac_enable"] is True
+            access.append(response.json()["data"]["access"])
+        assert access == [True, False]
+
+        # the team is deleted while it still holds the permission, the permission goes with it
+        await self.team.test_delete(test_client)
+        response = test_client.get(f"{self.url}/list?page=1&size=100", headers=headers)
+        assert response.status_code == 200
+        assert team_permission_id not in [item["id"] for item in response.json()["data"]["items"]]
+
     def test_delete_permission(self, test_client):
         response = test_client.delete(
             f"{self.url}/{pytest.test_id}",
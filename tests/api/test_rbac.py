@@ -1,5 +1,6 @@
 import json
 import pytest
+from core.settings import settings
 
 
 @pytest.mark.usefixtures("test_client")
@@ -13,6 +14,72 @@ class Test:
             headers={"Authorization": f"Bearer {pytest.test_token}"},
         )
         assert response.status_code == 200
+        etag = response.headers["ETag"]
+        response = test_client.get(self.url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        version = etag.strip(chr(34))
+        response = test_client.get(f"{self.url}?since={version}")
+        assert response.status_code == 200
+        assert response.json()["data"]["changes"] == []
+        # the delta is not validated by the snapshot ETag, nor the snapshot by the delta one
+        assert response.headers["ETag"] == f'"{version}..{version}"'
+        response = test_client.get(f"{self.url}?since={version}", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        response = test_client.get(f"{self.url}?since={version}", headers={"If-None-Match": f'"{version}..{version}"'})
+        assert response.status_code == 304
+        response = test_client.get(self.url, headers={"If-None-Match": f'"{version}..{version}"'})
+        assert response.status_code == 200
+
+    @staticmethod
+    def parse_events(text):
+        events = []
+        for block in text.split("\n\n"):
+            fields = dict(line.split(": ", 1) for line in block.splitlines() if line and not line.startswith(":"))
+            if fields:
+                events.append({**fields, "data": json.loads(fields["data"])})
+        return events
+
+    @pytest.mark.asyncio
+    async def test_changes(self, test_client, monkeypatch):
+        response = test_client.get(f"{self.url}/changes")
+        assert response.status_code == 401
+        # the stream sends what is pending and ends
+        monkeypatch.setattr(settings, "RBAC_CHANGES_STREAM_TIMEOUT", 0)
+        headers = {"Authorization": f"Bearer {pytest.test_token}"}
+        response = test_client.get(f"{self.url}/changes", headers=headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = self.parse_events(response.text)
+        version = test_client.get(self.url).headers["ETag"].strip('"')
+        assert [(i["event"], i["id"]) for i in events] == [("snapshot", version)]
+        assert events[0]["data"]["version"] == version and "resources" in events[0]["data"]["data"]
+
+    @pytest.mark.asyncio
+    async def test_changes_resume(self, test_client, monkeypatch):
+        monkeypatch.setattr(settings, "RBAC_CHANGES_STREAM_TIMEOUT", 0)
+        headers = {"Authorization": f"Bearer {pytest.test_token}"}
+        version = test_client.get(self.url).headers["ETag"].strip('"')
+        response = test_client.post("api/auth/v1/resource", headers=headers, json={
+            "endpoint": "/api/auth/v1/test_changes", "method": "get", "rbac_enable": True})
+        resource_id = response.json()["data"]["id"]
+        try:
+            test_client.app.rbac.invalidate()
+            # a stream resumed from a kept version gets only the changes after it
+            response = test_client.get(f"{self.url}/changes", headers={**headers, "Last-Event-ID": version})
+            events = self.parse_events(response.text)
+            assert [i["event"] for i in events] == ["change"]
+            assert events[0]["data"]["previous"] == version
+            assert events[0]["id"] == events[0]["data"]["version"] != version
+            assert {"section": "resources", "op": "add", "id": resource_id} in [
+                {k: i[k] for k in ("section", "op", "id")} for i in events[0]["data"]["changes"]]
+            # nothing after the current version, an unknown one gets the snapshot again
+            response = test_client.get(f"{self.url}/changes", headers={**headers, "Last-Event-ID": events[0]["id"]})
+            assert self.parse_events(response.text) == []
+            response = test_client.get(f"{self.url}/changes", headers={**headers, "Last-Event-ID": "unknown"})
+            assert [i["event"] for i in self.parse_events(response.text)] == ["snapshot"]
+        finally:
+            test_client.delete(f"api/auth/v1/resource/{resource_id}", headers=headers)
+            test_client.app.rbac.invalidate()
 
     @pytest.mark.asyncio
     async def test_validate(self, test_client):
@@ -23,3 +90,83 @@ class Test:
                 {"method": "get", "endpoint": "/api/auth/v1/test"}),
         )
         assert response.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_validate_batch(self, test_client):
+        response = test_client.post(
+            f"{self.url}/validate/batch",
+            headers={"Authorization": f"Bearer {pytest.test_token}"},
+            data=json.dumps({"requests": [
+                {"method": "get", "endpoint": "/api/auth/v1/test"},
+                {"method": "post", "endpoint": "/api/auth/v1/test"},
+                {"method": "get", "endpoint": "/api/auth/v1/test"},
+            ]}),
+        )
+        assert response.status_code == 200
+        assert len(response.json()["data"]["results"]) == 3
+
+    @pytest.mark.asyncio
+    async def test_validate_batch_limit(self, test_client):
+        response = test_client.post(
+            f"{self.url}/validate/batch",
+            headers={"Authorization": f"Bearer {pytest.test_token}"},
+            data=json.dumps({"requests": [{"method": "get", "endpoint": "/api/auth/v1/test"}] * 1000}),
+        )
+        assert response.status_code == 422
+
+    @pytest.mark.asyncio
+    async def test_get_permissions(self, test_client):
+        response = test_client.get(
+            f"{self.url}/permissions",
+            headers={"Authorization": f"Bearer {pytest.test_token}"},
+        )
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+        response = test_client.get(
+            f"{self.url}/permissions",
+            headers={"Authorization": f"Bearer {pytest.test_token}", "If-None-Match": etag},
+        )
+        assert response.status_code == 304
+
+    @pytest.mark.asyncio
+    async def test_report(self, test_client):
+        response = test_client.get(
+            f"{self.url}/report",
+            headers={"Authorization": f"Bearer {pytest.test_token}"},
+        )
+        assert response.status_code == 200
+        assert response.text.splitlines()[0] == "user_id,email,resource_id,method,endpoint"
+        response = test_client.get(
+            f"{self.url}/report?format=columns",
+            headers={"Authorization": f"Bearer {pytest.test_token}"},
+        )
+        assert response.status_code == 200
+        assert "users" in json.loads(response.text.splitlines()[0])
+
+    @pytest.mark.asyncio
+    async def test_access(self, test_client):
+        response = test_client.get(
+            f"{self.url}/access?method=get&endpoint=/api/auth/v1/test",
+            headers={"Authorization": f"Bearer {pytest.test_token}"},
+        )
+        assert response.status_code == 200
+        assert "users" in response.json()["data"]
+
+    @pytest.mark.asyncio
+    async def test_impact(self, test_client):
+        response = test_client.post(
+            f"{self.url}/impact",
+            headers={"Authorization": f"Bearer {pytest.test_token}"},
+            data=json.dumps({
+                "op": "add",
+                "role_id": "00000000-0000-0000-0000-000000000000",
+                "resource_id": "00000000-0000-0000-0000-000000000000",
+            }),
+        )
+        assert response.status_code == 404
+        response = test_client.post(
+            f"{self.url}/impact",
+            headers={"Authorization": f"Bearer {pytest.test_token}"},
+            data=json.dumps({"op": "add", "role_id": "00000000-0000-0000-0000-000000000000"}),
+        )
+        assert response.status_code == 422
@@ -2,11 +2,14 @@ import json
 import pytest
 import string
 import random
+from core.cache import claims_cache
+from tests.api.test_auth import Test as TestAuth
 
 
 @pytest.mark.usefixtures("test_client")
 class Test:
     url = "api/auth/v1/role"
+    auth = TestAuth()
 
     @classmethod
     def create_object(cls):
@@ -56,6 +59,83 @@ class Test:
         )
         assert response.status_code == 200
 
+    @pytest.mark.asyncio
+    async def test_update_clears_claims(self, test_client, monkeypatch):
+        # role titles are in every claims document holding the role
+        monkeypatch.setattr(claims_cache, "ttl", 300)
+        claims_cache.set("user", {"roles": {pytest.test_role_id: "test_role_updated"}})
+        response = test_client.patch(
+            f"{self.url}/{pytest.test_role_id}",
+            headers={"Authorization": f"Bearer {pytest.test_token}"},
+            data=json.dumps({"title": "test_role_renamed"}),
+        )
+        assert response.status_code == 200
+        assert claims_cache.get("user") is None
+
+    @pytest.mark.asyncio
+    async def test_hierarchy_cycle(self, test_client):
+        data = {**self.create_object(), "parent_id": pytest.test_role_id}
+        response = test_client.post(
+            self.url,
+            json=data,
+            headers={"Authorization": f"Bearer {pytest.test_token}"},
+        )
+        assert response.status_code == 200
+        child_role_id = response.json()["data"]["id"]
+
+        response = test_client.patch(
+            f"{self.url}/{pytest.test_role_id}",
+            headers={"Authorization": f"Bearer {pytest.test_token}"},
+            data=json.dumps({"title": "test_role_updated", "parent_id": child_role_id}),
+        )
+        assert response.status_code == 409
+
+        response = test_client.delete(
+            f"{self.url}/{child_role_id}",
+            headers={"Authorization": f"Bearer {pytest.test_token}"},
+        )
+        assert response.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_hierarchy_permission(self, test_client):
+        headers = {"Authorization": f"Bearer {pytest.test_token}"}
+        endpoint = f"/api/auth/v1/test_hierarchy_{''.join(random.choices(string.ascii_lowercase, k=10))}"
+        parent = test_client.post(self.url, json=self.create_object(), headers=headers).json()["data"]
+        child = test_client.post(
+            self.url, json={**self.create_object(), "parent_id": parent["id"]}, headers=headers).json()["data"]
+        resource_id = test_client.post("api/auth/v1/resource", headers=headers, json={
+            "endpoint": endpoint, "method": "get", "rbac_enable": True}).json()["data"]["id"]
+        # the permission is granted to the parent only, the user holds the child role
+        response = test_client.post("api/auth/v1/permission", headers=headers, json={
+            "resource_id": resource_id, "role_id": parent["id"], "title": "test"})
+        assert response.status_code == 200
+        permission_id = response.json()["data"]["id"]
+        user_id = test_client.get("api/auth/v1/user", headers=headers).json()["data"]["id"]
+        test_client.patch(f"api/auth/v1/user/{user_id}/role/{child['id']}", headers=headers)
+        try:
+            await self.auth.test_refresh(test_client)
+            headers = {"Authorization": f"Bearer {pytest.test_token}"}
+
+            def validate():
+                test_client.app.rbac.invalidate()
+                response = test_client.post(
+                    "api/auth/v1/rbac/validate", headers=headers, json={"method": "get", "endpoint": endpoint})
+                assert response.status_code == 200
+                return response.json()["data"]["access"]
+
+            assert validate() is True
+            response = test_client.patch(
+                f"{self.url}/{child['id']}", headers=headers, json={"title": child["title"], "parent_id": None})
+            assert response.status_code == 200
+            assert validate() is False
+        finally:
+            test_client.patch(f"api/auth/v1/user/{user_id}/role/{child['id']}", headers=headers)
+            test_client.delete(f"api/auth/v1/permission/{permission_id}", headers=headers)
+            test_client.delete(f"api/auth/v1/resource/{resource_id}", headers=headers)
+            for role in (child, parent):
+                test_client.delete(f"{self.url}/{role['id']}", headers=headers)
+            await self.auth.test_refresh(test_client)
+
     @pytest.mark.asyncio
     async def test_delete(self, test_client):
         response = test_client.delete(
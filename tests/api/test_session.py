@@ -1,4 +1,17 @@
 import pytest
+from uuid import uuid4
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from core.settings import settings
+from app.sessions.util import (
+    SessionActivity,
+    get_partition_ddl,
+    get_partition_name,
+    get_partition_bound,
+    get_sessions_partitions,
+    create_sessions_partitions,
+    drop_sessions_partitions,
+)
 from tests.api.test_auth import Test as TestAuth
 
 
@@ -17,6 +30,110 @@ class Test:
         if len(response.json()["data"]) > 0:
             pytest.test_session_id = response.json()["data"]["items"][0]["id"]
 
+    def test_partition_ddl(self):
+        statements = get_partition_ddl("expires_at", datetime(2026, 10, 19), interval_days=7, premake=1)
+        # ranges are aligned to the epoch: 2026-10-15 is 20741 days = 2963 weeks after 1970-01-01
+        assert statements == [
+            "CREATE TABLE IF NOT EXISTS auth.sessions_p20261015 PARTITION OF auth.sessions "
+            "FOR VALUES FROM (1792022400) TO (1792627200)",
+            "CREATE TABLE IF NOT EXISTS auth.sessions_p20261022 PARTITION OF auth.sessions "
+            "FOR VALUES FROM (1792627200) TO (1793232000)",
+        ]
+        statements = get_partition_ddl("created_at", datetime(2026, 10, 19), interval_days=7, premake=0)
+        assert statements[0].endswith("FROM ('2026-10-15 00:00:00') TO ('2026-10-22 00:00:00')")
+
+    @staticmethod
+    async def get_partition_by(db_session):
+        response = await db_session.execute(text(
+            "SELECT pg_get_partkeydef(partrelid) FROM pg_partitioned_table "
+            "WHERE partrelid = 'auth.sessions'::regclass"
+        ))
+        key = response.scalar()
+        if key is None:
+            pytest.skip("auth.sessions is not partitioned")
+        return key.split("(")[1].rstrip(")")
+
+    @staticmethod
+    async def insert_session(db_session, created_at, expires_at):
+        session_id = uuid4()
+        await db_session.execute(text(
+            "INSERT INTO auth.sessions (created_at, id, cookie, access_token, refresh_token, token_type, expires_at) "
+            "VALUES (:created_at, :id, '', '', '', 'bearer', :expires_at)"
+        ), {"created_at": created_at, "id": session_id, "expires_at": expires_at})
+        await db_session.commit()
+        return session_id
+
+    @pytest.mark.asyncio
+    async def test_create_sessions_partitions(self, db_session, monkeypatch):
+        monkeypatch.setattr(settings, "SESSIONS_PARTITION_BY", await self.get_partition_by(db_session))
+        await create_sessions_partitions(db_session)
+        partitions = await get_sessions_partitions(db_session)
+        assert "sessions_default" in partitions
+        for statement in get_partition_ddl(settings.SESSIONS_PARTITION_BY):
+            assert statement.split()[5].removeprefix("auth.") in partitions
+        # idempotent
+        await create_sessions_partitions(db_session)
+        assert sorted(await get_sessions_partitions(db_session)) == sorted(partitions)
+
+    @pytest.mark.asyncio
+    async def test_drop_sessions_partitions(self, db_session, monkeypatch):
+        partition_by = await self.get_partition_by(db_session)
+        monkeypatch.setattr(settings, "SESSIONS_PARTITION_BY", partition_by)
+        interval = timedelta(days=settings.SESSIONS_PARTITION_INTERVAL_DAYS)
+        start = datetime(2000, 1, 1)  # far past the retention period
+        name = get_partition_name(start)
+        bounds = get_partition_bound(start, partition_by), get_partition_bound(start + interval, partition_by)
+        await db_session.execute(text(
+            f"CREATE TABLE auth.{name} PARTITION OF auth.sessions FOR VALUES FROM ({bounds[0]}) TO ({bounds[1]})"
+        ))
+        await db_session.commit()
+        now = int(datetime.now().timestamp())
+        # a session created long ago but still valid keeps the created_at partition
+        if partition_by == "created_at":
+            session_id = await self.insert_session(db_session, start, now + 3600)
+            assert name not in await drop_sessions_partitions(db_session)
+            await db_session.execute(text("DELETE FROM auth.sessions WHERE id = :id"), {"id": session_id})
+            await db_session.commit()
+        await self.insert_session(db_session, start, int((start - datetime(1970, 1, 1)).total_seconds()) + 60)
+        # created and expired before the oldest range: the default partition
+        default_id = await self.insert_session(db_session, datetime(1999, 1, 1), 915148800)
+        valid_id = await self.insert_session(db_session, datetime(1999, 1, 1), now + 3600)
+
+        assert name in await drop_sessions_partitions(db_session)
+        assert name not in await get_sessions_partitions(db_session)
+        response = await db_session.execute(
+            text("SELECT id FROM auth.sessions_default WHERE id IN (:default_id, :valid_id)"),
+            {"default_id": default_id, "valid_id": valid_id},
+        )
+        remaining = [i[0] for i in response.all()]
+        # with expires_at the valid session is in a created range, not in the default partition
+        assert remaining == ([valid_id] if partition_by == "created_at" else [])
+        await db_session.execute(text("DELETE FROM auth.sessions WHERE id = :id"), {"id": valid_id})
+        await db_session.commit()
+
+    @pytest.mark.asyncio
+    async def test_activity_flush(self, db_session, monkeypatch):
+        monkeypatch.setattr(settings, "SESSION_ACTIVITY_FLUSH_INTERVAL", 30)
+        session_id = await self.insert_session(db_session, datetime.utcnow(), int(datetime.now().timestamp()) + 3600)
+        activity = SessionActivity()
+        moment = datetime.utcnow().replace(microsecond=0)
+        # touches of a session are coalesced to the latest one, whatever the order
+        for i in (1, 3, 2):
+            activity.touch(session_id, moment + timedelta(seconds=i))
+        assert activity.buffer == {session_id: moment + timedelta(seconds=3)}
+
+        assert await activity.flush(db_session) == 1
+        assert activity.buffer == {}
+        assert await activity.flush(db_session) == 0
+        # an older touch does not move last_seen_at back
+        activity.touch(session_id, moment)
+        assert await activity.flush(db_session) == 1
+        response = await db_session.execute(
+            text("SELECT last_seen_at FROM auth.sessions WHERE id = :id"), {"id": session_id})
+        assert response.scalar() == moment + timedelta(seconds=3)
+        await db_session.execute(text("DELETE FROM auth.sessions WHERE id = :id"), {"id": session_id})
+        await db_session.commit()
+
     # @pytest.mark.asyncio
     # async def test_delete(self, test_client):
     #     response = test_client.delete(
@@ -2,8 +2,14 @@ import json
 import pytest
 import string
 import random
+import asyncio
+from sqlalchemy import text
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app import crud
+from app.user.schema import IProvision
 from tests.api.test_role import Test as TestRole
 from tests.api.test_team import Test as TestTeam
+from tests.api.test_auth import Test as TestAuth
 
 
 @pytest.mark.usefixtures("test_client")
@@ -11,6 +17,7 @@ class Test:
     url = "/api/auth/v1/user"
     role = TestRole()
     team = TestTeam()
+    auth = TestAuth()
 
     @classmethod
     def create_object(cls):
@@ -22,9 +29,13 @@ class Test:
         }
 
     @pytest.mark.asyncio
-    async def test_get_my_data(self, test_client):
-        response = test_client.get(self.url, headers={"Authorization": f"Bearer {pytest.test_token}"})
+    async def test_get_my_data(self, test_client, query_counter):
+        # session, user, roles and teams in one query, then the detail profile of the user:
+        # user with its visibility group, roles, teams and sessions
+        with query_counter() as statements:
+            response = test_client.get(self.url, headers={"Authorization": f"Bearer {pytest.test_token}"})
         assert response.status_code == 200
+        assert len(statements) == 5
 
     @pytest.mark.asyncio
     async def test_create(self, test_client):
@@ -45,6 +56,101 @@ class Test:
         response = test_client.get(f"{self.url}/{pytest.test_user_id}", headers={"Authorization": f"Bearer {pytest.test_token}"})
         assert response.status_code == 200
 
+    @pytest.mark.asyncio
+    async def test_get_query_count(self, test_client, query_counter):
+        # user with its visibility group + roles, teams and sessions, nothing cascades from them
+        with query_counter() as statements:
+            response = test_client.get(f"{self.url}/{pytest.test_user_id}", headers={"Authorization": f"Bearer {pytest.test_token}"})
+        assert response.status_code == 200
+        assert len(statements) == 4
+
+    @pytest.mark.asyncio
+    async def test_get_list_query_count(self, test_client, query_counter, monkeypatch):
+        # count + page with visibility groups + roles and teams; sessions are not loaded for the list
+        with query_counter() as statements:
+            response = test_client.get(f"{self.url}/list?page=1&size=100", headers={"Authorization": f"Bearer {pytest.test_token}"})
+        assert response.status_code == 200
+        assert len(statements) == 4
+        assert all("sessions" not in i for i in response.json()["data"]["items"])
+
+        # the rbac snapshot is loaded and not refreshed while counting
+        test_client.get(f"{self.url}/list/visible?page=1&size=100", headers={"Authorization": f"Bearer {pytest.test_token}"})
+        monkeypatch.setattr(test_client.app.rbac, "RBAC_UPDATE_DELAY", 10 ** 9)
+        # the principal in addition
+        with query_counter() as statements:
+            response = test_client.get(
+                f"{self.url}/list/visible?page=1&size=100", headers={"Authorization": f"Bearer {pytest.test_token}"})
+        assert response.status_code == 200
+        assert len(statements) == 5
+
+    @pytest.mark.asyncio
+    async def test_get_list_visibility(self, test_client):
+        headers = {"Authorization": f"Bearer {pytest.test_token}"}
+        resources = []
+        for endpoint in ("/api/auth/v1/user/list/visible", "/api/auth/v1/rbac/access"):
+            response = test_client.post("/api/auth/v1/resource", headers=headers, json={
+                "endpoint": endpoint, "method": "get", "rbac_enable": False,
+                "visibility_group_enable": True, "visibility_group_entity": "opportunity"})
+            assert response.status_code == 200
+            resources.append(response.json()["data"]["id"])
+        test_client.app.rbac.invalidate()
+        response = test_client.post("/api/auth/v1/visibility_group", headers=headers, json={
+            "prefix": f"test/{''.join(random.choices(string.ascii_letters + string.digits, k=10))}",
+            "activity": ["user"]})
+        group_id = response.json()["data"]["id"]
+        user_id = test_client.get(self.url, headers=headers).json()["data"]["id"]
+        try:
+            # the list validates the visibility group of the caller, other routes of such resources do not
+            response = test_client.get(f"{self.url}/list/visible?page=1&size=100", headers=headers)
+            assert response.status_code == 409
+            response = test_client.get(
+                "/api/auth/v1/rbac/access?method=get&endpoint=/api/auth/v1/user/list/visible", headers=headers)
+            assert response.status_code == 200
+            # the unscoped list is unchanged
+            response = test_client.get(f"{self.url}/list?page=1&size=100")
+            assert response.status_code == 200
+
+            response = test_client.patch(f"{self.url}/{user_id}/visibility_group/{group_id}", headers=headers)
+            assert response.status_code == 200
+            await self.auth.test_refresh(test_client)
+            test_client.app.visibility_group.invalidate()
+            # the only member of a group sharing its activity between members sees only itself,
+            # whatever entity the resource is configured with
+            response = test_client.get(
+                f"{self.url}/list/visible?page=1&size=100", headers={"Authorization": f"Bearer {pytest.test_token}"})
+            assert response.status_code == 200
+            assert [i["id"] for i in response.json()["data"]["items"]] == [user_id]
+        finally:
+            headers = {"Authorization": f"Bearer {pytest.test_token}"}
+            for resource_id in resources:
+                test_client.delete(f"/api/auth/v1/resource/{resource_id}", headers=headers)
+            test_client.app.rbac.invalidate()
+            test_client.patch(f"{self.url}/{user_id}/visibility_group/{group_id}", headers=headers)
+            test_client.delete(f"/api/auth/v1/visibility_group/{group_id}", headers=headers)
+            await self.auth.test_refresh(test_client)
+
+    @pytest.mark.asyncio
+    async def test_provision(self, db_session):
+        email = self.create_object()["email"]
+        user, claims = await crud.user.provision(db_session, obj_in=IProvision(first_name="first", email=email))
+        assert claims["email"] == user.email == email.lower()
+        # a repeated login of the same email, in any case, returns the same user
+        again, _ = await crud.user.provision(db_session, obj_in=IProvision(first_name="again", email=email.upper()))
+        assert again.id == user.id and again.first_name == "first"
+
+        # concurrent first logins resolve on the conflict target instead of failing
+        email = self.create_object()["email"]
+
+        async def provision():
+            async with AsyncSession(db_session.bind) as session:
+                return await crud.user.provision(session, obj_in=IProvision(first_name="first", email=email))
+
+        users = await asyncio.gather(*(provision() for _ in range(5)))
+        assert len({i.id for i, _ in users}) == 1
+        await db_session.execute(
+            text("DELETE FROM auth.user WHERE id IN (:first, :second)"), {"first": user.id, "second": users[0][0].id})
+        await db_session.commit()
+
     @pytest.mark.asyncio
     async def test_update(self, test_client):
         response = test_client.patch(
@@ -2,11 +2,14 @@ import json
 import random
 import string
 import pytest
+from tests.api.test_auth import Test as TestAuth
+from tests.api.test_user import Test as TestUser
 
 
 @pytest.mark.usefixtures("test_client")
 class Test:
     url = "/api/auth/v1/visibility_group"
+    auth = TestAuth()
 
     @classmethod
     def create_object(cls):
@@ -62,6 +65,70 @@ class Test:
         assert response.status_code == 200
 
     @pytest.mark.asyncio
-    async def test_get_settings(self, test_client):
+    async def test_dictionary(self, test_client):
+        headers = {"Authorization": f"Bearer {pytest.test_token}"}
+        # the test user has no visibility group and sees nobody
+        response = test_client.get(f"{self.url}/dictionary", headers=headers)
+        assert response.status_code == 409
+        response = test_client.get(f"{self.url}/dictionary")
+        assert response.status_code == 401
+
+        response = test_client.post(self.url, headers=headers, json=self.create_object())
+        group_id = response.json()["data"]["id"]
+        user_id = test_client.get("/api/auth/v1/user", headers=headers).json()["data"]["id"]
+        # created before the dictionary is fetched, its dense id is below the version
+        response = test_client.post("/api/auth/v1/user", headers=headers, json=TestUser.create_object())
+        other_user_id = response.json()["data"]["id"]
+        response = test_client.patch(f"/api/auth/v1/user/{user_id}/visibility_group/{group_id}", headers=headers)
+        assert response.status_code == 200
+        try:
+            # the group prefix is in the claims of a new token
+            await self.auth.test_refresh(test_client)
+            headers = {"Authorization": f"Bearer {pytest.test_token}"}
+            test_client.app.visibility_group.invalidate()
+            response = test_client.get(f"{self.url}/dictionary", headers=headers)
+            assert response.status_code == 200
+            # the only member of a group sharing its users with each other
+            dictionary = response.json()["data"]
+            assert [i["id"] for i in dictionary["users"]] == [user_id] and dictionary["full"] is True
+            query = f"since={dictionary['version']}&digest={dictionary['digest']}"
+
+            # nothing changed, the tail is empty
+            response = test_client.get(f"{self.url}/dictionary?{query}", headers=headers)
+            assert response.status_code == 200
+            assert response.json()["data"]["users"] == [] and response.json()["data"]["full"] is False
+
+            # a user below the version becomes visible, the whole dictionary is returned
+            response = test_client.patch(
+                f"/api/auth/v1/user/{other_user_id}/visibility_group/{group_id}", headers=headers)
+            assert response.status_code == 200
+            test_client.app.visibility_group.invalidate()
+            response = test_client.get(f"{self.url}/dictionary?{query}", headers=headers)
+            assert response.status_code == 200
+            assert response.json()["data"]["full"] is True
+            assert {i["id"] for i in response.json()["data"]["users"]} == {user_id, other_user_id}
+        finally:
+            headers = {"Authorization": f"Bearer {pytest.test_token}"}
+            test_client.patch(f"/api/auth/v1/user/{user_id}/visibility_group/{group_id}", headers=headers)
+            test_client.delete(f"/api/auth/v1/user/{other_user_id}", headers=headers)
+            test_client.delete(f"{self.url}/{group_id}", headers=headers)
+            await self.auth.test_refresh(test_client)
+
+    @pytest.mark.asyncio
+    async def test_get_settings(self, test_client, monkeypatch):
         response = test_client.get(f"{self.url}/settings", headers={"Authorization": f"Bearer {pytest.test_token}"})
         assert response.status_code == 200
+        # the snapshot is not refreshed in between, the version stays the same
+        monkeypatch.setattr(test_client.app.visibility_group, "VISIBILITY_UPDATE_DELAY", 10 ** 9)
+        etag = response.headers["ETag"]
+        response = test_client.get(f"{self.url}/settings", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        version = etag.strip('"')
+        response = test_client.get(f"{self.url}/settings?since={version}", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        # a delta has its own ETag
+        assert response.json() == {"version": version, "since": version, "groups": {}}
+        assert response.headers["ETag"] == f'"{version}..{version}"'
+        response = test_client.get(
+            f"{self.url}/settings?since={version}", headers={"If-None-Match": f'"{version}..{version}"'})
+        assert response.status_code == 304
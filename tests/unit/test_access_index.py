@@ -0,0 +1,146 @@
+import itertools
+import pytest
+import pytest_asyncio
+from datetime import datetime
+from uuid import uuid4
+from app.rbac import access
+from app.rbac.access import AccessIndex
+from app.rbac.util import RBAC
+from app.rbac.schema import IRBACImpact, IRBACValidate
+
+ROLES = {name: str(uuid4()) for name in ("root", "child", "grandchild", "other")}
+TEAMS = {name: str(uuid4()) for name in ("sales", "support")}
+# resource -> rbac_enable
+RESOURCES = {
+    "root": True, "child": True, "grandchild": True, "other": True, "team": True, "shared": True, "nobody": True,
+    "open": False,
+}
+RESOURCE_IDS = {name: str(uuid4()) for name in RESOURCES}
+# (principal, resource)
+GRANTS = [
+    ("root", "root"), ("child", "child"), ("grandchild", "grandchild"), ("other", "other"),
+    ("sales", "team"), ("support", "shared"), ("grandchild", "shared"), ("other", "open"),
+]
+
+
+def get_principal(name: str) -> str:
+    return ROLES.get(name) or TEAMS[name]
+
+
+def get_permission(principal: str, resource_id: str) -> dict:
+    is_role = principal in ROLES.values()
+    return {"role_id": principal if is_role else None, "team_id": None if is_role else principal,
+            "resource_id": resource_id}
+
+
+def get_data(permissions: list) -> dict:
+    return {
+        "roles": {i: name for name, i in ROLES.items()},
+        # root <- child <- grandchild, a role inherits the permissions of its ancestors
+        "hierarchy": {
+            ROLES["root"]: None, ROLES["child"]: ROLES["root"], ROLES["grandchild"]: ROLES["child"],
+            ROLES["other"]: None},
+        "teams": {i: name for name, i in TEAMS.items()},
+        "resources": {
+            RESOURCE_IDS[name]: {"endpoint": f"/api/test/v1/{name}", "method": "get", "rbac_enable": enable,
+                                 "visibility_group_enable": False, "visibility_group_entity": None}
+            for name, enable in RESOURCES.items()
+        },
+        "permissions": {str(uuid4()): i for i in permissions},
+    }
+
+
+def get_rbac(permissions: list) -> RBAC:
+    rbac = RBAC()
+    rbac.load(get_data(permissions))
+    # the loaded snapshot is used as is, no database
+    rbac.RBAC_UPDATE_DELAY = 10 ** 9
+    rbac.rbac_update_timestamp = int(datetime.now().timestamp())
+    return rbac
+
+
+def get_access(rbac: RBAC, principals) -> set:
+    return {i for i in RESOURCE_IDS.values() if rbac.decide_resource(i, set(principals))["access"]}
+
+
+PERMISSIONS = [get_permission(get_principal(principal), RESOURCE_IDS[resource]) for principal, resource in GRANTS]
+# every combination of the roles and teams, and a user without any
+USERS = [
+    (str(uuid4()), f"{'-'.join(combination) or 'none'}@example.com", [get_principal(i) for i in combination])
+    for size in range(len(ROLES) + len(TEAMS) + 1)
+    for combination in itertools.combinations([*ROLES, *TEAMS], size)
+]
+
+
+@pytest_asyncio.fixture
+async def index(monkeypatch):
+    # memberships of the database
+    async def get_report_users(db_session):
+        return USERS
+
+    monkeypatch.setattr(access, "get_report_users", get_report_users)
+    index = AccessIndex(get_rbac(PERMISSIONS))
+    await index.get(None)
+    return index
+
+
+def get_ids(users: list) -> set:
+    return {i["id"] for i in users}
+
+
+def get_change(principal: str, **kwargs) -> IRBACImpact:
+    key = "role_id" if principal in ROLES.values() else "team_id"
+    return IRBACImpact(**{key: principal}, **kwargs)
+
+
+class Test:
+    @pytest.mark.asyncio
+    async def test_who_can_access(self, index):
+        for name, resource_id in RESOURCE_IDS.items():
+            response = index.who_can_access(IRBACValidate(method="get", endpoint=f"/api/test/v1/{name}"))
+            assert response["resource_id"] == resource_id
+            if not RESOURCES[name]:
+                assert response["everyone"] is True
+                continue
+            allowed = {
+                i for i in [*ROLES.values(), *TEAMS.values()] if index.rbac.decide_resource(resource_id, {i})["access"]}
+            assert set(response["roles"]) | set(response["teams"]) == allowed
+            expected = {i[0] for i in USERS if index.rbac.decide_resource(resource_id, set(i[2]))["access"]}
+            assert get_ids(response["users"]) == expected
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("op", ["add", "remove"])
+    async def test_permission_impact(self, index, op):
+        for principal, resource_id in itertools.product([*ROLES.values(), *TEAMS.values()], RESOURCE_IDS.values()):
+            permission = get_permission(principal, resource_id)
+            if op == "add":
+                permissions = PERMISSIONS + ([] if permission in PERMISSIONS else [permission])
+            else:
+                permissions = [i for i in PERMISSIONS if i != permission]
+            changed = get_rbac(permissions)
+            expected = {}
+            for user_id, _, principals in USERS:
+                before = index.rbac.decide_resource(resource_id, set(principals))["access"]
+                after = changed.decide_resource(resource_id, set(principals))["access"]
+                if before != after:
+                    expected.setdefault("gained" if after else "lost", set()).add(user_id)
+
+            response = index.get_impact(get_change(principal, op=op, resource_id=resource_id))
+            actual = {
+                key: get_ids(i[key]) for i in response["resources"] for key in ("gained", "lost") if i[key]}
+            assert actual == expected
+            assert all(i["resource_id"] == resource_id for i in response["resources"])
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("op", ["add", "remove"])
+    async def test_assignment_impact(self, index, op):
+        for (user_id, _, principals), principal in itertools.product(USERS, [*ROLES.values(), *TEAMS.values()]):
+            after = set(principals) | {principal} if op == "add" else set(principals) - {principal}
+            access_before, access_after = get_access(index.rbac, principals), get_access(index.rbac, after)
+
+            response = index.get_impact(get_change(principal, op=op, user_id=user_id))
+            gained = {i["resource_id"] for i in response["resources"] if get_ids(i["gained"]) == {user_id}}
+            lost = {i["resource_id"] for i in response["resources"] if get_ids(i["lost"]) == {user_id}}
+            assert gained == access_after - access_before
+            assert lost == access_before - access_after
+            assert len(response["resources"]) == len(gained) + len(lost)
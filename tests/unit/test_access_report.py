@@ -0,0 +1,86 @@
+import json
+import base64
+import itertools
+import numpy as np
+import pytest
+from uuid import uuid4
+from app.rbac.util import RBAC
+from app.rbac.report import AccessReport
+
+ROLES = {name: str(uuid4()) for name in ("root", "child", "grandchild", "other")}
+TEAMS = {name: str(uuid4()) for name in ("sales", "support")}
+# resource -> rbac_enable, resources without rbac are open to everyone, granted or not
+RESOURCES = {
+    "root": True, "child": True, "grandchild": True, "other": True, "team": True, "shared": True, "nobody": True,
+    "open": False, "open-granted": False,
+}
+# (principal, resource)
+GRANTS = [
+    ("root", "root"), ("child", "child"), ("grandchild", "grandchild"), ("other", "other"),
+    ("sales", "team"), ("support", "shared"), ("grandchild", "shared"), ("other", "open-granted"),
+]
+
+
+def get_principal(name: str) -> str:
+    return ROLES.get(name) or TEAMS[name]
+
+
+@pytest.fixture
+def rbac():
+    resource_ids = {name: str(uuid4()) for name in RESOURCES}
+    rbac = RBAC()
+    rbac.load({
+        "roles": {i: name for name, i in ROLES.items()},
+        # root <- child <- grandchild, a role inherits the permissions of its ancestors
+        "hierarchy": {
+            ROLES["root"]: None, ROLES["child"]: ROLES["root"], ROLES["grandchild"]: ROLES["child"],
+            ROLES["other"]: None},
+        "teams": {i: name for name, i in TEAMS.items()},
+        "resources": {
+            resource_ids[name]: {"endpoint": f"/api/test/v1/{name}", "method": "get", "rbac_enable": enable,
+                                 "visibility_group_enable": False, "visibility_group_entity": None}
+            for name, enable in RESOURCES.items()
+        },
+        "permissions": {
+            str(uuid4()): {
+                "role_id": ROLES.get(principal), "team_id": TEAMS.get(principal), "resource_id": resource_ids[resource]}
+            for principal, resource in GRANTS
+        },
+    })
+    return rbac
+
+
+class Test:
+    @staticmethod
+    def get_users():
+        # every combination of the roles and teams, and a role not granted anything
+        names = [*ROLES, *TEAMS]
+        users = []
+        for size in range(len(names) + 1):
+            for combination in itertools.combinations(names, size):
+                principals = [get_principal(i) for i in combination]
+                users.append((str(uuid4()), f"{'-'.join(combination)}@example.com", principals))
+        users.append((str(uuid4()), "unknown@example.com", [str(uuid4())]))
+        return users
+
+    def test_decide_resource(self, rbac):
+        users = self.get_users()
+        report = AccessReport(rbac, users)
+        report.build()
+        for i, (_, _, principals) in enumerate(users):
+            allowed = {report.resource_ids[j] for j in report.get_allowed(i)}
+            expected = {
+                resource_id for resource_id in report.resource_ids
+                if rbac.decide_resource(resource_id, set(principals))["access"]}
+            assert allowed == expected
+
+    def test_columns(self, rbac):
+        users = self.get_users()
+        report = AccessReport(rbac, users)
+        lines = [json.loads(i) for i in "".join(report.iter_columns()).splitlines()]
+        assert [tuple(i) for i in lines[0]["users"]] == [(i[0], i[1]) for i in users]
+        for line in lines[1:]:
+            column = np.unpackbits(np.frombuffer(base64.b64decode(line["users"]), dtype=np.uint8), count=len(users))
+            expected = [rbac.decide_resource(line["resource_id"], set(i[2]))["access"] for i in users]
+            assert column.astype(bool).tolist() == expected
+            assert line["count"] == sum(expected)
@@ -0,0 +1,89 @@
+import struct
+import pytest
+from datetime import timedelta
+from types import SimpleNamespace
+from uuid import uuid4
+from app.rbac.util import RBAC
+from app.rbac.bundle import RBACBundle, dump_bundle, load_bundle, write_bundle
+from app.authoriser import main as authoriser
+from app.authoriser import util as authoriser_util
+from core.security import create_jwt_token
+
+ROLE_ID, RESOURCE_ID, OPEN_RESOURCE_ID = str(uuid4()), str(uuid4()), str(uuid4())
+DATA = {
+    "roles": {ROLE_ID: "reader"},
+    "hierarchy": {ROLE_ID: None},
+    "teams": {},
+    "resources": {
+        RESOURCE_ID: {"endpoint": "/api/test/v1/item/$uuid$", "method": "get", "rbac_enable": True,
+                      "visibility_group_enable": False, "visibility_group_entity": None},
+        OPEN_RESOURCE_ID: {"endpoint": "/api/test/v1/health", "method": "get", "rbac_enable": False,
+                           "visibility_group_enable": False, "visibility_group_entity": None},
+    },
+    "permissions": {str(uuid4()): {"role_id": ROLE_ID, "team_id": None, "resource_id": RESOURCE_ID}},
+}
+
+
+def get_body_offset(bundle: bytes) -> int:
+    (header_length,) = struct.unpack_from(">I", bundle, 8)
+    return 8 + 4 + header_length + 4
+
+
+@pytest.fixture
+def rbac():
+    rbac = RBAC()
+    rbac.load(DATA)
+    return rbac
+
+
+class Test:
+    def test_round_trip(self, rbac):
+        visibility = {"sales": {"prefix": "sales", "user": []}}
+        header, body = load_bundle(dump_bundle(rbac, visibility))
+        assert header["version"] == rbac.version and header["visibility"] is True
+        assert body == {"rbac": DATA, "visibility": visibility}
+        loaded = RBAC()
+        loaded.load(body["rbac"])
+        assert loaded.version == rbac.version
+
+    def test_tampered(self, rbac):
+        bundle = bytearray(dump_bundle(rbac))
+        # a byte of the body, then a byte of the signature
+        for position in (get_body_offset(bytes(bundle)) + 1, len(bundle) - 1):
+            tampered = bytearray(bundle)
+            tampered[position] ^= 1
+            with pytest.raises(ValueError, match="signature"):
+                load_bundle(bytes(tampered))
+
+    def test_truncated(self, rbac):
+        bundle = dump_bundle(rbac)
+        with pytest.raises(ValueError, match="format"):
+            load_bundle(bundle[:4])
+        for length in (12, 40, get_body_offset(bundle) + 1):
+            with pytest.raises(ValueError, match="Truncated"):
+                load_bundle(bundle[:length])
+        with pytest.raises(ValueError, match="signature"):
+            load_bundle(bundle[:-1])
+
+    def test_authorise_stateless(self, rbac, tmp_path, monkeypatch):
+        path = str(tmp_path / "rbac.bundle")
+        write_bundle(path, dump_bundle(rbac))
+        monkeypatch.setattr(authoriser_util, "bundle", RBACBundle(path))
+        user_id = str(uuid4())
+
+        def authorise(roles, resource, token=None):
+            if token is None:
+                claims = {"user_id": user_id, "email": "user@example.com", "roles": roles, "teams": [],
+                          "visibility_group": None}
+                token, _ = create_jwt_token(claims, timedelta(minutes=5), "access")
+            payload = SimpleNamespace(
+                headers={"Authorization": f"Bearer {token}"}, resource=resource, httpMethod="GET")
+            return authoriser.authorise_stateless(payload)
+
+        principal_id, context, is_authorized = authorise({ROLE_ID: "reader"}, f"/api/test/v1/item/{uuid4()}")
+        assert (principal_id, is_authorized) == (user_id, True)
+        assert context["user_id"] == user_id
+        # the token is valid, the rules deny
+        assert authorise({}, f"/api/test/v1/item/{uuid4()}")[2] is False
+        assert authorise({}, "/api/test/v1/health")[2] is True
+        assert authorise({ROLE_ID: "reader"}, "/api/test/v1/item", token="invalid") == ("none", None, False)
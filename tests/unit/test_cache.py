@@ -0,0 +1,66 @@
+import pytest
+from core import cache
+from core.cache import TTLCache, get_claims_cache_ttl
+
+
+class Test:
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+        return now
+
+    def test_disabled(self):
+        ttl_cache = TTLCache(ttl=0)
+        ttl_cache.set("key", "value", tags=["tag"])
+        assert ttl_cache.get("key") is None
+        assert ttl_cache.data == {} and ttl_cache.tags == {}
+
+    def test_expiry(self, clock):
+        ttl_cache = TTLCache(ttl=10)
+        ttl_cache.set("key", "value", tags=["user"])
+        clock[0] += 5
+        assert ttl_cache.get("key") == "value"
+        clock[0] += 10
+        assert ttl_cache.get("key") is None
+        # the expired key is gone from its tags as well
+        assert ttl_cache.data == {} and ttl_cache.tags == {} and ttl_cache.key_tags == {}
+
+    def test_eviction(self):
+        ttl_cache = TTLCache(ttl=None, maxsize=2)
+        ttl_cache.set("a", 1, tags=["user-1"])
+        ttl_cache.set("b", 2, tags=["user-1", "user-2"])
+        ttl_cache.set("c", 3, tags=["user-2"])
+        # the oldest entry is evicted together with its tag references
+        assert list(ttl_cache.data) == ["b", "c"]
+        assert ttl_cache.tags == {"user-1": {"b"}, "user-2": {"b", "c"}}
+        # a replaced entry becomes the newest one and keeps only the new tags
+        ttl_cache.set("b", 4, tags=["user-3"])
+        ttl_cache.set("d", 5)
+        assert list(ttl_cache.data) == ["b", "d"]
+        assert ttl_cache.tags == {"user-3": {"b"}}
+        assert ttl_cache.key_tags == {"b": {"user-3"}}
+
+    def test_invalidate_tag(self):
+        ttl_cache = TTLCache(ttl=None)
+        ttl_cache.set("a", 1, tags=["user-1"])
+        ttl_cache.set("b", 2, tags=["user-1", "user-2"])
+        ttl_cache.set("c", 3, tags=["user-2"])
+        ttl_cache.invalidate_tag("user-1")
+        assert list(ttl_cache.data) == ["c"]
+        assert ttl_cache.tags == {"user-2": {"c"}}
+        ttl_cache.invalidate_tag("user-1")
+        ttl_cache.invalidate("c")
+        assert ttl_cache.data == {} and ttl_cache.tags == {} and ttl_cache.key_tags == {}
+
+    def test_claims_cache_ttl(self, monkeypatch):
+        monkeypatch.setattr(cache.settings, "CLAIMS_CACHE_TTL", None)
+        # without change notifications other processes would keep stale claims
+        monkeypatch.setattr(cache.settings, "CHANGES_LISTEN", False)
+        assert get_claims_cache_ttl() == 0
+        monkeypatch.setattr(cache.settings, "CHANGES_LISTEN", True)
+        assert get_claims_cache_ttl() == 300
+        monkeypatch.setattr(cache.settings, "CLAIMS_CACHE_TTL", 60)
+        assert get_claims_cache_ttl() == 60
+        monkeypatch.setattr(cache.settings, "CHANGES_LISTEN", False)
+        assert get_claims_cache_ttl() == 60
@@ -0,0 +1,40 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from app.common import changes
+from app.common.changes import ChangeListener
+from core.cache import TTLCache
+
+
+class Test:
+    @pytest.fixture
+    def listener(self, monkeypatch):
+        monkeypatch.setattr(changes, "principal_cache", TTLCache(ttl=None))
+        app = SimpleNamespace(
+            rbac=SimpleNamespace(RBAC_UPDATE_DELAY=1, shared=None),
+            visibility_group=SimpleNamespace(VISIBILITY_UPDATE_DELAY=1, shared=None),
+        )
+        return ChangeListener(app)
+
+    def test_sessions(self, listener):
+        changes.principal_cache.set("digest", "principal", tags=["user"])
+        changes.principal_cache.set("other", "principal", tags=["user"])
+        listener.on_notification(None, 0, changes.CHANNEL, '{"table": "sessions", "id": "digest"}')
+        assert changes.principal_cache.get("digest") is None
+        assert changes.principal_cache.get("other") == "principal"
+
+    @pytest.mark.asyncio
+    async def test_stop(self, listener):
+        closed = asyncio.Event()
+
+        async def run():
+            try:
+                await asyncio.sleep(3600)
+            finally:
+                closed.set()
+
+        listener.task = asyncio.create_task(run())
+        await asyncio.sleep(0)
+        # the task has finished its cleanup when stop returns
+        await listener.stop()
+        assert closed.is_set() and listener.task is None
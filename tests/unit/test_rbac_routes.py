@@ -0,0 +1,80 @@
+import pytest
+from datetime import datetime
+from uuid import uuid4
+from app.rbac.util import RBAC
+from app.rbac.schema import IRBACValidate
+
+UUID = str(uuid4())
+# resources in snapshot order, the first matching one decides
+RESOURCES = {
+    "role-admin": "/api/auth/v1/role/admin",
+    "role": "/api/auth/v1/role/$uuid$",
+    "team-uuid": "/api/auth/v1/team/[0-9a-f-]{36}",
+    "team": "/api/auth/v1/team/$str$",
+    "permission-one": "/api/auth/v1/permission/1.*",
+    "permission": "/api/auth/v1/permission/$uuid$",
+    "file": "/api/auth/v1/file/$str$",
+    "file-nested": "/api/auth/v1/file/public/.*",
+    "resource": "/api/auth/v1/resource/$uuid$",
+    "list": "/api/auth/v1/user/list",
+}
+ROUTES = [
+    ("GET", "/api/auth/v1/role/{role_id}"),
+    ("GET", "/api/auth/v1/team/{team_id}"),
+    ("GET", "/api/auth/v1/permission/{permission_id}"),
+    ("GET", "/api/auth/v1/file/{file_path:path}"),
+    ("GET", "/api/auth/v1/resource/{resource_id}"),
+    ("GET", "/api/auth/v1/user/list"),
+]
+
+
+@pytest.fixture
+def rbac():
+    rbac = RBAC()
+    rbac.set_routes(ROUTES)
+    rbac.load({
+        "roles": {}, "hierarchy": {}, "teams": {}, "permissions": {},
+        "resources": {
+            resource_id: {"endpoint": endpoint, "method": "get", "rbac_enable": True,
+                          "visibility_group_enable": False, "visibility_group_entity": None}
+            for resource_id, endpoint in RESOURCES.items()
+        },
+    })
+    # the loaded snapshot is used as is, no database
+    rbac.RBAC_UPDATE_DELAY = 10 ** 9
+    rbac.rbac_update_timestamp = int(datetime.now().timestamp())
+    return rbac
+
+
+class Test:
+    def test_map_routes(self, rbac):
+        # the samples and the other resources agree on one resource only for these routes
+        assert rbac.route_resources == {
+            ("get", "/api/auth/v1/resource/{resource_id}"): "resource",
+            ("get", "/api/auth/v1/user/list"): "list",
+        }
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("path, url, resource_id", [
+        # a literal resource shadowing the parameter one
+        ("/api/auth/v1/role/{role_id}", "/api/auth/v1/role/admin", "role-admin"),
+        ("/api/auth/v1/role/{role_id}", f"/api/auth/v1/role/{UUID}", "role"),
+        # regex resources
+        ("/api/auth/v1/team/{team_id}", f"/api/auth/v1/team/{UUID}", "team-uuid"),
+        ("/api/auth/v1/team/{team_id}", "/api/auth/v1/team/sample", "team"),
+        ("/api/auth/v1/permission/{permission_id}", "/api/auth/v1/permission/123", "permission-one"),
+        ("/api/auth/v1/permission/{permission_id}", f"/api/auth/v1/permission/{UUID}", "permission"),
+        # multi-segment parameters
+        ("/api/auth/v1/file/{file_path:path}", "/api/auth/v1/file/report.pdf", "file"),
+        ("/api/auth/v1/file/{file_path:path}", "/api/auth/v1/file/public/a/b.pdf", "file-nested"),
+        ("/api/auth/v1/file/{file_path:path}", "/api/auth/v1/file/private/a.pdf", None),
+        # mapped routes
+        ("/api/auth/v1/resource/{resource_id}", f"/api/auth/v1/resource/{UUID}", "resource"),
+        ("/api/auth/v1/user/list", "/api/auth/v1/user/list", "list"),
+    ])
+    async def test_validate_route(self, rbac, path, url, resource_id):
+        payload = {"roles": {}, "teams": []}
+        by_route = await rbac.validate_route(None, "GET", path, f"http://testserver{url}", payload=payload)
+        by_url = await rbac.validate(None, IRBACValidate(method="get", endpoint=url), payload=payload)
+        assert by_route == by_url
+        assert by_route.get("resource_id") == resource_id
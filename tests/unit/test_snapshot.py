@@ -0,0 +1,46 @@
+import os
+from core.snapshot import SharedSnapshot
+
+
+class Test:
+    @staticmethod
+    def publish(tmp_path):
+        directory = tmp_path / "snapshot"
+        directory.mkdir(mode=0o700)
+        writer, reader = SharedSnapshot("rbac", str(directory)), SharedSnapshot("rbac", str(directory))
+        writer.publish("v1", {"roles": {}})
+        return directory, reader
+
+    def test_read(self, tmp_path):
+        _, reader = self.publish(tmp_path)
+        assert reader.read() == ("v1", {"roles": {}})
+        # the same version is not loaded twice
+        assert reader.read() is None and reader.refused is None
+
+    def test_writable_directory(self, tmp_path):
+        directory, reader = self.publish(tmp_path)
+        directory.chmod(0o777)
+        assert reader.read() is None
+        assert reader.refused is not None
+        directory.chmod(0o700)
+        assert reader.read() == ("v1", {"roles": {}})
+        assert reader.refused is None
+
+    def test_writable_file(self, tmp_path):
+        _, reader = self.publish(tmp_path)
+        os.chmod(reader.path, 0o666)
+        assert reader.read() is None
+        assert reader.refused is not None
+
+    def test_symlink(self, tmp_path):
+        directory, reader = self.publish(tmp_path)
+        os.rename(reader.path, directory / "other")
+        os.symlink(directory / "other", reader.path)
+        assert reader.read() is None
+        assert reader.refused is not None
+
+    def test_owner(self, tmp_path, monkeypatch):
+        _, reader = self.publish(tmp_path)
+        monkeypatch.setattr(os, "getuid", lambda: os.stat(reader.path).st_uid + 1)
+        assert reader.read() is None
+        assert "owned by" in reader.refused
@@ -0,0 +1,19 @@
+from uuid import uuid4
+from sqlalchemy.dialects import postgresql
+from app import crud
+from app.role.model import Role
+from app.user.model import User
+
+
+class Test:
+    def test_visibility_filter(self):
+        ids = [uuid4() for _ in range(3)]
+        clause = crud.user.get_visibility_filter(ids)
+        # users are scoped by their own id, the whole set is one array parameter
+        assert clause.left.compare(User.__table__.c.id)
+        compiled = clause.compile(dialect=postgresql.dialect())
+        assert "= ANY (%(visible_user_ids_" in str(compiled)
+        assert list(compiled.params.values()) == [ids]
+
+    def test_visibility_column(self):
+        assert crud.role.get_visibility_filter([]).left.compare(Role.__table__.c.created_by)
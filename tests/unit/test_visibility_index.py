@@ -0,0 +1,124 @@
+import random
+import pytest
+from uuid import uuid4
+from core.constants import VISIBILITY_GROUP_ENTITY_POSSIBLE_VALUES, VISIBILITY_GROUP_ENTITY_SETTINGS
+from app.visibility_group.schema import IVisibilityGroupSettings
+from app.visibility_group.util import VisibilityIndex
+
+
+def make_group(rnd, prefix, users):
+    return IVisibilityGroupSettings(
+        id=uuid4(),
+        admin=users[0]["id"] if users and rnd.random() < 0.5 else None,
+        prefix=prefix,
+        user=users,
+        **{
+            entity: rnd.sample(VISIBILITY_GROUP_ENTITY_SETTINGS, rnd.randint(0, 3))
+            for entity in VISIBILITY_GROUP_ENTITY_POSSIBLE_VALUES
+        },
+    )
+
+
+class Test:
+    @staticmethod
+    def assert_same(index, visibility):
+        full = VisibilityIndex({prefix: group.copy(deep=True) for prefix, group in visibility.items()})
+        assert index.nodes == full.nodes
+        for entity in VISIBILITY_GROUP_ENTITY_POSSIBLE_VALUES:
+            assert index.up[entity] == full.up[entity]
+            assert index.down[entity] == full.down[entity]
+        assert index.entries == full.entries
+        for key in full.entries:
+            assert index.get_users(key) == full.get_users(key)
+
+    def test_stale_ancestors(self):
+        rnd = random.Random(0)
+        users = [{"id": uuid4(), "email": f"user{i}@example.com", "dense_id": i} for i in (1, 2)]
+        visibility = {
+            "a": make_group(rnd, "a", users),
+            "b": make_group(rnd, "b", []),
+            "a/x/y": make_group(rnd, "a/x/y", []),
+            "a/b/c/d": make_group(rnd, "a/b/c/d", []),
+        }
+        visibility["a"].activity = ["child"]
+        visibility["a/x/y"].activity = []
+        index = VisibilityIndex({prefix: group.copy(deep=True) for prefix, group in visibility.items()})
+        assert index.get_users(("a/x/y", "activity", False)) == users
+
+        # a/x/y is deleted together with the empty a/x, then a stops sharing its users with children
+        group, removed = index.pop("a/x/y")
+        assert group.prefix == "a/x/y" and removed == ["a/x/y", "a/x"]
+        del visibility["a/x/y"]
+        index.refresh({"a/x/y"})
+        index.pop("a")
+        visibility["a"].activity = []
+        index.put(visibility["a"].copy(deep=True))
+        index.refresh({"a"})
+        # added again, a/x/y does not inherit what a used to share
+        visibility["a/x/y"] = make_group(rnd, "a/x/y", [])
+        visibility["a/x/y"].activity = []
+        index.put(visibility["a/x/y"].copy(deep=True))
+        index.refresh({"a/x/y"})
+        assert index.get_users(("a/x/y", "activity", False)) == []
+        self.assert_same(index, visibility)
+
+    @pytest.mark.parametrize("seed", range(20))
+    def test_incremental_update(self, seed):
+        """
+        groups added, moved and deleted and users moved between them one change at a time,
+        as `VisibilityGroup.update` applies the changelog, give the index built from the resulting snapshot
+        """
+        rnd = random.Random(seed)
+        names = ["a", "b", "c"]
+        prefixes = ["/".join(rnd.choice(names) for _ in range(rnd.randint(1, 4))) for _ in range(40)]
+        dense_ids = iter(range(1, 10 ** 6))
+        visibility = {}
+        for prefix in rnd.sample(prefixes, 10):
+            users = [{"id": uuid4(), "email": f"{prefix}@example.com", "dense_id": next(dense_ids)}
+                     for _ in range(rnd.randint(0, 3))]
+            visibility[prefix] = make_group(rnd, prefix, users)
+        index = VisibilityIndex({prefix: group.copy(deep=True) for prefix, group in visibility.items()})
+
+        for _ in range(200):
+            operation = rnd.choice(["add", "move", "delete", "settings", "user"])
+            changed = set()
+            if operation == "add" or not visibility:
+                prefix = rnd.choice([i for i in prefixes if i not in visibility] or prefixes)
+                if prefix in visibility:
+                    continue
+                users = [{"id": uuid4(), "email": f"{prefix}@example.com", "dense_id": next(dense_ids)}
+                         for _ in range(rnd.randint(0, 3))]
+                visibility[prefix] = make_group(rnd, prefix, users)
+                index.put(visibility[prefix].copy(deep=True))
+                changed.add(prefix)
+            elif operation == "move":
+                prefix = rnd.choice(list(visibility))
+                target = rnd.choice([i for i in prefixes if i not in visibility] or [prefix])
+                group = visibility.pop(prefix)
+                group.prefix = target
+                visibility[target] = group
+                current, _ = index.pop(prefix)
+                index.put(group.copy(deep=True, update={"user": current.user}))
+                changed |= {prefix, target}
+            elif operation == "delete":
+                prefix = rnd.choice(list(visibility))
+                del visibility[prefix]
+                index.pop(prefix)
+                changed.add(prefix)
+            elif operation == "settings":
+                prefix = rnd.choice(list(visibility))
+                current, _ = index.pop(prefix)
+                visibility[prefix] = make_group(rnd, prefix, current.user)
+                index.put(visibility[prefix].copy(deep=True))
+                changed.add(prefix)
+            else:
+                source, target = rnd.choice(list(visibility)), rnd.choice(list(visibility))
+                if not visibility[source].user:
+                    continue
+                user = visibility[source].user.pop(rnd.randrange(len(visibility[source].user)))
+                visibility[target].user.append(user)
+                index.remove_user(source, user["id"])
+                index.add_user(target, user)
+                changed |= {source, target}
+            index.refresh(changed)
+            self.assert_same(index, visibility)